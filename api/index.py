@@ -1,53 +1,309 @@
-from typing import List
+from typing import Iterator, List, Optional
 from pydantic import BaseModel
-from fastapi import FastAPI, Query, UploadFile, File
-from fastapi.responses import StreamingResponse, JSONResponse
-from openai import OpenAI
+from fastapi import FastAPI, Form, Header, Query, UploadFile, File
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 import os
 import base64
 
+from .utils.admission import AdmissionRejected, Ticket, admission, admit, escalate, red_flag
+from .utils.attachment_ingest import render_attachments
+from .utils.batch_notes import create_batch, iter_results, load_batch, start_batch
+from .utils.audio_jobs import create_job, job_status, load_job, start_workers
+from .utils.change_feed import stream_changes
+from .utils.clients import SLOT_TIMEOUT_S, UpstreamBusyError, get_client, upstream_slot
+from .utils.profiling import Profile, list_profiles, load_profile, start_profile, stats_path
 from .utils.prompt import ClientMessage
-from .orchestrator import stream_text
-from .patient_orchestrator import stream_patient_text
+from .utils.intake_export import EXPORT_FORMATS, export_intakes, intake_filter
+from .utils.http_cache import etag_matches, json_response, make_etag, not_modified
+from .utils.metrics import metrics_snapshot
+from .utils.patient_directory import (
+    DEFAULT_SUMMARY_FIELDS,
+    SECTIONS,
+    SUMMARY_FIELDS,
+    find_patient_record,
+    list_patient_summaries,
+    parse_fields,
+)
+from .utils.records import record_hash, records_version
+from .utils.stream import STREAM_GZIP, encode_stream
+from .utils.usage import usage_snapshot
 
+# Orchestrators (and with them the `openai` package) are imported inside the routes
+# that use them, so a cold start only pays for what the first request needs.
 app = FastAPI()
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
 class Request(BaseModel):
     messages: List[ClientMessage]
+    # Chat ID sent by useChat; keys the upstream prompt cache per conversation
+    id: Optional[str] = None
 
 
 def sanitize_for_responses(messages: List[ClientMessage]) -> List[dict]:
     """
     Keep only 'user' and 'assistant' messages for Responses `input`.
-    Drop 'system' and 'tool' (system goes in `instructions`).
+    Drop 'system' and 'tool' (system goes in `instructions`). Attachments are
+    extracted and merged into their message's text.
     """
+    kept = [m for m in messages if m.role in ("user", "assistant")]
+    # Extracted attachment text (budgeted excerpts, cached by content hash) goes after the message
+    attachment_texts = render_attachments([(m.experimental_attachments, m.content or "") for m in kept])
     out = []
-    for m in messages:
-        if m.role not in ("user", "assistant"):
-            continue
-        # If you have attachments you want to merge, do it here.
+    for m, attachment_text in zip(kept, attachment_texts):
         text = (m.content or "").strip()
+        if attachment_text:
+            text = f"{text}\n\n{attachment_text}" if text else attachment_text
         out.append({"role": m.role, "content": text})
     return out
 
-@app.post("/api/chat")
-async def handle_chat_data(request: Request, protocol: str = Query("data")):
-    openai_messages = sanitize_for_responses(request.messages)
+def _busy_response(error: Exception) -> JSONResponse:
+    """503 for requests that could not get an upstream slot in time"""
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(error)},
+        headers={"Retry-After": str(int(SLOT_TIMEOUT_S))},
+    )
+
+def _shed_response(error: AdmissionRejected) -> JSONResponse:
+    """429 for requests shed by admission control"""
+    return JSONResponse(
+        status_code=429,
+        content={"error": str(error)},
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+def data_stream_response(
+    frames: Iterator[str],
+    accept_encoding: Optional[str],
+    ticket: Optional[Ticket] = None,
+    profile: Optional[Profile] = None,
+) -> StreamingResponse:
+    """
+    Wrap orchestrator frames in a Vercel AI data-stream response (coalesced, optionally gzipped).
+    The admission `ticket` is held until the stream ends; a `profile` covers the orchestrator.
+    """
+    use_gzip = STREAM_GZIP and "gzip" in (accept_encoding or "").lower()
 
-    response = StreamingResponse(stream_text(openai_messages, protocol))
+    if profile is not None:
+        frames = profile.wrap(frames)
+    if ticket is not None:
+        frames = ticket.hold(frames)
+    response = StreamingResponse(encode_stream(frames, gzip=use_gzip))
     response.headers["x-vercel-ai-data-stream"] = "v1"
+    if profile is not None:
+        response.headers["X-Profile-Id"] = profile.id
+    if use_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+        response.headers["Vary"] = "Accept-Encoding"
     return response
 
+@app.post("/api/chat")
+async def handle_chat_data(
+    request: Request,
+    protocol: str = Query("data"),
+    accept_encoding: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None),
+):
+    from .orchestrator import stream_text
+
+    # Before admission, so nothing between admit() and the response can leak the slot
+    profile = start_profile("/api/chat", x_profile)
+    try:
+        ticket = await admit("chat")
+    except AdmissionRejected as e:
+        return _shed_response(e)
+
+    try:
+        # Attachment extraction can parse documents; keep it off the event loop
+        openai_messages = await run_in_threadpool(sanitize_for_responses, request.messages)
+    except BaseException:
+        ticket.release()
+        raise
+
+    frames = stream_text(openai_messages, protocol, request.id)
+    return data_stream_response(frames, accept_encoding, ticket, profile)
+
 @app.post("/api/patient-chat")
-async def handle_patient_chat_data(request: Request, protocol: str = Query("data")):
+async def handle_patient_chat_data(
+    request: Request,
+    protocol: str = Query("data"),
+    accept_encoding: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None),
+):
     """Handle patient-side chat requests with patient-specific orchestration"""
-    openai_messages = sanitize_for_responses(request.messages)
+    from .patient_orchestrator import stream_patient_text
 
-    response = StreamingResponse(stream_patient_text(openai_messages, protocol))
-    response.headers["x-vercel-ai-data-stream"] = "v1"
+    # A red-flag turn (chest pain, trouble breathing, ...) jumps the queue
+    last_user = next((m.content or "" for m in reversed(request.messages) if m.role == "user"), "")
+    reason = red_flag(last_user)
+    if reason:
+        escalate("patient-chat", reason, last_user)
+
+    profile = start_profile("/api/patient-chat", x_profile)
+    try:
+        ticket = await admit("patient-chat", urgent=reason is not None)
+    except AdmissionRejected as e:
+        return _shed_response(e)
+
+    try:
+        openai_messages = await run_in_threadpool(sanitize_for_responses, request.messages)
+    except BaseException:
+        ticket.release()
+        raise
+
+    frames = stream_patient_text(openai_messages, protocol, request.id)
+    return data_stream_response(frames, accept_encoding, ticket, profile)
+
+@app.get("/api/patients")
+def list_patients(
+    section: Optional[str] = Query(None, description="patient_scribes or AI_scribes (default: both)"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    fields: Optional[str] = Query(None, description="Comma-separated summary fields"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    """Paginated patient summaries from the record store"""
+    etag = make_etag(records_version(), section, cursor, limit, fields)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    try:
+        selected = parse_fields(fields, SUMMARY_FIELDS, DEFAULT_SUMMARY_FIELDS)
+        page = list_patient_summaries(section, cursor, limit, selected)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return json_response(page, etag, accept_encoding)
+
+@app.get("/api/patients/changes")
+async def patient_changes(
+    since: Optional[str] = Query(None, description="Last event id seen (same as Last-Event-ID)"),
+    section: Optional[str] = Query(None, description="Only changes to patient_scribes or AI_scribes"),
+    last_event_id: Optional[str] = Header(None),
+):
+    """Server-sent events for record changes (new intakes), resumable from the last event id"""
+    if section is not None and section not in SECTIONS:
+        return JSONResponse(status_code=400, content={"error": f"Unknown section '{section}'"})
+    response = StreamingResponse(stream_changes(since or last_event_id, section), media_type="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
     return response
 
+@app.get("/api/intakes/export")
+def export_intake_records(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    status: Optional[str] = Query(None, description="Comma-separated statuses, e.g. pending_review"),
+    since: Optional[str] = Query(None, description="Earliest timestamp (ISO date or datetime)"),
+    until: Optional[str] = Query(None, description="Latest timestamp (a date includes the whole day)"),
+    reason: Optional[str] = Query(None, description="Comma-separated reason_for_visit values"),
+):
+    """Stream AI_scribes intakes matching the filters, one record at a time"""
+    if format not in EXPORT_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"Unknown format '{format}'"})
+    filters = intake_filter(status, since, until, reason)
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    response = StreamingResponse(export_intakes(filters, format), media_type=media_type)
+    response.headers["Content-Disposition"] = f'attachment; filename="intakes.{format}"'
+    return response
+
+class BatchNotesRequest(BaseModel):
+    status: Optional[str] = "pending_review"
+    since: Optional[str] = None
+    until: Optional[str] = None
+    reason: Optional[str] = None
+    model: Optional[str] = None
+    concurrency: Optional[int] = None
+
+@app.post("/api/intakes/notes")
+def start_batch_notes(request: BatchNotesRequest):
+    """Start generating provider notes for every intake matching the filters"""
+    batch = create_batch(
+        intake_filter(request.status, request.since, request.until, request.reason),
+        request.model,
+        request.concurrency,
+    )
+    start_batch(batch["id"])
+    return JSONResponse(status_code=202, content=batch)
+
+@app.post("/api/intakes/notes/{batch_id}/resume")
+def resume_batch_notes(batch_id: str):
+    """Resume an interrupted batch, retrying failed items and skipping finished ones (no-op while it runs)"""
+    batch = load_batch(batch_id)
+    if batch is None:
+        return JSONResponse(status_code=404, content={"error": f"Batch '{batch_id}' not found"})
+    start_batch(batch_id)
+    return JSONResponse(status_code=202, content=batch)
+
+@app.get("/api/intakes/notes/{batch_id}")
+def get_batch_notes(batch_id: str):
+    """Progress of a note batch"""
+    batch = load_batch(batch_id)
+    if batch is None:
+        return JSONResponse(status_code=404, content={"error": f"Batch '{batch_id}' not found"})
+    return JSONResponse(content=batch)
+
+@app.get("/api/intakes/notes/{batch_id}/results")
+def get_batch_note_results(batch_id: str):
+    """Per-intake results of a note batch as NDJSON (note or error per patient ID)"""
+    if load_batch(batch_id) is None:
+        return JSONResponse(status_code=404, content={"error": f"Batch '{batch_id}' not found"})
+    return StreamingResponse(iter_results(batch_id), media_type="application/x-ndjson")
+
+@app.get("/api/patients/{patient_id}")
+def get_patient(
+    patient_id: str,
+    section: Optional[str] = Query(None, description="patient_scribes or AI_scribes (default: first match)"),
+    fields: Optional[str] = Query(None, description="Comma-separated top-level record fields"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    """Full record (or selected top-level fields) for one patient"""
+    section, record = find_patient_record(patient_id, section)
+    if record is None:
+        return JSONResponse(status_code=404, content={"error": f"Patient ID '{patient_id}' not found"})
+
+    etag = make_etag(record_hash(record), fields)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    try:
+        selected = parse_fields(fields, tuple(record), tuple(record))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    payload = {"id": patient_id, "source": section, "record": {k: record[k] for k in selected}}
+    return json_response(payload, etag, accept_encoding)
+
+@app.get("/api/usage")
+async def get_usage():
+    """Token, cost and latency totals per endpoint and per tool since process start"""
+    return JSONResponse(content=usage_snapshot())
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """In-process counters, gauges and latency summaries"""
+    return JSONResponse(content=metrics_snapshot())
+
+@app.get("/api/profiles")
+def get_profiles():
+    """Recently saved request profiles (newest first)"""
+    return JSONResponse(content={"profiles": list_profiles()})
+
+@app.get("/api/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """Timeline and hottest functions of one profiled request"""
+    profile = load_profile(profile_id)
+    if profile is None:
+        return JSONResponse(status_code=404, content={"error": f"Profile '{profile_id}' not found"})
+    return JSONResponse(content=profile)
+
+@app.get("/api/profiles/{profile_id}/download")
+def download_profile(profile_id: str):
+    """Raw pstats dump of one profiled request (for `python -m pstats` or snakeviz)"""
+    path = stats_path(profile_id)
+    if path is None:
+        return JSONResponse(status_code=404, content={"error": f"Profile '{profile_id}' not found"})
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
 @app.post("/api/transcribe")
 async def transcribe_audio(file: UploadFile = File(...)):
     """Transcribe audio file to text using Whisper"""
@@ -60,23 +316,70 @@ async def transcribe_audio(file: UploadFile = File(...)):
         with open(temp_path, "wb") as f:
             f.write(audio_bytes)
         
-        # Transcribe using Whisper
-        with open(temp_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file
-            )
+        # Transcribe using Whisper, off the event loop
+        def _transcribe():
+            with upstream_slot("transcribe"), open(temp_path, "rb") as audio_file:
+                return get_client().audio.transcriptions.create(
+                    model="whisper-1",
+                    file=audio_file
+                )
+
+        async with admission("transcribe"):
+            transcript = await run_in_threadpool(_transcribe)
         
         # Clean up temp file
         os.remove(temp_path)
         
         return JSONResponse(content={"text": transcript.text})
+    except AdmissionRejected as e:
+        return _shed_response(e)
+    except UpstreamBusyError as e:
+        return _busy_response(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"error": str(e)}
         )
 
+@app.post("/api/transcribe/jobs")
+async def submit_transcription_job(
+    file: UploadFile = File(...),
+    patient_id: str = Form(...),
+    speakers: Optional[str] = Form(None, description="Comma-separated speaker names in order of first appearance"),
+):
+    """Queue a full encounter recording; its transcript is appended to the patient's record"""
+    # The lookup may parse the store; keep it off the event loop
+    section, record = await run_in_threadpool(find_patient_record, patient_id, "patient_scribes")
+    if record is None:
+        return JSONResponse(status_code=404, content={"error": f"Patient ID '{patient_id}' not found"})
+
+    names = [name.strip() for name in speakers.split(",") if name.strip()] if speakers else None
+    job = await run_in_threadpool(
+        create_job, patient_id, file.filename or "recording.wav", file.content_type or "", file.file, names
+    )
+    if "status_code" in job:
+        return JSONResponse(status_code=job["status_code"], content={"error": job["error"]})
+    return JSONResponse(status_code=202, content=job_status(job))
+
+@app.get("/api/transcribe/jobs/{job_id}")
+def get_transcription_job(job_id: str):
+    """Status and progress of a transcription job"""
+    start_workers()
+    job = load_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Job '{job_id}' not found"})
+    return JSONResponse(content=job_status(job))
+
+@app.get("/api/transcribe/jobs/{job_id}/result")
+def get_transcription_result(job_id: str):
+    """Transcript segments (`t` / `speaker` / `text`) of a finished job"""
+    job = load_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Job '{job_id}' not found"})
+    if job["status"] != "done":
+        return JSONResponse(status_code=409, content={**job_status(job), "error": f"Job is {job['status']}"})
+    return JSONResponse(content={"id": job_id, "patient_id": job["patient_id"], "transcript": job["segments"]})
+
 class TTSRequest(BaseModel):
     text: str
     voice: str = "alloy"
@@ -87,13 +390,18 @@ async def text_to_speech(request: TTSRequest):
     try:
         print(f"[TTS] Generating audio for: {request.text[:100]}...")
         
-        audio_response = client.audio.speech.create(
-            model="gpt-4o-mini-tts",
-            voice=request.voice,
-            input=request.text,
-            instructions=f"Speak in a {'warm and empathetic' if request.voice == 'nova' else 'professional and clear'} tone.",
-            response_format="wav"
-        )
+        def _speak():
+            with upstream_slot("tts"):
+                return get_client().audio.speech.create(
+                    model="gpt-4o-mini-tts",
+                    voice=request.voice,
+                    input=request.text,
+                    instructions=f"Speak in a {'warm and empathetic' if request.voice == 'nova' else 'professional and clear'} tone.",
+                    response_format="wav"
+                )
+
+        async with admission("tts"):
+            audio_response = await run_in_threadpool(_speak)
         
         # Convert to base64
         audio_bytes = audio_response.content
@@ -106,6 +414,10 @@ async def text_to_speech(request: TTSRequest):
             "contentType": "audio/wav"
         })
         
+    except AdmissionRejected as e:
+        return _shed_response(e)
+    except UpstreamBusyError as e:
+        return _busy_response(e)
     except Exception as e:
         print(f"[TTS] Error: {e}")
         return JSONResponse(
@@ -1,15 +1,18 @@
-import os
 import json
-import base64
-from typing import List, Dict, Any
-from openai import OpenAI
-from dotenv import load_dotenv
+import time
+from typing import List, Dict, Any, Optional, Tuple
 
-from .utils.get_patient_info import get_patient_info, get_patient_names, search_records_RAG
+from .utils.get_patient_info import get_patient_info, get_patient_names, search_records_RAG, search_transcript, get_patient_summary
+from .utils import answer_cache
+from .utils.clients import UpstreamBusyError, get_client, upstream_slot
+from .utils.metrics import incr, observe
+from .utils.name_matcher import latest_user_text, match_patients
+from .utils.stream import text_frame, tool_call_frame, tool_result_frame
+from .utils.model_router import record_route, route_turn
+from .utils.prompt_cache import build_prefix, prompt_cache_key, record_prompt_cache
+from .utils.usage import UsageTotals, prompt_sections, record_request, record_tool_call
 
-load_dotenv()
-
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+ENDPOINT = "/api/chat"
 
 # Define tools for OpenAI Responses API
 tools = [
@@ -45,6 +48,64 @@ tools = [
                     "type": "string",
                     "description": "Optional gender to filter by (M, F, or variations like Male, Female)",
                 },
+                "include_transcript": {
+                    "type": "boolean",
+                    "description": "Include the full transcript (default false). Prefer search_transcript to find and cite transcript segments.",
+                },
+            },
+            "required": ["patient_id"],
+        },
+    },
+    {
+        "type": "function",
+        "name": "get_patient_summary",
+        "description": "Retrieve a compact summary card for a patient: demographics, vitals, problems with ICD-10 codes, medication changes, orders and follow-ups. Use this first when asked about a patient; call get_patient_info only for details the card does not cover.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "patient_id": {
+                    "type": "string",
+                    "description": "Required patient ID (e.g., 'jordan_carter'). Get this from get_patient_names function first.",
+                },
+            },
+            "required": ["patient_id"],
+        },
+    },
+    {
+        "type": "function",
+        "name": "search_transcript",
+        "description": "Search one patient's encounter transcript and return only the matching segments with their timestamps (t), speaker and text. Use this to find and cite what was said and when.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "patient_id": {
+                    "type": "string",
+                    "description": "Required patient ID (e.g., 'jordan_carter'). Get this from get_patient_names function first.",
+                },
+                "query": {
+                    "type": "string",
+                    "description": "Optional keywords (e.g., 'chest pain shortness of breath'); segments matching more keywords rank first",
+                },
+                "phrase": {
+                    "type": "string",
+                    "description": "Optional exact phrase the segment must contain",
+                },
+                "speaker": {
+                    "type": "string",
+                    "description": "Optional speaker filter (e.g., 'Provider', 'Patient')",
+                },
+                "start": {
+                    "type": "string",
+                    "description": "Optional window start as 'MM:SS'",
+                },
+                "end": {
+                    "type": "string",
+                    "description": "Optional window end as 'MM:SS'",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum segments to return (default 8, max 50)",
+                },
             },
             "required": ["patient_id"],
         },
@@ -92,10 +153,12 @@ Your goal: Produce a note that a physician could easily review and use for offic
 You have access to patient data through two functions and automatic file search:
 
 1. **get_patient_names()**: Returns all patient names and their IDs. Use this FIRST when a user asks about a specific patient by name.
-2. **get_patient_info(patient_id)**: Returns detailed patient record. Use the patient_id from get_patient_names() result.
+2. **get_patient_info(patient_id)**: Returns detailed patient record. Use the patient_id from get_patient_names() result. The transcript is left out unless include_transcript is true.
 3. **search_records_RAG(query)**: searches through patient database using RAG. use this when the patient does not give you a particular patient to look into but wants you to find patient in the doc "Find patient that is roughly 60-70 years old" or "Find patient with depression and tell me about their symptoms" etc. Notice the search here is vague. 
+4. **search_transcript(patient_id, query, phrase, speaker, start, end)**: returns only the transcript segments that match, with their second mark (t). Use this to look up and cite what was said in the encounter instead of loading the whole transcript.
+5. **get_patient_summary(patient_id)**: returns a short summary card (demographics, vitals, problems with ICD-10, med changes, follow-ups). Start from this when asked about a patient; only call get_patient_info if you need details the card does not have.
 
-If they ask which tools you have describe only these 3. 
+If they ask which tools you have describe only these 5. 
 
 
 If they ask about material not related to patient records or anything medical related, tell them that you are an assistant designed specifically for patient medical data, and steer them back to the main topics.
@@ -109,6 +172,11 @@ When going over a patient, cite where in the transcript (which second mark) or w
 If the user asks a question that is not in the data source given to you, simply say you do not have the information. 
 """.strip()
 
+# Instructions + tools in canonical form, sent byte-identically on every call so the
+# upstream prompt cache can reuse them; also sizes the tools section for usage attribution
+PROMPT_PREFIX = build_prefix(SYSTEM_PROMPT, tools)
+TOOLS_JSON = PROMPT_PREFIX["tools_json"]
+
 
 def execute_function_call(function_name: str, arguments: str) -> str:
     """
@@ -130,6 +198,8 @@ def execute_function_call(function_name: str, arguments: str) -> str:
         # Convert age array to tuple if present
         if "age" in args and args["age"]:
             args["age"] = tuple(args["age"])
+        # The model cites from search_transcript; only send the full transcript when asked
+        args.setdefault("include_transcript", False)
         result = get_patient_info(**args)
         return json.dumps(result)
     
@@ -137,11 +207,69 @@ def execute_function_call(function_name: str, arguments: str) -> str:
         args = json.loads(arguments)
         results = search_records_RAG(**args)
         return json.dumps(results)
+
+    elif function_name == "get_patient_summary":
+        args = json.loads(arguments)
+        result = get_patient_summary(**args)
+        return json.dumps(result)
+
+    elif function_name == "search_transcript":
+        args = json.loads(arguments)
+        result = search_transcript(**args)
+        return json.dumps(result)
     
     
     return json.dumps({"error": f"Unknown function: {function_name}"})
 
 
+def prefetch_patient_context(messages: List[dict]) -> Tuple[Optional[dict], List[str]]:
+    """
+    Pre-flight for "tell me about <patient>" questions.
+
+    If the latest user message names one or two patients unambiguously (full name,
+    MRN or patient ID), return a developer message carrying their summary cards, so
+    the first model call can answer without the get_patient_names / get_patient_info
+    rounds it would otherwise spend finding the patient.
+
+    Returns:
+        (developer message to append to the input, or None if nothing matched;
+        IDs of the prefetched patients)
+    """
+    matches = match_patients(latest_user_text(messages))
+    if not matches:
+        incr("chat_prefetch", outcome="miss")
+        return None, []
+
+    cards = [get_patient_summary(m["patient_id"]) for m in matches]
+    # Lookup by name or MRN costs get_patient_names plus a record call; by ID, just the latter
+    rounds = 2 if any(m["matched"] != "id" for m in matches) else 1
+    incr("chat_prefetch", outcome="hit")
+    incr("chat_prefetch_rounds_skipped", rounds)
+
+    message = {
+        "role": "developer",
+        "content": (
+            "Patient summary cards for the patients named in the latest message "
+            "(same content get_patient_summary returns). Use them directly; call "
+            "get_patient_info or search_transcript only for details they do not cover.\n"
+            + json.dumps(cards)
+        ),
+    }
+    return message, [m["patient_id"] for m in matches]
+
+
+def replay_cached_answer(cached: Dict[str, Any], started: float):
+    """Stream a cached answer with the same `0:` / `e:` framing as a live one."""
+    yield text_frame(cached["answer"])
+    record_request(ENDPOINT, UsageTotals(), time.perf_counter() - started)
+    tail = {
+        "finishReason": "stop",
+        "usage": UsageTotals().as_tail_usage(),
+        "isContinued": False,
+    }
+    yield f'e:{json.dumps(tail)}\n'
+
+
 def _flatten_message_content(content: Any) -> str:
     """Normalize chat.completions content into a plain string."""
     if isinstance(content, str):
@@ -219,33 +347,35 @@ def stream_text_with_audio(messages: List[dict], protocol: str = "data"):
     
     # Add system message for proper context
     chat_messages_with_system = [
-        {"role": "system", "content": SYSTEM_PROMPT}
+        {"role": "system", "content": PROMPT_PREFIX["instructions"]}
     ] + chat_messages
     
+    started = time.perf_counter()
     try:
         # First, get the text response using regular chat completions
-        text_response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=chat_messages_with_system,
-            stream=False
-        )
+        with upstream_slot("chat"):
+            text_response = get_client().chat.completions.create(
+                model="gpt-4o-mini",
+                messages=chat_messages_with_system,
+                stream=False
+            )
         
         # Extract text response
         text_content = ""
         if text_response.choices and text_response.choices[0].message.content is not None:
             text_content = _flatten_message_content(text_response.choices[0].message.content)
             if text_content:
-                yield f'0:{json.dumps(text_content)}\n'
+                yield text_frame(text_content)
         
         # Send completion metadata
         # Audio will be generated separately via /api/tts endpoint
-        usage = text_response.usage if hasattr(text_response, 'usage') else None
-        prompt_tokens = usage.prompt_tokens if usage else None
-        completion_tokens = usage.completion_tokens if usage else None
+        totals = UsageTotals()
+        totals.add(getattr(text_response, "usage", None), "gpt-4o-mini")
+        record_request(ENDPOINT, totals, time.perf_counter() - started)
         
         tail = {
             "finishReason": "stop",
-            "usage": {"promptTokens": prompt_tokens, "completionTokens": completion_tokens},
+            "usage": totals.as_tail_usage(),
             "isContinued": False,
         }
         
@@ -259,13 +389,14 @@ def stream_text_with_audio(messages: List[dict], protocol: str = "data"):
         yield f'e:{json.dumps(error_payload)}\n'
 
 
-def stream_text(messages: List[dict], protocol: str = "data"):
+def stream_text(messages: List[dict], protocol: str = "data", conversation_id: Optional[str] = None):
     """
     Stream text responses from OpenAI with function calling and audio support.
     
     Args:
         messages: List of conversation messages
         protocol: Protocol type (default "data")
+        conversation_id: Client chat ID, used as the prompt cache key
         
     Yields:
         Formatted response chunks for streaming
@@ -295,70 +426,117 @@ def stream_text(messages: List[dict], protocol: str = "data"):
         yield from stream_text_with_audio(cleaned_messages, protocol)
         return
     
-    model_name = "gpt-4.1-mini"
     input_list = messages.copy()
+    started = time.perf_counter()
+
+    # Opt-in answer cache for opening questions over unchanged records
+    question = answer_cache.cacheable_question(messages) if answer_cache.ENABLED else None
+    question_embedding = None
+    if question:
+        cached, question_embedding = answer_cache.lookup(question)
+        if cached:
+            yield from replay_cached_answer(cached, started)
+            return
+
+    cache_key = prompt_cache_key(ENDPOINT, PROMPT_PREFIX, messages, conversation_id)
+
+    prefetched, prefetched_ids = prefetch_patient_context(input_list)
+    if prefetched:
+        input_list.append(prefetched)
     
     max_iterations = 5  # Prevent infinite loops
     iteration = 0
     final_response = None
+    totals = UsageTotals()
+    answer_parts: List[str] = []
+    tool_calls: List[tuple] = []
     
     while iteration < max_iterations:
         iteration += 1
         has_function_calls = False
+        route = route_turn(input_list, iteration)
+        model_name = route["model"]
+        call_started = time.perf_counter()
+        sections = prompt_sections(PROMPT_PREFIX["instructions"], TOOLS_JSON, input_list)
         
-        # Make streaming request with tools
-        with client.responses.stream(
-            model=model_name,
-            instructions=SYSTEM_PROMPT,
-            input=input_list,
-            tools=tools,
-        ) as stream:
-            for event in stream:
-                et = getattr(event, "type", None)
+        # Make streaming request with tools. The slot covers only this model call;
+        # tools below take their own (RAG, embeddings), so it is released first.
+        try:
+            with upstream_slot("chat"), get_client().responses.stream(
+                model=model_name,
+                instructions=PROMPT_PREFIX["instructions"],
+                input=input_list,
+                tools=PROMPT_PREFIX["tools"],
+                prompt_cache_key=cache_key,
+            ) as stream:
+                for event in stream:
+                    et = getattr(event, "type", None)
                 
-                if et == "response.output_text.delta":
-                    # Stream text tokens immediately as they arrive
-                    yield f'0:{json.dumps(event.delta)}\n'
-                    
-                elif et == "response.error":
-                    err = getattr(event, "error", {}) or {}
-                    msg = err.get("message", "unknown error")
-                    payload = {"finishReason": "error", "message": msg}
-                    yield f'e:{json.dumps(payload)}\n'
-                    return
-
-            # Get final response to check for function calls
-            final_response = stream.get_final_response()
-            
-            # Add output to input list
-            input_list += final_response.output
-            
-            # Check if there are function calls to handle
-            for item in final_response.output:
-                if item.type == "function_call":
-                    has_function_calls = True
+                    if et == "response.output_text.delta":
+                        # Stream text tokens as they arrive; encode_stream coalesces them per write
+                        answer_parts.append(event.delta)
+                        yield text_frame(event.delta)
                     
-                    # Execute the function and add result to input
-                    result_output = execute_function_call(item.name, item.arguments)
-                    input_list.append({
-                        "type": "function_call_output",
-                        "call_id": item.call_id,
-                        "output": result_output
-                    })
-            
-            # If no function calls, we're done
-            if not has_function_calls:
-                break
+                    elif et == "response.error":
+                        err = getattr(event, "error", {}) or {}
+                        msg = err.get("message", "unknown error")
+                        payload = {"finishReason": "error", "message": msg}
+                        record_request(ENDPOINT, totals, time.perf_counter() - started)
+                        yield f'e:{json.dumps(payload)}\n'
+                        return
+
+                # Get final response to check for function calls
+                final_response = stream.get_final_response()
+        except UpstreamBusyError as e:
+            # Headers are already sent, so report it in-stream rather than as a 503
+            record_request(ENDPOINT, totals, time.perf_counter() - started)
+            yield f'e:{json.dumps({"finishReason": "error", "message": str(e)})}\n'
+            return
+
+        call_usage = totals.add(getattr(final_response, "usage", None), model_name, sections)
+        record_route(ENDPOINT, route, time.perf_counter() - call_started, call_usage)
+        record_prompt_cache(ENDPOINT, model_name, call_usage)
+        
+        # Add output to input list
+        input_list += final_response.output
+        
+        # Check if there are function calls to handle
+        for item in final_response.output:
+            if item.type == "function_call":
+                has_function_calls = True
+                
+                # Execute the function and add result to input
+                tool_calls.append((item.name, item.arguments))
+                # Progress frames, so a slow tool round doesn't look like a hang
+                yield tool_call_frame(item.call_id, item.name, item.arguments)
+                tool_started = time.perf_counter()
+                result_output = execute_function_call(item.name, item.arguments)
+                tool_duration = time.perf_counter() - tool_started
+                record_tool_call(ENDPOINT, item.name, tool_duration, len(result_output))
+                yield tool_result_frame(item.call_id, item.name, tool_duration, result_output)
+                input_list.append({
+                    "type": "function_call_output",
+                    "call_id": item.call_id,
+                    "output": result_output
+                })
+        
+        # If no function calls, we're done
+        if not has_function_calls:
+            break
     
-    # Send final metadata
-    if final_response:
-        usage = getattr(final_response, "usage", None)
-        prompt_tokens = getattr(usage, "input_tokens", None) if usage else None
-        completion_tokens = getattr(usage, "output_tokens", None) if usage else None
+    record_request(ENDPOINT, totals, time.perf_counter() - started)
+    observe("chat_iterations", iteration, prefetch="hit" if prefetched else "miss")
 
+    if question and final_response and not has_function_calls and answer_parts:
+        dependencies = answer_cache.dependencies_for(tool_calls, prefetched_ids)
+        if dependencies is not None:
+            answer_cache.store(question, "".join(answer_parts), dependencies, question_embedding)
+
+    # Send final metadata, with usage summed over every iteration
+    if final_response:
         tail = {
             "finishReason": "stop",
-            "usage": {"promptTokens": prompt_tokens, "completionTokens": completion_tokens},
+            "usage": totals.as_tail_usage(),
             "isContinued": False,
         }
         yield f'e:{json.dumps(tail)}\n'
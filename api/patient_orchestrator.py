@@ -1,15 +1,15 @@
-import os
 import json
-import base64
-from typing import List, Dict, Any
-from openai import OpenAI
-from dotenv import load_dotenv
+import time
+from typing import List, Dict, Any, Optional
 
 from .utils.write_patient_record import write_patient_intake
+from .utils.clients import UpstreamBusyError, get_client, upstream_slot
+from .utils.stream import text_frame, tool_call_frame, tool_result_frame
+from .utils.model_router import record_route, route_turn
+from .utils.prompt_cache import build_prefix, prompt_cache_key, record_prompt_cache
+from .utils.usage import UsageTotals, prompt_sections, record_request, record_tool_call
 
-load_dotenv()
-
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+ENDPOINT = "/api/patient-chat"
 
 # Define tools for patient chat
 patient_tools = [
@@ -144,6 +144,11 @@ Example flow:
 Remember: You're gathering information and providing compassionate support, not diagnosing or treating.
 """.strip()
 
+# Instructions + tools in canonical form, sent byte-identically on every call so the
+# upstream prompt cache can reuse them; also sizes the tools section for usage attribution
+PATIENT_PROMPT_PREFIX = build_prefix(PATIENT_SYSTEM_PROMPT, patient_tools)
+PATIENT_TOOLS_JSON = PATIENT_PROMPT_PREFIX["tools_json"]
+
 
 def execute_patient_function_call(function_name: str, arguments: str) -> str:
     """
@@ -241,33 +246,35 @@ def stream_patient_text_with_audio(messages: List[dict], protocol: str = "data")
     
     # Add system message for proper context
     chat_messages_with_system = [
-        {"role": "system", "content": PATIENT_SYSTEM_PROMPT}
+        {"role": "system", "content": PATIENT_PROMPT_PREFIX["instructions"]}
     ] + chat_messages
     
+    started = time.perf_counter()
     try:
         # First, get the text response using regular chat completions
-        text_response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=chat_messages_with_system,
-            stream=False
-        )
+        with upstream_slot("patient_chat"):
+            text_response = get_client().chat.completions.create(
+                model="gpt-4o-mini",
+                messages=chat_messages_with_system,
+                stream=False
+            )
         
         # Extract text response
         text_content = ""
         if text_response.choices and text_response.choices[0].message.content is not None:
             text_content = _flatten_message_content(text_response.choices[0].message.content)
             if text_content:
-                yield f'0:{json.dumps(text_content)}\n'
+                yield text_frame(text_content)
         
         # Send completion metadata
         # Audio will be generated separately via /api/tts endpoint
-        usage = text_response.usage if hasattr(text_response, 'usage') else None
-        prompt_tokens = usage.prompt_tokens if usage else None
-        completion_tokens = usage.completion_tokens if usage else None
+        totals = UsageTotals()
+        totals.add(getattr(text_response, "usage", None), "gpt-4o-mini")
+        record_request(ENDPOINT, totals, time.perf_counter() - started)
         
         tail = {
             "finishReason": "stop",
-            "usage": {"promptTokens": prompt_tokens, "completionTokens": completion_tokens},
+            "usage": totals.as_tail_usage(),
             "isContinued": False,
         }
         
@@ -281,13 +288,14 @@ def stream_patient_text_with_audio(messages: List[dict], protocol: str = "data")
         yield f'e:{json.dumps(error_payload)}\n'
 
 
-def stream_patient_text(messages: List[dict], protocol: str = "data"):
+def stream_patient_text(messages: List[dict], protocol: str = "data", conversation_id: Optional[str] = None):
     """
     Stream text responses for patient chat with function calling and audio support.
     
     Args:
         messages: List of conversation messages
         protocol: Protocol type (default "data")
+        conversation_id: Client chat ID, used as the prompt cache key
         
     Yields:
         Formatted response chunks for streaming
@@ -317,70 +325,93 @@ def stream_patient_text(messages: List[dict], protocol: str = "data"):
         yield from stream_patient_text_with_audio(cleaned_messages, protocol)
         return
     
-    model_name = "gpt-4.1-mini"
     input_list = messages.copy()
+    cache_key = prompt_cache_key(ENDPOINT, PATIENT_PROMPT_PREFIX, messages, conversation_id)
     
     max_iterations = 5  # Prevent infinite loops
     iteration = 0
     final_response = None
+    started = time.perf_counter()
+    totals = UsageTotals()
     
     while iteration < max_iterations:
         iteration += 1
         has_function_calls = False
+        route = route_turn(input_list, iteration, detect_patients=False)
+        model_name = route["model"]
+        call_started = time.perf_counter()
+        sections = prompt_sections(PATIENT_PROMPT_PREFIX["instructions"], PATIENT_TOOLS_JSON, input_list)
         
-        # Make streaming request with tools
-        with client.responses.stream(
-            model=model_name,
-            instructions=PATIENT_SYSTEM_PROMPT,
-            input=input_list,
-            tools=patient_tools,
-        ) as stream:
-            for event in stream:
-                et = getattr(event, "type", None)
+        # Make streaming request with tools. The slot covers only this model call;
+        # tools below take their own (RAG, embeddings), so it is released first.
+        try:
+            with upstream_slot("patient_chat"), get_client().responses.stream(
+                model=model_name,
+                instructions=PATIENT_PROMPT_PREFIX["instructions"],
+                input=input_list,
+                tools=PATIENT_PROMPT_PREFIX["tools"],
+                prompt_cache_key=cache_key,
+            ) as stream:
+                for event in stream:
+                    et = getattr(event, "type", None)
                 
-                if et == "response.output_text.delta":
-                    # Stream text tokens immediately as they arrive
-                    yield f'0:{json.dumps(event.delta)}\n'
-                    
-                elif et == "response.error":
-                    err = getattr(event, "error", {}) or {}
-                    msg = err.get("message", "unknown error")
-                    payload = {"finishReason": "error", "message": msg}
-                    yield f'e:{json.dumps(payload)}\n'
-                    return
-
-            # Get final response to check for function calls
-            final_response = stream.get_final_response()
-            
-            # Add output to input list
-            input_list += final_response.output
-            
-            # Check if there are function calls to handle
-            for item in final_response.output:
-                if item.type == "function_call":
-                    has_function_calls = True
+                    if et == "response.output_text.delta":
+                        # Stream text tokens as they arrive; encode_stream coalesces them per write
+                        yield text_frame(event.delta)
                     
-                    # Execute the function and add result to input
-                    result_output = execute_patient_function_call(item.name, item.arguments)
-                    input_list.append({
-                        "type": "function_call_output",
-                        "call_id": item.call_id,
-                        "output": result_output
-                    })
-            
-            # If no function calls, we're done
-            if not has_function_calls:
-                break
+                    elif et == "response.error":
+                        err = getattr(event, "error", {}) or {}
+                        msg = err.get("message", "unknown error")
+                        payload = {"finishReason": "error", "message": msg}
+                        record_request(ENDPOINT, totals, time.perf_counter() - started)
+                        yield f'e:{json.dumps(payload)}\n'
+                        return
+
+                # Get final response to check for function calls
+                final_response = stream.get_final_response()
+        except UpstreamBusyError as e:
+            # Headers are already sent, so report it in-stream rather than as a 503
+            record_request(ENDPOINT, totals, time.perf_counter() - started)
+            yield f'e:{json.dumps({"finishReason": "error", "message": str(e)})}\n'
+            return
+
+        call_usage = totals.add(getattr(final_response, "usage", None), model_name, sections)
+        record_route(ENDPOINT, route, time.perf_counter() - call_started, call_usage)
+        record_prompt_cache(ENDPOINT, model_name, call_usage)
+        
+        # Add output to input list
+        input_list += final_response.output
+        
+        # Check if there are function calls to handle
+        for item in final_response.output:
+            if item.type == "function_call":
+                has_function_calls = True
+                
+                # Execute the function and add result to input
+                # Progress frames, so a slow tool round doesn't look like a hang
+                yield tool_call_frame(item.call_id, item.name, item.arguments)
+                tool_started = time.perf_counter()
+                result_output = execute_patient_function_call(item.name, item.arguments)
+                tool_duration = time.perf_counter() - tool_started
+                record_tool_call(ENDPOINT, item.name, tool_duration, len(result_output))
+                yield tool_result_frame(item.call_id, item.name, tool_duration, result_output)
+                input_list.append({
+                    "type": "function_call_output",
+                    "call_id": item.call_id,
+                    "output": result_output
+                })
+        
+        # If no function calls, we're done
+        if not has_function_calls:
+            break
     
-    # Send final metadata
-    if final_response:
-        usage = getattr(final_response, "usage", None)
-        prompt_tokens = getattr(usage, "input_tokens", None) if usage else None
-        completion_tokens = getattr(usage, "output_tokens", None) if usage else None
+    record_request(ENDPOINT, totals, time.perf_counter() - started)
 
+    # Send final metadata, with usage summed over every iteration
+    if final_response:
         tail = {
             "finishReason": "stop",
-            "usage": {"promptTokens": prompt_tokens, "completionTokens": completion_tokens},
+            "usage": totals.as_tail_usage(),
             "isContinued": False,
         }
         yield f'e:{json.dumps(tail)}\n'
@@ -0,0 +1,329 @@
+import asyncio
+import bisect
+import itertools
+import math
+import os
+import re
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .clients import CONCURRENCY
+from .metrics import incr, observe, set_gauge
+
+ENABLED = os.environ.get("ADMISSION_CONTROL", "1").lower() not in ("0", "false", "no")
+
+# Lower runs first. Red-flag patient turns are escalated to `urgent`.
+PRIORITIES = {"urgent": 0, "interactive": 1, "audio": 2, "batch": 3}
+# endpoint -> (priority class, default concurrency limit)
+ENDPOINTS = {
+    "chat": ("interactive", 8),
+    "patient-chat": ("interactive", 8),
+    "transcribe": ("audio", 4),
+    "tts": ("audio", 4),
+    "transcribe-jobs": ("batch", 2),
+    "batch-notes": ("batch", 4),
+}
+
+
+def _parse_pairs(value: Optional[str], defaults: Dict[str, float]) -> Dict[str, float]:
+    """Parse "name=number,..." overrides (e.g. ADMISSION_LIMITS="chat=4,tts=1") over defaults."""
+    parsed = dict(defaults)
+    for item in (value or "").split(","):
+        name, _, number = item.partition("=")
+        try:
+            if name.strip() in parsed:
+                parsed[name.strip()] = float(number)
+        except ValueError:
+            print(f"[ADMISSION] Ignoring bad setting '{item}'")
+    return parsed
+
+
+# Requests (and background uploads) admitted at once across all endpoints.
+CAPACITY = int(os.environ.get("ADMISSION_CAPACITY", CONCURRENCY))
+# Extra slots only urgent requests may use once CAPACITY is taken.
+URGENT_RESERVE = int(os.environ.get("ADMISSION_URGENT_RESERVE", 2))
+LIMITS = {
+    name: int(limit)
+    for name, limit in _parse_pairs(
+        os.environ.get("ADMISSION_LIMITS"), {name: limit for name, (_, limit) in ENDPOINTS.items()}
+    ).items()
+}
+# Longest a request waits in the queue before it is shed, per priority class.
+MAX_WAIT_S = _parse_pairs(
+    os.environ.get("ADMISSION_MAX_WAIT"), {"urgent": 60.0, "interactive": 10.0, "audio": 5.0, "batch": 2.0}
+)
+# Requests waiting at once; when full, a newcomer displaces the lowest-priority waiter or is shed.
+QUEUE_MAX = int(os.environ.get("ADMISSION_QUEUE_MAX", 64))
+
+# Phrases in a patient's message that escalate the turn to `urgent`.
+RED_FLAGS = {
+    "chest pain": r"chest (pain|tightness|pressure)|pain in (my|the) chest|heart attack",
+    "breathing": r"can'?t breathe|cannot breathe|(trouble|difficulty|hard to) breath(e|ing)|short(ness)? of breath|choking",
+    "bleeding": r"(severe|heavy|won'?t stop|uncontrolled) bleeding|bleeding (heavily|a lot)|coughing (up )?blood|vomiting blood",
+    "stroke": r"face (is )?droop|slurred speech|numb(ness)? on one side|can'?t move (my )?(arm|leg)|stroke",
+    "consciousness": r"passed out|fainted|unconscious|seizure",
+    "self-harm": r"suicid|kill (myself|me)|end my life|hurt myself|overdos",
+    "anaphylaxis": r"throat (is )?(closing|swelling)|anaphyla",
+}
+_RED_FLAG_RE = {reason: re.compile(pattern, re.IGNORECASE) for reason, pattern in RED_FLAGS.items()}
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a request is shed instead of admitted; `retry_after` is in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted request's slot. Release it exactly once (extra calls are ignored)."""
+
+    __slots__ = ("endpoint", "priority", "started", "released", "counted")
+
+    def __init__(self, endpoint: str, priority: str, counted: bool = False):
+        self.endpoint = endpoint
+        self.priority = priority
+        self.started = time.perf_counter()
+        self.released = False
+        # False when admission control is off: nothing to give back on release
+        self.counted = counted
+
+    def release(self) -> None:
+        _release(self)
+
+    def hold(self, frames: Iterator[str]) -> Iterator[str]:
+        """
+        Yield `frames`, releasing the slot when the stream ends or is closed.
+
+        A generator's `finally` never runs if it is dropped before it starts (the
+        client disconnected before the first chunk), so the slot is also released
+        when the returned stream is garbage collected.
+        """
+        held = self._held(frames)
+        weakref.finalize(held, self.release)
+        return held
+
+    def _held(self, frames: Iterator[str]) -> Iterator[str]:
+        try:
+            yield from frames
+        finally:
+            self.release()
+
+
+class _Waiter:
+    __slots__ = ("key", "endpoint", "priority", "wake", "enqueued", "background", "ticket", "rejected")
+
+    def __init__(self, endpoint: str, priority: str, wake: Callable[[], None], background: bool):
+        self.key = (PRIORITIES[priority], next(_sequence))
+        self.endpoint = endpoint
+        self.priority = priority
+        self.wake = wake
+        self.enqueued = time.perf_counter()
+        self.background = background
+        self.ticket: Optional[Ticket] = None
+        self.rejected = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return self.key < other.key
+
+
+# Reentrant: a dropped stream's finalizer may release its ticket from inside a locked section
+_lock = threading.RLock()
+_sequence = itertools.count()
+# Sorted by (priority, arrival)
+_waiting: List[_Waiter] = []
+_running = 0
+_running_by_endpoint: Dict[str, int] = {name: 0 for name in ENDPOINTS}
+# Moving average of how long a slot is held, for Retry-After
+_hold_s = 1.0
+_escalation_hooks: List[Callable[[str, str, str], None]] = []
+
+
+def _can_run(endpoint: str, priority: str) -> bool:
+    if priority == "urgent":
+        return _running < CAPACITY + URGENT_RESERVE
+    return _running < CAPACITY and _running_by_endpoint[endpoint] < LIMITS[endpoint]
+
+
+def _grant(endpoint: str, priority: str) -> Ticket:
+    global _running
+    _running += 1
+    _running_by_endpoint[endpoint] += 1
+    set_gauge("admission_running", _running)
+    return Ticket(endpoint, priority, counted=True)
+
+
+def _dispatch() -> None:
+    """Admit every waiter that fits, highest priority first (called with _lock held)."""
+    for waiter in list(_waiting):
+        if _running >= CAPACITY + URGENT_RESERVE:
+            break
+        if _can_run(waiter.endpoint, waiter.priority):
+            _waiting.remove(waiter)
+            waiter.ticket = _grant(waiter.endpoint, waiter.priority)
+            waiter.wake()
+    set_gauge("admission_queue_depth", len(_waiting))
+
+
+def _release(ticket: Ticket) -> None:
+    global _running, _hold_s
+    with _lock:
+        if ticket.released:
+            return
+        ticket.released = True
+        if not ticket.counted:
+            return
+        _running -= 1
+        _running_by_endpoint[ticket.endpoint] -= 1
+        _hold_s = 0.9 * _hold_s + 0.1 * (time.perf_counter() - ticket.started)
+        set_gauge("admission_running", _running)
+        _dispatch()
+
+
+def retry_after() -> int:
+    """Seconds a shed client should wait: the current queue drained at the recent hold time."""
+    return max(1, math.ceil(_hold_s * (len(_waiting) + 1) / max(CAPACITY, 1)))
+
+
+def _reject(endpoint: str, reason: str) -> AdmissionRejected:
+    incr("admission_rejected", endpoint=endpoint, reason=reason)
+    return AdmissionRejected(f"Server is busy ({reason}), try again shortly", retry_after())
+
+
+def _enqueue(waiter: _Waiter) -> None:
+    """Queue `waiter`, making room by shedding a lower-priority one if needed (called with _lock held)."""
+    if not waiter.background and waiter.priority != "urgent":
+        sheddable = [w for w in _waiting if not w.background]
+        if len(sheddable) >= QUEUE_MAX:
+            victim = max(sheddable)
+            if victim.key < waiter.key:
+                raise _reject(waiter.endpoint, "queue_full")
+            _waiting.remove(victim)
+            victim.rejected = True
+            victim.wake()
+            incr("admission_rejected", endpoint=victim.endpoint, reason="displaced")
+    bisect.insort(_waiting, waiter)
+
+
+def _observe_wait(waiter: _Waiter) -> None:
+    observe("admission_wait_s", time.perf_counter() - waiter.enqueued,
+            endpoint=waiter.endpoint, priority=waiter.priority)
+
+
+async def admit(endpoint: str, urgent: bool = False) -> Ticket:
+    """
+    Wait for a slot for one request to `endpoint`.
+
+    Requests run in priority order within their endpoint's limit. A request still
+    queued after its class's MAX_WAIT_S, or displaced by higher-priority work while
+    the queue is full, is shed.
+
+    Args:
+        endpoint: Key of ENDPOINTS
+        urgent: Run ahead of everything else (red-flag patient turns)
+
+    Raises:
+        AdmissionRejected: when the request is shed (respond 429 with its retry_after).
+    """
+    priority = "urgent" if urgent else ENDPOINTS[endpoint][0]
+    if not ENABLED:
+        return Ticket(endpoint, priority)
+
+    loop = asyncio.get_running_loop()
+    admitted = loop.create_future()
+
+    def wake() -> None:
+        loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(None))
+
+    waiter = _Waiter(endpoint, priority, wake, background=False)
+    with _lock:
+        if not _waiting and _can_run(endpoint, priority):
+            observe("admission_wait_s", 0.0, endpoint=endpoint, priority=priority)
+            return _grant(endpoint, priority)
+        _enqueue(waiter)
+        _dispatch()
+
+    try:
+        await asyncio.wait_for(asyncio.shield(admitted), timeout=MAX_WAIT_S[priority])
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        with _lock:
+            if waiter.ticket is None and not waiter.rejected:
+                _waiting.remove(waiter)
+                set_gauge("admission_queue_depth", len(_waiting))
+        if waiter.ticket is not None:
+            # Admitted just as the wait ran out
+            if isinstance(e, asyncio.CancelledError):
+                waiter.ticket.release()
+                raise
+        else:
+            _observe_wait(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise _reject(endpoint, "timeout")
+    _observe_wait(waiter)
+    if waiter.rejected:
+        raise AdmissionRejected("Server is busy (displaced by higher-priority requests), try again shortly",
+                                retry_after())
+    return waiter.ticket
+
+
+@asynccontextmanager
+async def admission(endpoint: str, urgent: bool = False):
+    """`admit` as a context manager that releases the slot on exit."""
+    ticket = await admit(endpoint, urgent)
+    try:
+        yield ticket
+    finally:
+        ticket.release()
+
+
+def admit_blocking(endpoint: str) -> Ticket:
+    """
+    Wait (in a worker thread) for a slot for background work, such as audio-job
+    chunk uploads. Background waiters queue behind interactive requests but are never
+    shed.
+    """
+    priority = ENDPOINTS[endpoint][0]
+    if not ENABLED:
+        return Ticket(endpoint, priority)
+
+    event = threading.Event()
+    waiter = _Waiter(endpoint, priority, event.set, background=True)
+    with _lock:
+        if not _waiting and _can_run(endpoint, priority):
+            observe("admission_wait_s", 0.0, endpoint=endpoint, priority=priority)
+            return _grant(endpoint, priority)
+        _enqueue(waiter)
+        _dispatch()
+    event.wait()
+    _observe_wait(waiter)
+    return waiter.ticket
+
+
+def red_flag(text: str) -> Optional[str]:
+    """The first red-flag category mentioned in `text`, or None."""
+    for reason, pattern in _RED_FLAG_RE.items():
+        if pattern.search(text or ""):
+            return reason
+    return None
+
+
+def on_escalation(hook: Callable[[str, str, str], None]) -> None:
+    """Register `hook(endpoint, reason, text)`, called for every escalated red-flag turn."""
+    _escalation_hooks.append(hook)
+
+
+def escalate(endpoint: str, reason: str, text: str) -> None:
+    """Record a red-flag turn and run the escalation hooks (a failing hook is logged and skipped)."""
+    incr("admission_escalations", endpoint=endpoint, reason=reason)
+    print(f"[ADMISSION] Red flag ({reason}) on {endpoint}, escalating to urgent")
+    for hook in _escalation_hooks:
+        try:
+            hook(endpoint, reason, text)
+        except Exception as e:
+            print(f"[ADMISSION] Escalation hook failed: {e}")
+
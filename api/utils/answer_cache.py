@@ -0,0 +1,223 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .metrics import incr
+from .name_matcher import match_patients
+from .patient_directory import find_patient_record
+from .records import load_records, record_hash
+
+# Opt-in: answers are only cached with ANSWER_CACHE=1.
+ENABLED = os.environ.get("ANSWER_CACHE", "").lower() in ("1", "true", "yes")
+# Also match paraphrases by embedding similarity (one embeddings call per cache miss).
+SEMANTIC = os.environ.get("ANSWER_CACHE_SEMANTIC", "").lower() in ("1", "true", "yes")
+SIMILARITY_THRESHOLD = float(os.environ.get("ANSWER_CACHE_SIMILARITY", 0.92))
+EMBEDDING_MODEL = os.environ.get("ANSWER_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 512))
+
+# Tools whose answer depends on a single record, identified by their patient_id argument.
+RECORD_TOOLS = ("get_patient_info", "get_patient_summary", "search_transcript")
+# Tools whose answer depends on the encounter list as a whole.
+DIRECTORY_TOOLS = ("get_patient_names",)
+# Anything else (RAG over the external vector store) makes the answer uncacheable.
+
+NAMES_DEPENDENCY = "names"
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+_lock = threading.Lock()
+# normalised question -> entry; least recently used first
+_entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+# dependency key -> normalised questions whose answer used it
+_by_dependency: Dict[str, set] = {}
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def cacheable_question(messages: List[dict]) -> Optional[str]:
+    """
+    The question to cache on, or None if this turn's answer depends on earlier turns.
+
+    Only the opening question of a conversation is cached: a follow-up ("and his
+    labs?") means something different in every conversation.
+    """
+    turns = [m for m in messages if isinstance(m, dict) and m.get("role") in ("user", "assistant")]
+    if len(turns) != 1 or turns[0].get("role") != "user" or not isinstance(turns[0].get("content"), str):
+        return None
+    return normalize_question(turns[0]["content"]) or None
+
+
+def _record_dependency(patient_id: str) -> str:
+    return f"record:{patient_id}"
+
+
+def _names_hash() -> str:
+    encounters = load_records().get("patient_scribes", {})
+    names = sorted((pid, rec.get("patient", {}).get("name", "")) for pid, rec in encounters.items())
+    return record_hash({"names": names})
+
+
+def _dependency_patients(dependencies: Dict[str, str]) -> FrozenSet[str]:
+    return frozenset(key.split(":", 1)[1] for key in dependencies if key.startswith("record:"))
+
+
+def _current_hash(dependency: str) -> str:
+    if dependency == NAMES_DEPENDENCY:
+        return _names_hash()
+    _, record = find_patient_record(dependency.split(":", 1)[1])
+    return record_hash(record) if record is not None else "missing"
+
+
+def dependencies_for(tool_calls: Iterable[Tuple[str, str]], patient_ids: Iterable[str] = ()) -> Optional[Dict[str, str]]:
+    """
+    Content hashes of everything an answer was built from.
+
+    Args:
+        tool_calls: (tool name, JSON arguments) for every call made while answering
+        patient_ids: Patients whose data was handed to the model up front
+
+    Returns:
+        {dependency key: content hash}, or None if a tool outside the record store
+        was used and the answer can't be cached.
+    """
+    keys = {_record_dependency(pid) for pid in patient_ids}
+    for name, arguments in tool_calls:
+        if name in DIRECTORY_TOOLS:
+            keys.add(NAMES_DEPENDENCY)
+        elif name in RECORD_TOOLS:
+            try:
+                keys.add(_record_dependency(json.loads(arguments)["patient_id"]))
+            except (ValueError, KeyError, TypeError):
+                return None
+        else:
+            return None
+    return {key: _current_hash(key) for key in keys}
+
+
+def embed(text: str) -> Optional[List[float]]:
+    """Unit-normalised embedding of `text`, or None if semantic lookup is off or fails."""
+    if not SEMANTIC:
+        return None
+    from .clients import get_client, upstream_slot
+
+    try:
+        with upstream_slot("embed"):
+            response = get_client().embeddings.create(model=EMBEDDING_MODEL, input=text)
+    except Exception as e:
+        print(f"[ANSWER_CACHE] Embedding failed: {e}")
+        return None
+    vector = response.data[0].embedding
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _drop(question: str) -> None:
+    entry = _entries.pop(question, None)
+    if entry:
+        for key in entry["dependencies"]:
+            _by_dependency.get(key, set()).discard(question)
+
+
+def _is_current(entry: Dict[str, Any]) -> bool:
+    return all(_current_hash(key) == digest for key, digest in entry["dependencies"].items())
+
+
+def _find(question: str, embedding: Optional[List[float]],
+          patients: FrozenSet[str] = frozenset()) -> Tuple[Optional[Dict[str, Any]], str, float]:
+    with _lock:
+        entry = _entries.get(question)
+        if entry is not None or embedding is None:
+            return entry, "exact", 1.0
+        best, best_score = None, SIMILARITY_THRESHOLD
+        for candidate in _entries.values():
+            # The same question about another patient embeds almost identically
+            if candidate["embedding"] is None or _dependency_patients(candidate["dependencies"]) != patients:
+                continue
+            score = sum(a * b for a, b in zip(embedding, candidate["embedding"]))
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best, "semantic", best_score
+
+
+def lookup(question: str) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+    """
+    Cached answer for `question`, by exact match or, with ANSWER_CACHE_SEMANTIC, by
+    the most similar stored question at or above SIMILARITY_THRESHOLD whose answer
+    used the records of exactly the patients this question names.
+
+    Entries whose records changed since they were stored are dropped, not returned.
+
+    Returns:
+        ({"answer", "match": "exact" | "semantic", "similarity"} or None, the
+        question's embedding if one was computed, to pass on to `store`).
+    """
+    embedding = None
+    entry, match, similarity = _find(question, None)
+    if entry is None and SEMANTIC:
+        embedding = embed(question)
+        patients = frozenset(m["patient_id"] for m in match_patients(question))
+        entry, match, similarity = _find(question, embedding, patients)
+
+    if entry is None:
+        incr("answer_cache", outcome="miss")
+        return None, embedding
+    if not _is_current(entry):
+        with _lock:
+            _drop(entry["question"])
+        incr("answer_cache", outcome="stale")
+        return None, embedding
+
+    with _lock:
+        if entry["question"] in _entries:
+            _entries.move_to_end(entry["question"])
+    incr("answer_cache", outcome=f"hit_{match}")
+    return {"answer": entry["answer"], "match": match, "similarity": round(similarity, 4)}, embedding
+
+
+def store(question: str, answer: str, dependencies: Dict[str, str], embedding: Optional[List[float]] = None) -> None:
+    """Cache an answer together with the content hashes of the records it used."""
+    with _lock:
+        _drop(question)
+        _entries[question] = {
+            "question": question,
+            "answer": answer,
+            "dependencies": dependencies,
+            "embedding": embedding,
+        }
+        for key in dependencies:
+            _by_dependency.setdefault(key, set()).add(question)
+        while len(_entries) > MAX_ENTRIES:
+            _drop(next(iter(_entries)))
+    incr("answer_cache", outcome="stored")
+
+
+def invalidate_patient(patient_id: str, section: str = "patient_scribes") -> int:
+    """
+    Drop every cached answer that used this patient's record, plus those that used
+    the encounter list if an encounter (`patient_scribes`) was written.
+
+    Returns:
+        Number of entries dropped.
+    """
+    with _lock:
+        questions = set(_by_dependency.pop(_record_dependency(patient_id), set()))
+        if section == "patient_scribes":
+            questions |= _by_dependency.pop(NAMES_DEPENDENCY, set())
+        for question in questions:
+            _drop(question)
+    if questions:
+        incr("answer_cache_invalidated", len(questions))
+    return len(questions)
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+        _by_dependency.clear()
@@ -0,0 +1,299 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote_to_bytes
+
+from .attachment import ClientAttachment
+from .metrics import incr, observe
+from .transcript_index import tokenize
+
+# Characters of attachment text added to one message, split between its attachments.
+BUDGET_CHARS = int(os.environ.get("ATTACHMENT_BUDGET_CHARS", 8000))
+# Documents longer than their share of the budget are cut into chunks this size and
+# the chunks most relevant to the message are sent.
+CHUNK_CHARS = int(os.environ.get("ATTACHMENT_CHUNK_CHARS", 1200))
+MAX_BYTES = int(os.environ.get("ATTACHMENT_MAX_BYTES", 20 * 1024 * 1024))
+WORKERS = int(os.environ.get("ATTACHMENT_WORKERS", 4))
+# Extracted documents kept in memory (least recently used are dropped first).
+MAX_CACHED_DOCUMENTS = int(os.environ.get("ATTACHMENT_CACHE_SIZE", 64))
+
+PDF_TYPES = ("application/pdf",)
+XLSX_TYPES = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.ms-excel.sheet.macroenabled.12",
+)
+TEXT_TYPES = ("application/json", "application/csv", "application/xml")
+
+_lock = threading.Lock()
+# sha256 of the bytes -> extracted document
+_documents: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+# sha256 -> extraction in progress, so concurrent requests for one file parse it once
+_pending: Dict[str, Future] = {}
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="attachments")
+    return _pool
+
+
+def decode_data_url(url: str) -> Optional[Tuple[str, bytes]]:
+    """
+    Decode a `data:` URL (what the chat client sends for attached files).
+
+    Returns:
+        (media type, bytes), or None for other URLs or malformed data.
+    """
+    if not url.startswith("data:") or "," not in url:
+        return None
+    header, payload = url[5:].split(",", 1)
+    params = header.split(";")
+    try:
+        data = base64.b64decode(payload, validate=False) if "base64" in params[1:] else unquote_to_bytes(payload)
+    except (binascii.Error, ValueError):
+        return None
+    return params[0] or "text/plain", data
+
+
+def _kind(content_type: str, name: str) -> Optional[str]:
+    content_type = content_type.lower()
+    extension = os.path.splitext(name.lower())[1]
+    if content_type in PDF_TYPES or extension == ".pdf":
+        return "pdf"
+    if content_type in XLSX_TYPES or extension in (".xlsx", ".xlsm"):
+        return "xlsx"
+    if content_type.startswith("text/") or content_type in TEXT_TYPES or extension in (".txt", ".csv", ".md", ".json"):
+        return "text"
+    return None
+
+
+def _extract_pdf(data: bytes) -> Tuple[str, Dict[str, Any]]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    pages = []
+    for number, page in enumerate(reader.pages, start=1):
+        text = (page.extract_text() or "").strip()
+        if text:
+            pages.append(f"[Page {number}]\n{text}")
+    return "\n\n".join(pages), {"pages": len(reader.pages)}
+
+
+def _extract_xlsx(data: bytes) -> Tuple[str, Dict[str, Any]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        sheets = []
+        for sheet in workbook.worksheets:
+            rows = []
+            for row in sheet.iter_rows(values_only=True):
+                cells = ["" if value is None else str(value) for value in row]
+                if any(cells):
+                    rows.append("\t".join(cells).rstrip("\t"))
+            if rows:
+                sheets.append(f"[Sheet {sheet.title}]\n" + "\n".join(rows))
+        return "\n\n".join(sheets), {"sheets": len(workbook.worksheets)}
+    finally:
+        workbook.close()
+
+
+def _chunks(text: str) -> List[str]:
+    """Cut text into chunks of about CHUNK_CHARS, at paragraph or line breaks where possible."""
+    chunks, current = [], ""
+    for block in text.replace("\r\n", "\n").split("\n"):
+        while len(block) > CHUNK_CHARS:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(block[:CHUNK_CHARS])
+            block = block[CHUNK_CHARS:]
+        if current and len(current) + len(block) + 1 > CHUNK_CHARS:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{block}" if current else block
+    if current.strip():
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+
+def _extract(kind: str, data: bytes) -> Dict[str, Any]:
+    started = time.perf_counter()
+    if kind == "pdf":
+        text, details = _extract_pdf(data)
+    elif kind == "xlsx":
+        text, details = _extract_xlsx(data)
+    else:
+        text, details = data.decode("utf-8", errors="replace"), {}
+    observe("attachment_extract_s", time.perf_counter() - started, kind=kind)
+    chunks = _chunks(text)
+    return {
+        "kind": kind,
+        "text": text,
+        "chunks": chunks,
+        "chunk_terms": [frozenset(tokenize(chunk)) for chunk in chunks],
+        **details,
+    }
+
+
+def get_document(kind: str, data: bytes) -> Future:
+    """
+    Extracted document for `data`, parsed at most once per process.
+
+    Returns:
+        Future resolving to {"kind", "text", "chunks", "chunk_terms", ...}; already
+        resolved when the document is cached.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    pool = _get_pool()
+    with _lock:
+        cached = _documents.get(digest)
+        if cached is not None:
+            _documents.move_to_end(digest)
+            incr("attachment_cache", outcome="hit")
+            future: Future = Future()
+            future.set_result(cached)
+            return future
+        pending = _pending.get(digest)
+        if pending is not None:
+            incr("attachment_cache", outcome="pending")
+            return pending
+        incr("attachment_cache", outcome="miss")
+        future = _pending[digest] = pool.submit(_extract, kind, data)
+
+    def done(f: Future) -> None:
+        with _lock:
+            _pending.pop(digest, None)
+            if f.exception() is None:
+                _documents[digest] = f.result()
+                while len(_documents) > MAX_CACHED_DOCUMENTS:
+                    _documents.popitem(last=False)
+
+    future.add_done_callback(done)
+    return future
+
+
+def excerpt(document: Dict[str, Any], query: str, budget: int) -> Tuple[str, bool]:
+    """
+    Up to `budget` characters of a document.
+
+    Short documents are returned whole. Otherwise the chunks sharing the most terms
+    with `query` are picked (leading chunks when nothing matches) and returned in
+    document order, with `[...]` marking the gaps.
+
+    Returns:
+        (text, whether it was cut)
+    """
+    text = document["text"]
+    if len(text) <= budget:
+        return text, False
+
+    terms = set(tokenize(query))
+    ranked = sorted(
+        range(len(document["chunks"])),
+        key=lambda i: (-len(terms & document["chunk_terms"][i]), i),
+    )
+    picked, used = [], 0
+    for i in ranked:
+        size = len(document["chunks"][i]) + 6
+        if used + size > budget:
+            continue
+        picked.append(i)
+        used += size
+    if not picked:
+        return text[:budget], True
+
+    parts, previous = [], -1
+    for i in sorted(picked):
+        if i != previous + 1:
+            parts.append("[...]")
+        parts.append(document["chunks"][i])
+        previous = i
+    if previous != len(document["chunks"]) - 1:
+        parts.append("[...]")
+    return "\n".join(parts), True
+
+
+def _describe(name: str, content_type: str, document: Dict[str, Any], cut: bool) -> str:
+    details = [content_type]
+    if "pages" in document:
+        details.append(f"{document['pages']} pages")
+    if "sheets" in document:
+        details.append(f"{document['sheets']} sheets")
+    details.append(f"{len(document['text'])} chars")
+    if cut:
+        details.append("excerpt")
+    return f"[Attachment: {name} ({', '.join(details)})]"
+
+
+def _prepare(attachments: Optional[List[ClientAttachment]]) -> List[Tuple[ClientAttachment, Optional[Future], Optional[str]]]:
+    """Decode a message's attachments and start extracting the supported ones."""
+    entries = []
+    for attachment in attachments or []:
+        decoded = decode_data_url(attachment.url)
+        if decoded is None:
+            entries.append((attachment, None, "not readable (only inline file data is supported)"))
+            continue
+        media_type, data = decoded
+        content_type = attachment.contentType or media_type
+        kind = _kind(content_type, attachment.name)
+        if kind is None:
+            entries.append((attachment, None, f"{content_type} not included"))
+        elif len(data) > MAX_BYTES:
+            entries.append((attachment, None, f"larger than {MAX_BYTES // (1024 * 1024)} MB, not included"))
+        else:
+            entries.append((attachment, get_document(kind, data), None))
+    return entries
+
+
+def _render(entries: List[Tuple[ClientAttachment, Optional[Future], Optional[str]]], query: str) -> str:
+    readable = sum(1 for _, future, _ in entries if future is not None)
+    share = BUDGET_CHARS // readable if readable else 0
+    blocks = []
+    for attachment, future, note in entries:
+        if future is None:
+            blocks.append(f"[Attachment: {attachment.name} {note}]")
+            continue
+        try:
+            document = future.result()
+        except Exception as e:
+            incr("attachment_errors")
+            print(f"[ATTACHMENTS] Could not extract {attachment.name}: {e}")
+            blocks.append(f"[Attachment: {attachment.name} could not be read]")
+            continue
+        text, cut = excerpt(document, query, share)
+        observe("attachment_chars", len(text))
+        blocks.append(f"{_describe(attachment.name, attachment.contentType, document, cut)}\n{text}")
+    return "\n\n".join(blocks)
+
+
+def render_attachments(messages: List[Tuple[Optional[List[ClientAttachment]], str]]) -> List[str]:
+    """
+    Text to append to each message for its attachments.
+
+    PDF, XLSX and text files of all messages are extracted in parallel in the worker
+    pool (each file once per process, keyed by content hash) and budgeted to
+    BUDGET_CHARS per message, using the message text to pick the relevant chunks of
+    long documents. The output depends only on the message and its files, so
+    re-sent history renders identically on later turns. Other files (images) are
+    listed but not included.
+
+    Args:
+        messages: (attachments, message text) per message
+
+    Returns:
+        One string per message ("" when it has no attachments).
+    """
+    prepared = [_prepare(attachments) for attachments, _ in messages]
+    return [_render(entries, query) for entries, (_, query) in zip(prepared, messages)]
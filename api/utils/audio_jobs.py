@@ -0,0 +1,457 @@
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .admission import admit_blocking
+from .change_feed import publish
+from .clients import UpstreamBusyError, get_client, upstream_slot
+from .metrics import incr, observe, set_gauge
+from .write_queue import WRITE_TIMEOUT_S, submit
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: jobs are only claimed within this process
+    fcntl = None
+
+# Job state and uploaded audio live here, so jobs survive a restart and any worker can answer status.
+JOBS_DIR = os.environ.get("AUDIO_JOBS_DIR") or os.path.join(tempfile.gettempdir(), "ai_scribe_audio_jobs")
+# Recordings transcribed at once, and chunk uploads in flight across all of them
+# (each upload also holds an UPSTREAM_CONCURRENCY slot).
+JOB_WORKERS = int(os.environ.get("AUDIO_JOB_WORKERS", 2))
+CHUNK_WORKERS = int(os.environ.get("AUDIO_CHUNK_WORKERS", 4))
+# Jobs waiting for a worker before new submissions are refused.
+MAX_QUEUED = int(os.environ.get("AUDIO_JOB_QUEUE_MAX", 32))
+MAX_UPLOAD_BYTES = int(os.environ.get("AUDIO_JOB_MAX_BYTES", 500 * 1024 * 1024))
+CHUNK_SECONDS = float(os.environ.get("AUDIO_CHUNK_SECONDS", 300))
+CHUNK_RETRIES = int(os.environ.get("AUDIO_CHUNK_RETRIES", 3))
+TRANSCRIBE_MODEL = os.environ.get("AUDIO_TRANSCRIBE_MODEL", "gpt-4o-transcribe-diarize")
+
+# Largest file the transcription endpoint accepts; WAV chunks are sized to stay under it.
+UPSTREAM_MAX_BYTES = 25 * 1024 * 1024
+DEFAULT_SPEAKERS = ("Provider", "Patient")
+# Length limits of a known-speaker reference clip
+REFERENCE_MIN_S, REFERENCE_MAX_S = 2.0, 10.0
+
+ACTIVE_STATUSES = ("queued", "running", "writing")
+
+_lock = threading.Lock()
+_job_pool: Optional[ThreadPoolExecutor] = None
+_chunk_pool: Optional[ThreadPoolExecutor] = None
+# Job IDs queued or running in this process
+_active: set = set()
+
+
+def _pools() -> Tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+    global _job_pool, _chunk_pool
+    with _lock:
+        if _job_pool is None:
+            _job_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="audio-jobs")
+            _chunk_pool = ThreadPoolExecutor(max_workers=CHUNK_WORKERS, thread_name_prefix="audio-chunks")
+            _resume_jobs()
+        return _job_pool, _chunk_pool
+
+
+def start_workers() -> None:
+    """Start the worker pools, resuming jobs a previous process left unfinished."""
+    _pools()
+
+
+def _job_path(job_id: str, suffix: str = ".json") -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}{suffix}")
+
+
+def _save(job: Dict[str, Any]) -> None:
+    """Write the job state atomically (readers never see a half-written file)."""
+    job["updated"] = time.time()
+    fd, tmp_path = tempfile.mkstemp(dir=JOBS_DIR, prefix=".job.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, _job_path(job["id"]))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def load_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Stored state of a job, or None if there is no such job."""
+    if not job_id.isalnum():
+        return None
+    try:
+        with open(_job_path(job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job without its transcript."""
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "patient_id": job["patient_id"],
+        "filename": job["filename"],
+        "duration_s": job.get("duration_s"),
+        "chunks_total": job.get("chunks_total"),
+        "chunks_done": len(job.get("chunks", {})),
+        "segments": len(job["segments"]) if job.get("segments") is not None else None,
+        "error": job.get("error"),
+        "created": job["created"],
+        "updated": job["updated"],
+    }
+
+
+def _wav_params(path: str) -> Optional[Tuple[int, int, int, int]]:
+    """(channels, sample width, frame rate, frames) of a PCM WAV file, or None for other formats."""
+    try:
+        with wave.open(path, "rb") as w:
+            return w.getnchannels(), w.getsampwidth(), w.getframerate(), w.getnframes()
+    except (wave.Error, EOFError):
+        return None
+
+
+def create_job(patient_id: str, filename: str, content_type: str, audio: io.BufferedIOBase,
+               speakers: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Store an uploaded recording and queue it for transcription.
+
+    Args:
+        patient_id: patient_scribes record the transcript is appended to
+        filename: Original file name (its extension tells the format)
+        content_type: Upload content type
+        audio: File object with the recording, read in blocks
+        speakers: Names for speakers in order of first appearance (default Provider, Patient)
+
+    Returns:
+        The job state, or {"error": ..., "status_code": ...} when the upload is rejected.
+    """
+    # Resume leftover jobs before this one is written, so it isn't picked up twice
+    start_workers()
+    with _lock:
+        queued = len(_active)
+    if queued >= MAX_QUEUED + JOB_WORKERS:
+        incr("audio_jobs_rejected", reason="queue_full")
+        return {"error": f"{queued} recordings are already being transcribed, try again later", "status_code": 429}
+
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    job_id = uuid.uuid4().hex[:16]
+    extension = os.path.splitext(filename)[1].lower()
+    if not extension[1:].isalnum():
+        extension = ".audio"
+    audio_path = _job_path(job_id, extension)
+    size = 0
+    with open(audio_path, "wb") as f:
+        while True:
+            block = audio.read(1024 * 1024)
+            if not block:
+                break
+            size += len(block)
+            if size > MAX_UPLOAD_BYTES:
+                f.close()
+                os.unlink(audio_path)
+                incr("audio_jobs_rejected", reason="too_large")
+                return {"error": f"Recording is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB", "status_code": 413}
+            f.write(block)
+
+    params = _wav_params(audio_path)
+    if params is None and size > UPSTREAM_MAX_BYTES:
+        os.unlink(audio_path)
+        incr("audio_jobs_rejected", reason="unsplittable")
+        return {"error": "Recordings over 25 MB must be uncompressed (PCM) WAV so they can be split", "status_code": 400}
+
+    job = {
+        "id": job_id,
+        "status": "queued",
+        "patient_id": patient_id,
+        "filename": filename,
+        "content_type": content_type,
+        "audio_path": audio_path,
+        "bytes": size,
+        "speakers": list(speakers or DEFAULT_SPEAKERS),
+        "duration_s": params[3] / params[2] if params else None,
+        "chunks_total": None,
+        # chunk index (as str) -> segments with times relative to the recording
+        "chunks": {},
+        "segments": None,
+        "error": None,
+        "created": time.time(),
+    }
+    _save(job)
+    incr("audio_jobs_submitted")
+    _enqueue(job_id)
+    print(f"[AUDIO_JOBS] Queued {job_id} for {patient_id}: {filename} ({size} bytes)")
+    return job
+
+
+def _enqueue(job_id: str) -> None:
+    job_pool, _ = _pools()
+    with _lock:
+        if job_id in _active:
+            return
+        _active.add(job_id)
+        set_gauge("audio_jobs_active", len(_active))
+    job_pool.submit(_run_job, job_id)
+
+
+def _resume_jobs() -> None:
+    """Queue jobs left unfinished by a previous process (called once, with _lock held)."""
+    if not os.path.isdir(JOBS_DIR):
+        return
+    for name in os.listdir(JOBS_DIR):
+        if not name.endswith(".json") or name.startswith("."):
+            continue
+        job = load_job(name[:-5])
+        if job and job["status"] in ACTIVE_STATUSES and job["id"] not in _active:
+            print(f"[AUDIO_JOBS] Resuming {job['id']} ({job['status']})")
+            _active.add(job["id"])
+            _job_pool.submit(_run_job, job["id"])
+    set_gauge("audio_jobs_active", len(_active))
+
+
+def _plan_chunks(job: Dict[str, Any]) -> List[Tuple[float, float]]:
+    """(start, end) seconds of each chunk; one chunk for formats that can't be split."""
+    params = _wav_params(job["audio_path"])
+    if params is None:
+        return [(0.0, 0.0)]
+    channels, width, rate, frames = params
+    # Stay under the upload limit, with room for the WAV header
+    max_seconds = (UPSTREAM_MAX_BYTES - 1024) / (channels * width * rate)
+    step = min(CHUNK_SECONDS, max_seconds)
+    duration = frames / rate
+    chunks, start = [], 0.0
+    while start < duration:
+        chunks.append((start, min(start + step, duration)))
+        start += step
+    return chunks or [(0.0, 0.0)]
+
+
+def _wav_clip(path: str, start: float, end: float) -> bytes:
+    """WAV bytes of [start, end) seconds of a PCM WAV file."""
+    with wave.open(path, "rb") as src:
+        rate = src.getframerate()
+        src.setpos(int(start * rate))
+        frames = src.readframes(int((end - start) * rate))
+        out = io.BytesIO()
+        with wave.open(out, "wb") as dst:
+            dst.setnchannels(src.getnchannels())
+            dst.setsampwidth(src.getsampwidth())
+            dst.setframerate(rate)
+            dst.writeframes(frames)
+    return out.getvalue()
+
+
+def _timestamp(seconds: float) -> str:
+    """`t` of a transcript segment: MM:SS from the start of the recording."""
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def _transcribe(name: str, audio: bytes, references: Optional[Dict[str, str]]) -> List[Tuple[float, float, str, str]]:
+    """
+    Transcribe one chunk.
+
+    Returns:
+        (start, end, speaker label, text) per segment, times relative to the chunk.
+        Labels are the model's own (e.g. "A"), or names from `references`.
+    """
+    diarize = "diarize" in TRANSCRIBE_MODEL
+    kwargs: Dict[str, Any] = {"model": TRANSCRIBE_MODEL, "file": (name, audio)}
+    if diarize:
+        kwargs.update(response_format="diarized_json", chunking_strategy="auto")
+        if references:
+            kwargs.update(known_speaker_names=list(references), known_speaker_references=list(references.values()))
+    else:
+        kwargs.update(response_format="verbose_json", timestamp_granularities=["segment"])
+
+    for attempt in range(CHUNK_RETRIES + 1):
+        try:
+            # Background uploads queue behind interactive requests
+            ticket = admit_blocking("transcribe-jobs")
+            try:
+                with upstream_slot("transcribe"):
+                    result = get_client().audio.transcriptions.create(**kwargs)
+            finally:
+                ticket.release()
+            break
+        except UpstreamBusyError:
+            if attempt == CHUNK_RETRIES:
+                raise
+            incr("audio_chunk_retries")
+            time.sleep(2 ** attempt)
+    return [
+        (s.start, s.end, s.speaker if diarize else "", s.text.strip())
+        for s in result.segments or []
+        if s.text.strip()
+    ]
+
+
+def _speaker_names(job: Dict[str, Any], labels: List[str]) -> Dict[str, str]:
+    """Map model speaker labels, in order of first appearance, to the job's speaker names."""
+    names: Dict[str, str] = {}
+    for label in labels:
+        if label not in names:
+            position = len(names)
+            names[label] = job["speakers"][position] if position < len(job["speakers"]) else f"Speaker {position + 1}"
+    return names
+
+
+def _references(job: Dict[str, Any], segments: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Audio samples of each named speaker from the first chunk (as data URLs), so later
+    chunks, transcribed independently, label the same voices with the same names.
+    """
+    if _wav_params(job["audio_path"]) is None:
+        return {}
+    longest: Dict[str, Dict[str, Any]] = {}
+    for segment in segments:
+        length = segment["end"] - segment["start"]
+        best = longest.get(segment["speaker"])
+        if length >= REFERENCE_MIN_S and (best is None or length > best["end"] - best["start"]):
+            longest[segment["speaker"]] = segment
+    references = {}
+    for speaker, segment in list(longest.items())[:4]:
+        clip = _wav_clip(job["audio_path"], segment["start"], min(segment["end"], segment["start"] + REFERENCE_MAX_S))
+        references[speaker] = "data:audio/wav;base64," + base64.b64encode(clip).decode()
+    return references
+
+
+def _transcribe_chunk(job: Dict[str, Any], index: int, start: float, end: float,
+                      references: Optional[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Segments of one chunk, with times relative to the whole recording and speaker names."""
+    started = time.perf_counter()
+    if end > start:
+        name, audio = f"{job['id']}_{index:03d}.wav", _wav_clip(job["audio_path"], start, end)
+    else:
+        with open(job["audio_path"], "rb") as f:
+            name, audio = job["filename"], f.read()
+    raw = _transcribe(name, audio, references)
+    observe("audio_chunk_latency_s", time.perf_counter() - started)
+    incr("audio_chunks_transcribed")
+
+    if references:
+        # Named by the model from the references; voices it couldn't match keep their label
+        names = {label: label if label in references else f"Speaker {label}" for _, _, label, _ in raw}
+    else:
+        names = _speaker_names(job, [label for _, _, label, _ in raw if label])
+    return [
+        {"start": start + s, "end": start + e, "speaker": names.get(label, "Speaker"), "text": text}
+        for s, e, label, text in raw
+    ]
+
+
+def _claim(job_id: str):
+    """Lock file held while a process runs the job, or None if another process has it."""
+    lock_file = open(_job_path(job_id, ".lock"), "a")
+    if fcntl:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+    return lock_file
+
+
+def _append_transcript(job: Dict[str, Any]) -> None:
+    """Append the job's segments to the patient's transcript through the write queue."""
+    section, patient_id, segments = "patient_scribes", job["patient_id"], job["segments"]
+    changed = {}
+
+    def mutation(data: Dict[str, Any]) -> int:
+        record = data.get(section, {}).get(patient_id)
+        if record is None:
+            raise KeyError(f"Patient ID '{patient_id}' not found in {section}")
+        transcript = record.setdefault("transcript", [])
+        # A job resumed after a crash may already have been appended
+        if segments and transcript[-len(segments):] == segments:
+            return len(transcript)
+        transcript.extend(segments)
+        changed["record"] = record
+        return len(transcript)
+
+    def committed() -> None:
+        if "record" in changed:
+            publish("update", section, patient_id, changed["record"])
+
+    submit(mutation, committed).result(timeout=WRITE_TIMEOUT_S)
+
+
+def _discard_files(job: Dict[str, Any]) -> None:
+    """Delete a finished or failed job's uploaded audio and lock file; its state is kept."""
+    for path in (job.get("audio_path"), _job_path(job["id"], ".lock")):
+        try:
+            if path:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _run_job(job_id: str) -> None:
+    lock_file = None
+    try:
+        lock_file = _claim(job_id)
+        job = load_job(job_id)
+        if lock_file is None or job is None or job["status"] not in ACTIVE_STATUSES:
+            return
+        started = time.perf_counter()
+        if job["status"] == "queued":
+            observe("audio_job_wait_s", time.time() - job["created"])
+        job["status"] = "running"
+        plan = _plan_chunks(job)
+        job["chunks_total"] = len(plan)
+        _save(job)
+        _, chunk_pool = _pools()
+
+        # The first chunk names the speakers; the rest run in parallel against its voices
+        if "0" not in job["chunks"]:
+            job["chunks"]["0"] = _transcribe_chunk(job, 0, *plan[0], None)
+            _save(job)
+        references = _references(job, job["chunks"]["0"])
+        pending = {
+            index: chunk_pool.submit(_transcribe_chunk, job, index, start, end, references)
+            for index, (start, end) in enumerate(plan)
+            if str(index) not in job["chunks"]
+        }
+        for index, future in pending.items():
+            job["chunks"][str(index)] = future.result()
+            _save(job)
+
+        job["segments"] = [
+            {"t": _timestamp(segment["start"]), "speaker": segment["speaker"], "text": segment["text"]}
+            for index in range(len(plan))
+            for segment in job["chunks"][str(index)]
+        ]
+        job["status"] = "writing"
+        _save(job)
+        _append_transcript(job)
+        job["status"] = "done"
+        _save(job)
+        _discard_files(job)
+        observe("audio_job_latency_s", time.perf_counter() - started)
+        incr("audio_jobs_completed", status="done")
+        print(f"[AUDIO_JOBS] {job_id}: appended {len(job['segments'])} segments to {job['patient_id']}")
+    except Exception as e:
+        print(f"[AUDIO_JOBS] {job_id} failed: {e}")
+        incr("audio_jobs_completed", status="failed")
+        job = load_job(job_id)
+        if job is not None:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            _save(job)
+            # Failed jobs are not retried, so don't keep a recording of up to MAX_UPLOAD_BYTES
+            if lock_file is not None:
+                _discard_files(job)
+    finally:
+        if lock_file is not None:
+            lock_file.close()
+        with _lock:
+            _active.discard(job_id)
+            set_gauge("audio_jobs_active", len(_active))
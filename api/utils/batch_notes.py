@@ -0,0 +1,258 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, Optional, Set
+
+from .admission import admit_blocking
+from .clients import get_client, upstream_slot
+from .intake_export import iter_intakes
+from .metrics import incr, observe
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: batches are only claimed within this process
+    fcntl = None
+
+# Batch state and per-item results (checkpoints) live here.
+BATCH_DIR = os.environ.get("BATCH_NOTES_DIR") or os.path.join(tempfile.gettempdir(), "ai_scribe_batch_notes")
+CONCURRENCY = int(os.environ.get("BATCH_NOTES_CONCURRENCY", 4))
+MAX_CONCURRENCY = 16
+# Model for notes; "local" writes a template note from the record without calling
+# upstream (for tests and dry runs).
+MODEL = os.environ.get("BATCH_NOTES_MODEL", "gpt-4.1-mini")
+LOCAL_MODEL = "local"
+
+NOTE_INSTRUCTIONS = """
+You write provider-ready pre-visit notes from patient intake records collected by an
+AI intake assistant. The record is JSON. Write a concise note with these sections:
+Patient, Chief Complaint, History of Present Illness, Medications, Conditions,
+Allergies, Family History, Intake Assessment, Suggested Follow-up.
+Use only facts in the record; write "Not reported" for missing items. Do not diagnose.
+Flag anything urgent at the top as "URGENT:".
+""".strip()
+
+_lock = threading.Lock()
+# Batch IDs running in this process
+_running: Set[str] = set()
+
+
+def _path(batch_id: str, suffix: str) -> str:
+    return os.path.join(BATCH_DIR, f"{batch_id}{suffix}")
+
+
+def _save(batch: Dict[str, Any]) -> None:
+    batch["updated"] = time.time()
+    fd, tmp_path = tempfile.mkstemp(dir=BATCH_DIR, prefix=".batch.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(batch, f)
+        os.replace(tmp_path, _path(batch["id"], ".json"))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def load_batch(batch_id: str) -> Optional[Dict[str, Any]]:
+    """Stored state of a batch, or None if there is no such batch."""
+    if not batch_id.isalnum():
+        return None
+    try:
+        with open(_path(batch_id, ".json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _read_results(batch_id: str) -> Dict[str, Dict[str, Any]]:
+    """Latest result per patient from the checkpoint file (a retried item's last line wins)."""
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        with open(_path(batch_id, ".results.jsonl")) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash; that item is simply redone
+                    continue
+                results[result["id"]] = result
+    except FileNotFoundError:
+        pass
+    return results
+
+
+def iter_results(batch_id: str) -> Iterator[str]:
+    """Per-item results of a batch as NDJSON lines."""
+    for result in _read_results(batch_id).values():
+        yield json.dumps(result) + "\n"
+
+
+def local_note(patient_id: str, record: Dict[str, Any]) -> str:
+    """Deterministic stand-in for the model: the note sections filled straight from the record."""
+    info = record.get("patient_info", {})
+
+    def listed(key: str) -> str:
+        items = record.get(key) or []
+        return ", ".join(item if isinstance(item, str) else json.dumps(item) for item in items) or "Not reported"
+
+    return "\n".join([
+        f"Patient: {info.get('name', patient_id)}, {info.get('age', '?')} {info.get('sex', '')}".rstrip(),
+        f"Chief Complaint: {record.get('chief_complaint') or 'Not reported'}",
+        f"History of Present Illness: {record.get('conversation_summary') or 'Not reported'}",
+        f"Symptoms: {listed('symptoms')}",
+        f"Medications: {listed('current_medications')}",
+        f"Conditions: {listed('existing_conditions')}",
+        f"Allergies: {listed('allergies')}",
+        f"Family History: {record.get('family_history') or 'Not reported'}",
+        f"Intake Assessment: {record.get('ai_assessment') or 'Not reported'}",
+        f"Suggested Follow-up: review {record.get('reason_for_visit', 'intake')}",
+    ])
+
+
+def generate_note(patient_id: str, record: Dict[str, Any], model: str) -> Dict[str, Any]:
+    """
+    Write the note for one intake.
+
+    Returns:
+        {"note", "input_tokens", "output_tokens"}
+    """
+    if model == LOCAL_MODEL:
+        return {"note": local_note(patient_id, record), "input_tokens": 0, "output_tokens": 0}
+
+    # Queued behind interactive requests; the shared instructions keep the prompt prefix cacheable
+    ticket = admit_blocking("batch-notes")
+    try:
+        with upstream_slot("batch"):
+            response = get_client().responses.create(
+                model=model,
+                instructions=NOTE_INSTRUCTIONS,
+                input=json.dumps(record, sort_keys=True),
+                prompt_cache_key="batch-notes",
+            )
+    finally:
+        ticket.release()
+    usage = getattr(response, "usage", None)
+    return {
+        "note": response.output_text,
+        "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+    }
+
+
+def create_batch(filters: Dict[str, Any], model: Optional[str] = None,
+                 concurrency: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Record a new batch of notes for the intakes matching `filters` (see `intake_filter`).
+    Start it with `run_batch` (blocking) or `start_batch` (background thread).
+    """
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    batch = {
+        "id": uuid.uuid4().hex[:16],
+        "status": "queued",
+        "filters": filters,
+        "model": model or MODEL,
+        "concurrency": max(1, min(concurrency or CONCURRENCY, MAX_CONCURRENCY)),
+        "matched": None,
+        "done": 0,
+        "errors": 0,
+        "skipped": 0,
+        "error": None,
+        "created": time.time(),
+    }
+    _save(batch)
+    incr("batch_notes_created")
+    return batch
+
+
+def _process(patient_id: str, record: Dict[str, Any], model: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        result = {"id": patient_id, "status": "ok", **generate_note(patient_id, record, model)}
+    except Exception as e:
+        result = {"id": patient_id, "status": "error", "error": str(e)}
+    result["timestamp"] = record.get("timestamp")
+    result["duration_s"] = round(time.perf_counter() - started, 4)
+    observe("batch_note_s", result["duration_s"], model=model)
+    incr("batch_notes", status=result["status"])
+    return result
+
+
+def run_batch(batch_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Generate the batch's notes, `concurrency` at a time, and return its final state.
+
+    Each result is appended to the checkpoint file as soon as it is ready; items that
+    already succeeded (in an earlier, interrupted or partly failed run) are skipped,
+    so calling this again resumes the batch. Returns None if the batch doesn't exist
+    or another process is running it.
+    """
+    batch = load_batch(batch_id)
+    if batch is None:
+        return None
+    with _lock:
+        if batch_id in _running:
+            return None
+        _running.add(batch_id)
+    lock_file = open(_path(batch_id, ".lock"), "a")
+    try:
+        if fcntl:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return None
+
+        completed = {pid for pid, result in _read_results(batch_id).items() if result["status"] == "ok"}
+        batch.update(status="running", skipped=len(completed), done=len(completed), errors=0, error=None)
+        _save(batch)
+        started = time.perf_counter()
+        matched = 0
+
+        with open(_path(batch_id, ".results.jsonl"), "a") as checkpoint, \
+                ThreadPoolExecutor(max_workers=batch["concurrency"], thread_name_prefix="batch-notes") as pool:
+            in_flight: Set[Future] = set()
+
+            def drain(block_until: int) -> None:
+                # Write finished items until at most `block_until` are still running
+                nonlocal in_flight
+                while len(in_flight) > block_until:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        result = future.result()
+                        checkpoint.write(json.dumps(result) + "\n")
+                        checkpoint.flush()
+                        batch["done" if result["status"] == "ok" else "errors"] += 1
+                    _save(batch)
+
+            # Records are read lazily; only `concurrency` * 2 are held at a time
+            for patient_id, record in iter_intakes(batch["filters"]):
+                matched += 1
+                if patient_id in completed:
+                    continue
+                in_flight.add(pool.submit(_process, patient_id, record, batch["model"]))
+                drain(batch["concurrency"] * 2)
+            drain(0)
+
+        batch.update(status="done", matched=matched)
+        _save(batch)
+        observe("batch_notes_run_s", time.perf_counter() - started)
+        print(f"[BATCH_NOTES] {batch_id}: {batch['done']} notes, {batch['errors']} errors "
+              f"({batch['skipped']} from checkpoint)")
+        return batch
+    except Exception as e:
+        print(f"[BATCH_NOTES] {batch_id} failed: {e}")
+        batch.update(status="failed", error=str(e))
+        _save(batch)
+        return batch
+    finally:
+        lock_file.close()
+        with _lock:
+            _running.discard(batch_id)
+
+
+def start_batch(batch_id: str) -> None:
+    """Run (or resume) a batch in a background thread."""
+    threading.Thread(target=run_batch, args=(batch_id,), name=f"batch-notes-{batch_id}", daemon=True).start()
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from itertools import islice
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from .metrics import incr, set_gauge
+from .patient_directory import summarize_record
+
+# Changes kept for resuming clients; one that fell further behind gets a `reset` event.
+LOG_SIZE = int(os.environ.get("CHANGE_FEED_SIZE", 1000))
+# Seconds between keep-alive comments on an idle stream.
+KEEPALIVE_S = float(os.environ.get("CHANGE_FEED_KEEPALIVE", 15))
+
+# Changes from another process (or before a restart) can't be replayed; event ids
+# carry this epoch so a resuming client is told to reload instead.
+EPOCH = uuid.uuid4().hex[:8]
+
+_lock = threading.Lock()
+_log: Deque[Dict[str, Any]] = deque(maxlen=LOG_SIZE)
+_seq = 0
+# (loop, event) of every open stream, woken when a change is published
+_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+
+def event_id(seq: int) -> str:
+    return f"{EPOCH}-{seq}"
+
+
+def parse_event_id(value: Optional[str]) -> Optional[int]:
+    """
+    Sequence number a client last saw, from `since` / `Last-Event-ID`.
+
+    Returns:
+        The sequence number, or -1 if the id is from another process or malformed
+        (the client has to reload), or None if there is no id.
+    """
+    if value in (None, ""):
+        return None
+    epoch, _, seq = value.rpartition("-")
+    if epoch != EPOCH or not seq.isdigit():
+        return -1
+    return int(seq)
+
+
+def publish(operation: str, section: str, patient_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Append a change to the log and wake every open stream.
+
+    Safe to call from any thread (e.g. the write queue's commit hook).
+
+    Returns:
+        The change: {"seq", "op", "section", "patient_id", "summary", "ts"}.
+    """
+    global _seq
+    change = {
+        "seq": 0,
+        "op": operation,
+        "section": section,
+        "patient_id": patient_id,
+        "summary": summarize_record(patient_id, section, record),
+        "ts": time.time(),
+    }
+    with _lock:
+        _seq += 1
+        change["seq"] = _seq
+        _log.append(change)
+        waiters = list(_waiters)
+    incr("change_feed_published", op=operation)
+
+    for loop, event in waiters:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # The stream's loop is already closed; its generator cleans up on exit
+            pass
+    return change
+
+
+def changes_since(seq: Optional[int]) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Changes after `seq`.
+
+    Returns:
+        (changes, reset) where `reset` means changes after `seq` were already dropped
+        from the log (or `seq` is unknown) and the client should reload its list.
+    """
+    with _lock:
+        if seq is None:
+            return [], False
+        if seq < 0 or seq > _seq:
+            return [], True
+        oldest = _log[0]["seq"] if _log else _seq + 1
+        if seq + 1 < oldest:
+            return [], True
+        # Sequence numbers in the log are consecutive
+        return list(islice(_log, seq + 1 - oldest, None)), False
+
+
+def current_seq() -> int:
+    with _lock:
+        return _seq
+
+
+def _sse(event: str, data: Dict[str, Any], seq: Optional[int] = None) -> str:
+    lines = []
+    if seq is not None:
+        lines.append(f"id: {event_id(seq)}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_changes(since: Optional[str] = None, section: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Server-sent events for changes after `since` (an event id), then live ones.
+
+    Each change is an `event: change` frame whose id resumes the stream. A client
+    that can't be resumed gets an `event: reset` frame (reload the list, then follow
+    from its id); a client without an id gets a `ready` frame with the current one.
+    Idle streams get a keep-alive comment every KEEPALIVE_S seconds.
+    """
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    waiter = (loop, wake)
+    with _lock:
+        _waiters.add(waiter)
+        set_gauge("change_feed_streams", len(_waiters))
+
+    try:
+        last = parse_event_id(since)
+        if last is None:
+            last = current_seq()
+            yield _sse("ready", {"seq": last}, last)
+
+        while True:
+            # Clear before reading the log so a publish in between isn't missed
+            wake.clear()
+            backlog, reset = changes_since(last)
+            if reset:
+                last = current_seq()
+                yield _sse("reset", {"seq": last}, last)
+                continue
+            for change in backlog:
+                last = change["seq"]
+                if section is None or change["section"] == section:
+                    yield _sse("change", change, last)
+            if backlog:
+                continue
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=KEEPALIVE_S)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+    finally:
+        with _lock:
+            _waiters.discard(waiter)
+            set_gauge("change_feed_streams", len(_waiters))
@@ -0,0 +1,265 @@
+import email.utils
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from .metrics import incr, observe, set_gauge
+
+# Load environment variables once for the whole API, instead of once per module.
+load_dotenv()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# Upstream transport settings, sized for one API process. All overridable via env.
+MAX_CONNECTIONS = int(_env_float("UPSTREAM_MAX_CONNECTIONS", 32))
+MAX_KEEPALIVE = int(_env_float("UPSTREAM_MAX_KEEPALIVE", 16))
+KEEPALIVE_EXPIRY_S = _env_float("UPSTREAM_KEEPALIVE_EXPIRY", 60.0)
+TIMEOUT_S = _env_float("UPSTREAM_TIMEOUT", 120.0)
+CONNECT_TIMEOUT_S = _env_float("UPSTREAM_CONNECT_TIMEOUT", 10.0)
+MAX_RETRIES = int(_env_float("UPSTREAM_MAX_RETRIES", 4))
+BACKOFF_BASE_S = _env_float("UPSTREAM_BACKOFF_BASE", 0.5)
+BACKOFF_MAX_S = _env_float("UPSTREAM_BACKOFF_MAX", 20.0)
+BREAKER_THRESHOLD = int(_env_float("UPSTREAM_BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN_S = _env_float("UPSTREAM_BREAKER_COOLDOWN", 30.0)
+CONCURRENCY = int(_env_float("UPSTREAM_CONCURRENCY", 16))
+SLOT_TIMEOUT_S = _env_float("UPSTREAM_SLOT_TIMEOUT", 30.0)
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+class UpstreamBusyError(RuntimeError):
+    """Raised when no upstream concurrency slot frees up within UPSTREAM_SLOT_TIMEOUT."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `threshold` failed calls in a row the breaker opens and calls fail fast for
+    `cooldown` seconds; then a single trial call is let through (half-open) and its
+    outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+            set_gauge("upstream_breaker_open", 0)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.threshold and (self._opened_at is None or self.state == "half_open"):
+                self._opened_at = time.monotonic()
+                incr("upstream_breaker_opened")
+                set_gauge("upstream_breaker_open", 1)
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parse `retry-after-ms` / `Retry-After` (seconds or HTTP date) from a response."""
+    retry_ms = response.headers.get("retry-after-ms")
+    if retry_ms:
+        try:
+            return float(retry_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = response.headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(retry_after)
+        return max(parsed.timestamp() - time.time(), 0.0) if parsed else None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)))
+
+
+class RetryTransport(httpx.BaseTransport):
+    """
+    httpx transport that retries rate-limited / failed upstream calls.
+
+    Retries 408/409/429/5xx responses and connection failures with jittered
+    exponential backoff, waiting at least as long as the server's Retry-After.
+    Every call goes through a shared circuit breaker so a failing upstream is not
+    hammered by every in-flight request.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, breaker: CircuitBreaker, max_retries: int = MAX_RETRIES):
+        self._transport = transport
+        self._breaker = breaker
+        self._max_retries = max_retries
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        # Buffer the body so it can be re-sent on retry (multipart audio uploads included).
+        request.read()
+
+        attempt = 0
+        while True:
+            if not self._breaker.allow():
+                incr("upstream_breaker_rejected")
+                raise CircuitOpenError("Upstream circuit breaker is open", request=request)
+
+            try:
+                response = self._transport.handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                self._breaker.record_failure()
+                if attempt >= self._max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self._breaker.record_success()
+                    return response
+                # A 429 means upstream is healthy but throttling us; don't trip the breaker.
+                if response.status_code != 429:
+                    self._breaker.record_failure()
+                if attempt >= self._max_retries:
+                    return response
+                retry_after = _retry_after_seconds(response)
+                delay = max(backoff_delay(attempt), retry_after or 0.0)
+                response.close()
+
+            incr("upstream_retries")
+            attempt += 1
+            time.sleep(min(delay, BACKOFF_MAX_S * 3))
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+_lock = threading.Lock()
+_client = None
+_breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN_S)
+_slots = threading.BoundedSemaphore(CONCURRENCY)
+_in_flight = 0
+
+# Vector store generated in testing_rag.py; override with VECTOR_STORE_ID.
+DEFAULT_VECTOR_STORE_ID = "vs_68f972091abc8191ac6168a7566427a1"
+_vector_store_id: Optional[str] = None
+
+
+def build_http_client() -> httpx.Client:
+    """Pooled keep-alive HTTP client with retry/backoff and the shared circuit breaker."""
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE,
+        keepalive_expiry=KEEPALIVE_EXPIRY_S,
+    )
+    transport = RetryTransport(httpx.HTTPTransport(limits=limits), _breaker)
+    return httpx.Client(
+        transport=transport,
+        timeout=httpx.Timeout(TIMEOUT_S, connect=CONNECT_TIMEOUT_S),
+        follow_redirects=True,
+    )
+
+
+def get_client():
+    """
+    Return the process-wide OpenAI client, creating it on first use.
+
+    The `openai` package is imported here rather than at module import so that a
+    serverless cold start only pays for it on routes that actually call upstream.
+    Retries are handled by `RetryTransport`, so the SDK's own retries are disabled.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from openai import OpenAI
+
+                _client = OpenAI(
+                    api_key=os.environ.get("OPENAI_API_KEY"),
+                    http_client=build_http_client(),
+                    max_retries=0,
+                )
+    return _client
+
+
+@contextmanager
+def upstream_slot(kind: str):
+    """
+    Hold one of the UPSTREAM_CONCURRENCY slots shared by chat, RAG, transcription and
+    speech calls for the duration of the block.
+
+    Args:
+        kind: Caller label for metrics ("chat", "rag", "transcribe", "tts", ...)
+
+    Raises:
+        UpstreamBusyError: if no slot frees up within UPSTREAM_SLOT_TIMEOUT seconds.
+    """
+    global _in_flight
+    started = time.perf_counter()
+    if not _slots.acquire(timeout=SLOT_TIMEOUT_S):
+        incr("upstream_slot_timeouts", kind=kind)
+        raise UpstreamBusyError(f"Upstream is busy, no slot for {kind} within {SLOT_TIMEOUT_S:.0f}s")
+    observe("upstream_slot_wait_s", time.perf_counter() - started, kind=kind)
+
+    with _lock:
+        _in_flight += 1
+        set_gauge("upstream_in_flight", _in_flight)
+    try:
+        yield
+    finally:
+        with _lock:
+            _in_flight -= 1
+            set_gauge("upstream_in_flight", _in_flight)
+        _slots.release()
+
+
+def get_vector_store_id() -> str:
+    """Resolve the RAG vector store ID on first use."""
+    global _vector_store_id
+    if _vector_store_id is None:
+        _vector_store_id = os.getenv("VECTOR_STORE_ID") or DEFAULT_VECTOR_STORE_ID
+        if _vector_store_id == DEFAULT_VECTOR_STORE_ID:
+            print("[INFO] Using default VECTOR_STORE_ID:", _vector_store_id)
+    return _vector_store_id
@@ -0,0 +1,252 @@
+import array
+import json
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Strings up to this length are interned: provider names, locations, sex codes,
+# ICD-10 codes, statuses and dict keys repeat across thousands of records.
+INTERN_MAX_CHARS = 64
+# Materialised records kept per section, so repeated lookups of the same patient
+# return the same dict (and identity-keyed caches built from it stay valid).
+MATERIALIZED_PER_SECTION = 256
+
+_SEGMENT_FIELDS = frozenset(("t", "speaker", "text"))
+
+_labels_lock = threading.Lock()
+# Speaker labels and time marks shared by every compact transcript
+_labels: List[str] = []
+_label_ids: Dict[str, int] = {}
+# Key tuples shared by every object with the same keys in the same order
+_shapes: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _label_id(label: str) -> int:
+    label_id = _label_ids.get(label)
+    if label_id is None:
+        with _labels_lock:
+            label_id = _label_ids.get(label)
+            if label_id is None:
+                label_id = _label_ids[label] = len(_labels)
+                _labels.append(sys.intern(label))
+    return label_id
+
+
+def _shape(keys: Tuple[str, ...]) -> Tuple[str, ...]:
+    shape = _shapes.get(keys)
+    if shape is None:
+        shape = _shapes.setdefault(keys, tuple(sys.intern(k) for k in keys))
+    return shape
+
+
+class CompactObject:
+    """A JSON object stored as a shared key tuple plus a tuple of compact values."""
+
+    __slots__ = ("keys", "values")
+
+    def __init__(self, keys: Tuple[str, ...], values: Tuple[Any, ...]):
+        self.keys = keys
+        self.values = values
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: materialize(value) for key, value in zip(self.keys, self.values)}
+
+
+class CompactList:
+    """A JSON array of compact values."""
+
+    __slots__ = ("items",)
+
+    def __init__(self, items: Tuple[Any, ...]):
+        self.items = items
+
+    def to_list(self) -> List[Any]:
+        return [materialize(item) for item in self.items]
+
+
+def _keys_of(value: Any) -> Optional[Tuple[str, ...]]:
+    if isinstance(value, CompactObject):
+        return value.keys
+    if isinstance(value, dict):
+        return tuple(value)
+    return None
+
+
+class CompactTranscript:
+    """
+    A transcript stored by column: every segment's text joined into one string with
+    an array of end offsets, and `t` / `speaker` as ids into a shared label table.
+    """
+
+    __slots__ = ("shape", "marks", "speakers", "text", "ends")
+
+    def __init__(self, shape: Tuple[str, ...], marks: array.array, speakers: array.array,
+                 text: str, ends: array.array):
+        self.shape = shape
+        self.marks = marks
+        self.speakers = speakers
+        self.text = text
+        self.ends = ends
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def segment(self, pos: int) -> Dict[str, Any]:
+        start = self.ends[pos - 1] if pos else 0
+        fields = {
+            "t": _labels[self.marks[pos]],
+            "speaker": _labels[self.speakers[pos]],
+            "text": self.text[start:self.ends[pos]],
+        }
+        return {key: fields[key] for key in self.shape}
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [self.segment(pos) for pos in range(len(self.ends))]
+
+    @classmethod
+    def build(cls, segments: List[Any]) -> Optional["CompactTranscript"]:
+        """
+        Column form of `segments` (dicts or CompactObjects), or None if they aren't
+        all uniform `t` / `speaker` / `text` strings.
+        """
+        if not segments:
+            return None
+        shape = _keys_of(segments[0])
+        if shape is None or set(shape) != _SEGMENT_FIELDS:
+            return None
+        positions = [shape.index(field) for field in ("t", "speaker", "text")]
+        marks, speakers, ends = array.array("I"), array.array("I"), array.array("I")
+        texts = []
+        end = 0
+        for segment in segments:
+            if _keys_of(segment) != shape:
+                return None
+            values = segment.values if isinstance(segment, CompactObject) else tuple(segment.values())
+            t, speaker, text = (values[pos] for pos in positions)
+            if not (isinstance(t, str) and isinstance(speaker, str) and isinstance(text, str)):
+                return None
+            marks.append(_label_id(t))
+            speakers.append(_label_id(speaker))
+            texts.append(text)
+            end += len(text)
+            ends.append(end)
+        return cls(_shape(shape), marks, speakers, "".join(texts), ends)
+
+
+def _intern(value: Any) -> Any:
+    if isinstance(value, str) and len(value) <= INTERN_MAX_CHARS:
+        return sys.intern(value)
+    return value
+
+
+def compact(value: Any) -> Any:
+    """Convert parsed JSON into its compact form (scalars are returned as is, short strings interned)."""
+    if isinstance(value, str):
+        return _intern(value)
+    if isinstance(value, dict):
+        values = []
+        for key, item in value.items():
+            if key == "transcript" and isinstance(item, list):
+                transcript = CompactTranscript.build(item)
+                if transcript is not None:
+                    values.append(transcript)
+                    continue
+            values.append(compact(item))
+        return CompactObject(_shape(tuple(value)), tuple(values))
+    if isinstance(value, list):
+        return CompactList(tuple(compact(item) for item in value))
+    # Scalars, and objects already made compact by the parse hook
+    return value
+
+
+def _object_pairs(pairs: List[Tuple[str, Any]]) -> CompactObject:
+    """`object_pairs_hook` building compact objects directly, so no dict tree is ever held."""
+    # Nested objects arrive already compact; only strings and arrays are left to convert
+    values = []
+    for key, value in pairs:
+        if isinstance(value, list):
+            transcript = CompactTranscript.build(value) if key == "transcript" else None
+            value = transcript if transcript is not None else compact(value)
+        else:
+            value = _intern(value)
+        values.append(value)
+    return CompactObject(_shape(tuple(key for key, _ in pairs)), tuple(values))
+
+
+def materialize(value: Any) -> Any:
+    """Convert a compact value back to plain JSON types (fresh dicts and lists)."""
+    if isinstance(value, CompactObject):
+        return value.to_dict()
+    if isinstance(value, (CompactList, CompactTranscript)):
+        return value.to_list()
+    return value
+
+
+class CompactSection(Mapping):
+    """
+    Read-only `{patient_id: record}` mapping over compact records.
+
+    Records are materialised to plain dicts on access; the most recently used ones
+    are kept so repeated lookups return the same object.
+    """
+
+    __slots__ = ("_records", "_materialized", "_lock")
+
+    def __init__(self, records: Dict[str, Any]):
+        """`records` maps patient IDs to parsed records or their compact form."""
+        self._records = {
+            sys.intern(pid): record if isinstance(record, CompactObject) else compact(record)
+            for pid, record in records.items()
+        }
+        self._materialized: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, patient_id: str) -> Any:
+        with self._lock:
+            record = self._materialized.get(patient_id)
+            if record is not None:
+                self._materialized.move_to_end(patient_id)
+                return record
+        record = materialize(self._records[patient_id])
+        with self._lock:
+            self._materialized[patient_id] = record
+            if len(self._materialized) > MATERIALIZED_PER_SECTION:
+                self._materialized.popitem(last=False)
+        return record
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, patient_id: object) -> bool:
+        return patient_id in self._records
+
+
+def compact_store(data: Dict[str, Any], sections: Tuple[str, ...] = ("patient_scribes", "AI_scribes")) -> Dict[str, Any]:
+    """
+    Replace the record sections of a parsed store with compact, lazily materialised ones.
+
+    Other top-level keys are kept as they are.
+    """
+    return {
+        key: CompactSection(value) if key in sections and isinstance(value, dict) else value
+        for key, value in data.items()
+    }
+
+
+def loads_compact(raw: bytes, sections: Tuple[str, ...] = ("patient_scribes", "AI_scribes")) -> Dict[str, Any]:
+    """Parse a JSON record store straight into the compact form returned by `compact_store`."""
+    root = json.loads(raw, object_pairs_hook=_object_pairs)
+    if not isinstance(root, CompactObject):
+        raise ValueError("Record store must be a JSON object")
+    data = {}
+    for key, value in zip(root.keys, root.values):
+        if key in sections and isinstance(value, CompactObject):
+            data[key] = CompactSection(dict(zip(value.keys, value.values)))
+        else:
+            data[key] = materialize(value)
+    return data
@@ -1,31 +1,21 @@
-import json
-import os
 from typing import Optional, Tuple, List, Dict, Any
-from dotenv import load_dotenv
 
-# Load environment variables immediately at module import time
-load_dotenv()
-
-from openai import OpenAI
+from .clients import get_client, get_vector_store_id, upstream_slot
+from .record_index import read_record
+from .records import load_records
+from .shared_snapshot import get_shared_snapshot
+from .summary_cards import get_summary_card
+from .transcript_index import get_transcript_index, parse_timestamp
 
 
 def _load_patient_records() -> Dict[str, Any]:
     """
-    Helper function to load patient records from JSON file.
+    Helper function to load patient records from the record store.
     
     Returns:
         Dictionary containing patient_scribes data, or empty dict if error.
     """
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(os.path.dirname(current_dir))
-    records_path = os.path.join(project_root, "patient_records.json")
-
-    try:
-        with open(records_path, "r") as f:
-            data = json.load(f)
-            return data.get("patient_scribes", {})
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+    return load_records().get("patient_scribes", {})
 
 def get_patient_names() -> List[Dict[str, str]]:
     """
@@ -35,6 +25,10 @@ def get_patient_names() -> List[Dict[str, str]]:
         List of dictionaries with 'patient_id' and 'name' keys.
         Example: [{"patient_id": "jordan_carter", "name": "Jordan Carter"}, ...]
     """
+    snapshot = get_shared_snapshot()
+    if snapshot is not None:
+        return [{"patient_id": pid, "name": name} for pid, name in snapshot.names("patient_scribes")]
+
     patient_scribes = _load_patient_records()
     
     patient_list = []
@@ -53,6 +47,7 @@ def get_patient_info(
     patient_id: str,
     age: Optional[Tuple[int, int]] = None,
     gender: Optional[str] = None,
+    include_transcript: bool = True,
 ) -> Dict[str, Any]:
     """
     Retrieve a specific patient record by patient ID with optional filters.
@@ -62,6 +57,8 @@ def get_patient_info(
         age: Optional tuple of (start_age, end_age) to filter patients within age range.
              The upper limit is capped at 100.
         gender: Optional gender to filter by (M, F, or variations like "Male", "Female")
+        include_transcript: If False, the `transcript` array is replaced by its segment
+             count (`transcript_segments`); use search_transcript to cite from it.
 
     Returns:
         Patient record dictionary if found and matches filters, otherwise empty dict.
@@ -73,10 +70,12 @@ def get_patient_info(
         # Get patient by ID with age filter
         get_patient_info(patient_id="emily_chen", age=(30, 50), gender="F")
     """
-    patient_scribes = _load_patient_records()
-    
-    # Get the specific patient record
-    patient_record = patient_scribes.get(patient_id)
+    # Parse just this record (from the shared snapshot, else the memory-mapped store)
+    snapshot = get_shared_snapshot()
+    if snapshot is not None:
+        patient_record = snapshot.get("patient_scribes", patient_id, include_transcript)
+    else:
+        patient_record = read_record("patient_scribes", patient_id)
     if not patient_record:
         return {"error": f"Patient ID '{patient_id}' not found"}
     
@@ -102,26 +101,111 @@ def get_patient_info(
         if patient_sex != gender_normalized:
             return {"error": f"Patient does not match gender filter '{gender}'"}
     
+    if not include_transcript and "transcript" in patient_record:
+        patient_record["transcript_segments"] = len(patient_record.pop("transcript"))
+
     return patient_record
 
 # ----------------
-# TOOL 3. Rag search. This tool is used when the agent wants to find a general piece of info in the client records. ex: "Find me patients with mental health issues" -> becomes increasingly important as you scale up the patient records database. 
-# Vector already initalized in testing_rag and file was already uploaded there as well. 
+# TOOL 5. Summary card. Precomputed, compact view of a record (demographics, vitals,
+# problems with ICD-10, med changes, follow-ups) that stays in sync with the record.
+
+def get_patient_summary(patient_id: str) -> Dict[str, Any]:
+    """
+    Retrieve the summary card for an encounter or intake by patient ID.
+
+    Args:
+        patient_id: Patient ID from get_patient_names (encounters) or the intake ID
+
+    Returns:
+        Summary card dictionary, or {"error": ...} if the patient is not found.
+    """
+    card = get_summary_card(patient_id)
+    if card is None:
+        return {"error": f"Patient ID '{patient_id}' not found"}
+    return card
+
+# ----------------
+# TOOL 4. Transcript search. Returns only the transcript segments (with their second
+# marks) that match, so citing a record doesn't need the whole transcript in context.
 
-vectorStoreID = os.getenv("VECTOR_STORE_ID")
-if not vectorStoreID:
-    vectorStoreID = "vs_68f972091abc8191ac6168a7566427a1" # generated in testing_rag.py! 
-    print("[INFO] Using default VECTOR_STORE_ID:", vectorStoreID)
+def search_transcript(
+    patient_id: str,
+    query: Optional[str] = None,
+    phrase: Optional[str] = None,
+    speaker: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = 8,
+) -> Dict[str, Any]:
+    """
+    Search one patient's transcript by keyword, exact phrase, speaker and/or time window.
 
+    Args:
+        patient_id: Patient ID (e.g., "jordan_carter")
+        query: Keywords; segments containing more of them rank first
+        phrase: Exact phrase the segment text must contain (case-insensitive)
+        speaker: Speaker label to filter by (e.g., "Provider", "Patient")
+        start: Window start as "MM:SS" or seconds
+        end: Window end as "MM:SS" or seconds (inclusive)
+        limit: Maximum number of segments to return (capped at 50)
 
-client = OpenAI() 
+    Returns:
+        {"patient_id", "matches": [{"t", "speaker", "text"}, ...], "total_matches", "transcript_segments"}
+
+    Example:
+        search_transcript(patient_id="jordan_carter", query="chest pain")
+        search_transcript(patient_id="jordan_carter", speaker="Patient", start="01:00", end="02:30")
+    """
+    start_s, end_s = parse_timestamp(start), parse_timestamp(end)
+    if (start not in (None, "") and start_s is None) or (end not in (None, "") and end_s is None):
+        return {"error": "start/end must be 'MM:SS' or a number of seconds"}
+    limit = max(1, min(int(limit), 50))
+
+    snapshot = get_shared_snapshot()
+    if snapshot is not None:
+        # Search the snapshot's segment table and decode only the returned segments
+        found = snapshot.search_transcript(
+            "patient_scribes", patient_id, query=query, phrase=phrase, speaker=speaker, start=start_s, end=end_s,
+        )
+        if found is None:
+            return {"error": f"Patient ID '{patient_id}' not found"}
+        positions, segment_count = found
+        segments = snapshot.segments("patient_scribes", patient_id, positions[:limit])
+    else:
+        patient_record = _load_patient_records().get(patient_id)
+        if not patient_record:
+            return {"error": f"Patient ID '{patient_id}' not found"}
+        transcript = patient_record.get("transcript") or []
+        index = get_transcript_index(patient_id, transcript)
+        positions = index.search(query=query, phrase=phrase, speaker=speaker, start=start_s, end=end_s)
+        segments = [transcript[pos] for pos in positions[:limit]]
+        segment_count = len(transcript)
+
+    matches = [
+        {"t": segment.get("t"), "speaker": segment.get("speaker"), "text": segment.get("text")}
+        for segment in segments
+    ]
+
+    return {
+        "patient_id": patient_id,
+        "matches": matches,
+        "total_matches": len(positions),
+        "transcript_segments": segment_count,
+    }
+
+# ----------------
+# TOOL 3. Rag search. This tool is used when the agent wants to find a general piece of info in the client records. ex: "Find me patients with mental health issues" -> becomes increasingly important as you scale up the patient records database. 
+# Vector already initalized in testing_rag and file was already uploaded there as well. 
+# The vector store ID and client are resolved on first search, not at import.
 
 def search_records_RAG(query: str):
     print("\nUsing RAG to search through patient records database.\n")
-    results = client.vector_stores.search(
-        vector_store_id=vectorStoreID, 
-        query=query
-    )
+    with upstream_slot("rag"):
+        results = get_client().vector_stores.search(
+            vector_store_id=get_vector_store_id(), 
+            query=query
+        )
     
     # Convert the SyncPage object to a JSON-serializable format
     search_results = []
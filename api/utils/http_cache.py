@@ -0,0 +1,42 @@
+import gzip
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi.responses import Response
+
+# Bodies smaller than this are sent uncompressed; gzip overhead isn't worth it.
+GZIP_MIN_BYTES = 1024
+
+# Patient data: clients may keep a copy but must revalidate it on every use.
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """Weak ETag derived from the given version parts (store version, query, ...)."""
+    digest = hashlib.sha1("\x1f".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def json_response(payload: Any, etag: str, accept_encoding: Optional[str]) -> Response:
+    """Compact JSON response with validators, gzipped when the client accepts it."""
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in (accept_encoding or "").lower():
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,124 @@
+import csv
+import io
+import json
+import time
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from .metrics import incr, observe
+from .record_index import get_record_index
+
+SECTION = "AI_scribes"
+EXPORT_FORMATS = ("ndjson", "csv")
+CSV_FIELDS = (
+    "id", "timestamp", "status", "name", "age", "sex", "reason_for_visit", "chief_complaint",
+    "symptoms", "current_medications", "existing_conditions", "allergies", "family_history",
+    "conversation_summary", "ai_assessment",
+)
+# CSV rows written per yielded chunk
+CSV_ROWS_PER_CHUNK = 200
+
+
+def _values(value: Optional[str]) -> Optional[FrozenSet[str]]:
+    """Comma-separated filter values, or None for no filter."""
+    if not value:
+        return None
+    values = frozenset(v.strip() for v in value.split(",") if v.strip())
+    return values or None
+
+
+def intake_filter(
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    reason: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Normalised intake filter.
+
+    Args:
+        status: Comma-separated statuses (e.g. "pending_review")
+        since: Earliest `timestamp` (ISO date or datetime, inclusive)
+        until: Latest `timestamp`; a date includes that whole day
+        reason: Comma-separated `reason_for_visit` values
+
+    Returns:
+        Filter dict for `iter_intakes` (JSON-serialisable, so batch checkpoints can store it).
+    """
+    return {"status": status or None, "since": since or None, "until": until or None, "reason": reason or None}
+
+
+def _matches(record: Dict[str, Any], statuses: Optional[FrozenSet[str]], reasons: Optional[FrozenSet[str]],
+             since: Optional[str], until: Optional[str]) -> bool:
+    if statuses is not None and record.get("status", "pending_review") not in statuses:
+        return False
+    if reasons is not None and record.get("reason_for_visit") not in reasons:
+        return False
+    # ISO timestamps order as strings; comparing a prefix makes a date-only `until` inclusive
+    timestamp = record.get("timestamp") or ""
+    if since and timestamp < since:
+        return False
+    if until and timestamp[:len(until)] > until:
+        return False
+    return True
+
+
+def iter_intakes(filters: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    (patient_id, record) of every intake matching `filters`, in store order.
+
+    Records are parsed one at a time from the memory-mapped store, so the whole store
+    is never loaded. Records removed while iterating are skipped.
+    """
+    statuses, reasons = _values(filters.get("status")), _values(filters.get("reason"))
+    since, until = filters.get("since"), filters.get("until")
+    index = get_record_index()
+    for patient_id in index.ids(SECTION):
+        record = index.get(SECTION, patient_id)
+        if record is not None and _matches(record, statuses, reasons, since, until):
+            yield patient_id, record
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, list):
+        return "; ".join(item if isinstance(item, str) else json.dumps(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return "" if value is None else value
+
+
+def csv_row(patient_id: str, record: Dict[str, Any]) -> List[Any]:
+    info = record.get("patient_info", {})
+    fields = {**record, **info, "id": patient_id, "status": record.get("status", "pending_review")}
+    return [_cell(fields.get(name)) for name in CSV_FIELDS]
+
+
+def export_intakes(filters: Dict[str, Any], fmt: str = "ndjson") -> Iterator[str]:
+    """
+    Stream matching intakes as NDJSON (one `{"id", ...record}` object per line) or CSV
+    (header plus one flattened row per intake, list fields joined with "; ").
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}' (expected one of {', '.join(EXPORT_FORMATS)})")
+    started = time.perf_counter()
+    rows = 0
+    try:
+        if fmt == "ndjson":
+            for patient_id, record in iter_intakes(filters):
+                rows += 1
+                yield json.dumps({"id": patient_id, **record}) + "\n"
+            return
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_FIELDS)
+        for patient_id, record in iter_intakes(filters):
+            rows += 1
+            writer.writerow(csv_row(patient_id, record))
+            if rows % CSV_ROWS_PER_CHUNK == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    finally:
+        incr("intake_export_rows", rows, format=fmt)
+        observe("intake_export_s", time.perf_counter() - started, format=fmt)
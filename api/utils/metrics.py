@@ -0,0 +1,73 @@
+import threading
+from collections import deque
+from typing import Any, Deque, Dict
+
+# Samples kept per timer series for percentile estimates.
+WINDOW = 1024
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_timers: Dict[str, Dict[str, Any]] = {}
+
+
+def _key(name: str, labels: Dict[str, Any]) -> str:
+    if not labels:
+        return name
+    inner = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{inner}}}"
+
+
+def incr(name: str, value: float = 1, **labels: Any) -> None:
+    """Increment a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels: Any) -> None:
+    """Set a gauge to its current value."""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    """Record one sample of a latency/size distribution."""
+    key = _key(name, labels)
+    with _lock:
+        series = _timers.get(key)
+        if series is None:
+            series = _timers[key] = {"count": 0, "sum": 0.0, "max": 0.0, "recent": deque(maxlen=WINDOW)}
+        series["count"] += 1
+        series["sum"] += value
+        series["max"] = max(series["max"], value)
+        series["recent"].append(value)
+
+
+def _percentile(samples: Deque[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    """Return a JSON-serializable copy of all counters, gauges and timer summaries."""
+    with _lock:
+        timers = {}
+        for key, series in _timers.items():
+            timers[key] = {
+                "count": series["count"],
+                "avg": series["sum"] / series["count"] if series["count"] else 0.0,
+                "p50": _percentile(series["recent"], 0.5),
+                "p95": _percentile(series["recent"], 0.95),
+                "max": series["max"],
+            }
+        return {"counters": dict(_counters), "gauges": dict(_gauges), "timers": timers}
+
+
+def reset_metrics() -> None:
+    """Clear all series."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timers.clear()
@@ -0,0 +1,154 @@
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from .metrics import incr, observe
+from .name_matcher import latest_user_text, match_patients
+from .profiling import mark
+
+# Apply routing decisions with MODEL_ROUTING=1. Otherwise every turn uses MODEL_DEFAULT
+# and decisions are only recorded (shadow mode), so they can be evaluated offline first.
+ENABLED = os.environ.get("MODEL_ROUTING", "").lower() in ("1", "true", "yes")
+MODELS = {
+    "small": os.environ.get("MODEL_SMALL", "gpt-4.1-nano"),
+    "default": os.environ.get("MODEL_DEFAULT", "gpt-4.1-mini"),
+    "large": os.environ.get("MODEL_LARGE", "gpt-4.1"),
+}
+# Append one JSON line per model call (features, decision, latency, tokens, cost).
+ROUTING_LOG = os.environ.get("MODEL_ROUTING_LOG")
+
+# Thresholds for the heuristics below.
+LONG_MESSAGE_CHARS = 600
+DEEP_CONVERSATION_TURNS = 6
+LARGE_CONTEXT_CHARS = 12000
+SYNTHESIS_CONTEXT_CHARS = 4000
+
+# Tools whose output only leads to another tool call (a name -> ID lookup).
+SELECTION_TOOLS = ("get_patient_names",)
+
+_SYNTHESIS_RE = re.compile(
+    r"\b(compar\w*|summari[sz]\w*|differential|trend\w*|across|versus|vs|contrast\w*|"
+    r"timeline|all patients|every patient|write (?:a|the|up)|draft|soap note|explain why)\b",
+    re.IGNORECASE,
+)
+
+_log_lock = threading.Lock()
+
+
+def _field(item: Any, name: str) -> Any:
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def turn_features(input_list: List[Any], iteration: int, detect_patients: bool = True) -> Dict[str, Any]:
+    """
+    Cheap local features of the turn about to be sent upstream.
+
+    Args:
+        input_list: Responses `input` for this call (messages, tool calls and outputs)
+        iteration: 1 for the first call of the turn, then 2, 3, ... after tool rounds
+        detect_patients: Count patients named in the latest message (chat only)
+    """
+    latest = latest_user_text(input_list)
+    context_chars = 0
+    last_tools: List[str] = []
+    for item in input_list:
+        kind = _field(item, "type")
+        if kind == "function_call_output":
+            context_chars += len(_field(item, "output") or "")
+        elif kind == "function_call":
+            last_tools.append(_field(item, "name"))
+        elif _field(item, "role") == "developer":
+            context_chars += len(_field(item, "content") or "")
+        elif _field(item, "role") == "user":
+            # Tools called before the latest user message belong to earlier turns
+            last_tools = []
+
+    return {
+        "iteration": iteration,
+        "message_chars": len(latest),
+        "depth": sum(1 for item in input_list if _field(item, "role") == "user"),
+        "patients": len(match_patients(latest)) if detect_patients and latest else 0,
+        "synthesis": bool(_SYNTHESIS_RE.search(latest)),
+        "context_chars": context_chars,
+        "last_tools": last_tools[-3:],
+    }
+
+
+def classify(features: Dict[str, Any]) -> tuple:
+    """
+    Pick a model tier for one call.
+
+    - large: answers that combine several patients or a lot of record context
+    - default: answers written from tool output, and long or synthesis-style asks
+    - small: greetings / short asks and tool-selection rounds
+
+    Returns:
+        (tier, reason)
+    """
+    context = features["context_chars"]
+    if features["patients"] >= 2 and context:
+        return "large", "multi_patient"
+    if context >= LARGE_CONTEXT_CHARS:
+        return "large", "large_context"
+    if features["synthesis"] and context >= SYNTHESIS_CONTEXT_CHARS:
+        return "large", "synthesis"
+
+    if features["iteration"] > 1 and features["last_tools"] and all(
+        name in SELECTION_TOOLS for name in features["last_tools"]
+    ):
+        return "small", "tool_selection"
+    if context:
+        return "default", "answer_from_context"
+    if features["synthesis"] or features["message_chars"] > LONG_MESSAGE_CHARS:
+        return "default", "complex_request"
+    if features["depth"] > DEEP_CONVERSATION_TURNS:
+        return "default", "deep_conversation"
+    if features["patients"]:
+        return "small", "tool_selection"
+    return "small", "simple"
+
+
+def route_turn(input_list: List[Any], iteration: int, detect_patients: bool = True) -> Dict[str, Any]:
+    """
+    Routing decision for the next model call.
+
+    Returns:
+        {"model", "tier", "reason", "applied", "features"}; `model` is the model to
+        call (MODEL_DEFAULT unless MODEL_ROUTING is enabled).
+    """
+    features = turn_features(input_list, iteration, detect_patients)
+    tier, reason = classify(features)
+    return {
+        "model": MODELS[tier] if ENABLED else MODELS["default"],
+        "tier": tier,
+        "reason": reason,
+        "applied": ENABLED,
+        "features": features,
+    }
+
+
+def record_route(endpoint: str, route: Dict[str, Any], duration_s: float, call_usage: Optional[Dict[str, Any]]) -> None:
+    """Record one routed call: metrics per tier/reason, plus a JSON line in MODEL_ROUTING_LOG."""
+    call_usage = call_usage or {}
+    tier = route["tier"]
+    incr("model_route", endpoint=endpoint, tier=tier, reason=route["reason"])
+    observe("model_route_latency_s", duration_s, endpoint=endpoint, tier=tier, model=route["model"])
+    observe("model_route_cost_usd", call_usage.get("cost_usd", 0.0), endpoint=endpoint, tier=tier, model=route["model"])
+    mark("model_call", duration_s, iteration=route["features"]["iteration"], model=route["model"], tier=tier,
+         input_tokens=call_usage.get("input_tokens"), output_tokens=call_usage.get("output_tokens"))
+
+    if not ROUTING_LOG:
+        return
+    line = json.dumps({
+        "endpoint": endpoint,
+        **{k: route[k] for k in ("model", "tier", "reason", "applied", "features")},
+        "duration_s": round(duration_s, 4),
+        **call_usage,
+    })
+    try:
+        with _log_lock, open(ROUTING_LOG, "a") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"[ROUTER] Could not write routing log: {e}")
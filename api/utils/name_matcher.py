@@ -0,0 +1,106 @@
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .records import load_records
+
+# Names, MRNs ("JC-045872") and patient IDs ("jordan_carter") each scan as one token run.
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_'’][a-z0-9]+)*")
+
+# Only encounters are matched: they are what get_patient_names / get_patient_info serve.
+SECTION = "patient_scribes"
+
+# Prefetch at most this many patients from one message; more than that is a list
+# request, not a question about specific patients.
+MAX_MATCHES = 2
+
+_END = "\0"
+
+_lock = threading.Lock()
+# (store object the trie was built from, trie)
+_trie: Tuple[Any, Dict[str, Any]] = (None, {})
+
+
+def _tokens(text: str) -> List[str]:
+    # "Emily Chen's visit" should still match "Emily Chen"
+    return [t[:-2] if t.endswith(("'s", "’s")) else t for t in _TOKEN_RE.findall(text.lower())]
+
+
+def _insert(trie: Dict[str, Any], key: str, patient_id: str, kind: str) -> None:
+    node = trie
+    for token in _tokens(key):
+        node = node.setdefault(token, {})
+    if node is not trie:
+        node.setdefault(_END, set()).add((patient_id, kind))
+
+
+def build_trie(records: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Token-level trie over every encounter's full name, MRN and patient ID.
+
+    Each terminal node holds the set of (patient_id, kind) it identifies; a name
+    shared by two patients therefore ends in a two-element set and is ambiguous.
+    """
+    trie: Dict[str, Any] = {}
+    for patient_id, record in records.items():
+        patient = record.get("patient", {})
+        if patient.get("name"):
+            _insert(trie, patient["name"], patient_id, "name")
+        if patient.get("mrn"):
+            _insert(trie, patient["mrn"], patient_id, "mrn")
+        _insert(trie, patient_id, patient_id, "id")
+    return trie
+
+
+def _current_trie() -> Dict[str, Any]:
+    """Trie for the loaded store, rebuilt only when the store reloads."""
+    global _trie
+    data = load_records()
+    if _trie[0] is data:
+        return _trie[1]
+    with _lock:
+        if _trie[0] is not data:
+            _trie = (data, build_trie(data.get(SECTION, {})))
+        return _trie[1]
+
+
+def match_patients(text: str, trie: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+    """
+    Find patients named unambiguously in `text` by full name, MRN or patient ID.
+
+    Scans the message once, taking the longest trie match at each token. Matches
+    that could refer to more than one patient are dropped, and nothing is returned
+    if more than MAX_MATCHES distinct patients are named.
+
+    Returns:
+        [{"patient_id": ..., "matched": "name" | "mrn" | "id"}, ...] in order of mention.
+    """
+    trie = _current_trie() if trie is None else trie
+    tokens = _tokens(text)
+    found: Dict[str, str] = {}
+
+    i = 0
+    while i < len(tokens):
+        node, best, best_end = trie, None, i
+        for j in range(i, len(tokens)):
+            node = node.get(tokens[j])
+            if node is None:
+                break
+            if _END in node:
+                best, best_end = node[_END], j + 1
+        if best and len({pid for pid, _ in best}) == 1:
+            patient_id, kind = next(iter(best))
+            found.setdefault(patient_id, kind)
+        i = best_end if best else i + 1
+
+    if len(found) > MAX_MATCHES:
+        return []
+    return [{"patient_id": pid, "matched": kind} for pid, kind in found.items()]
+
+
+def latest_user_text(messages: List[dict]) -> str:
+    for msg in reversed(messages):
+        if isinstance(msg, dict) and msg.get("role") == "user":
+            content = msg.get("content")
+            return content if isinstance(content, str) else ""
+    return ""
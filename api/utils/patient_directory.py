@@ -0,0 +1,177 @@
+import base64
+import binascii
+import bisect
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .records import load_records
+
+SECTIONS = ("patient_scribes", "AI_scribes")
+
+# Fields available in list summaries; DEFAULT_SUMMARY_FIELDS is returned when the
+# client does not ask for specific ones.
+SUMMARY_FIELDS = (
+    "id", "source", "name", "age", "sex", "chief_complaint", "status",
+    "mrn", "timestamp", "specialty",
+)
+DEFAULT_SUMMARY_FIELDS = ("id", "source", "name", "age", "sex", "chief_complaint", "status")
+
+MAX_PAGE_SIZE = 200
+
+_lock = threading.Lock()
+# (store object the index was built from, {section: (sorted ids, summaries by id)})
+_index: Tuple[Any, Dict[str, Tuple[List[str], Dict[str, Dict[str, Any]]]]] = (None, {})
+
+
+def summarize_record(patient_id: str, section: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """Project an encounter (`patient_scribes`) or intake (`AI_scribes`) onto the summary shape."""
+    if section == "AI_scribes":
+        info = record.get("patient_info", {})
+        return {
+            "id": patient_id,
+            "source": section,
+            "name": info.get("name"),
+            "age": info.get("age"),
+            "sex": info.get("sex"),
+            "chief_complaint": record.get("chief_complaint"),
+            "status": record.get("status", "pending_review"),
+            "mrn": None,
+            "timestamp": record.get("timestamp"),
+            "specialty": None,
+        }
+
+    patient = record.get("patient", {})
+    return {
+        "id": patient_id,
+        "source": section,
+        "name": patient.get("name"),
+        "age": patient.get("age"),
+        "sex": patient.get("sex"),
+        "chief_complaint": record.get("chief_complaint"),
+        "status": record.get("status", "documented"),
+        "mrn": patient.get("mrn"),
+        "timestamp": record.get("timestamp"),
+        "specialty": record.get("provider", {}).get("specialty"),
+    }
+
+
+def _summary_index() -> Dict[str, Tuple[List[str], Dict[str, Dict[str, Any]]]]:
+    """Sorted ids and summaries per section, rebuilt only when the store reloads."""
+    global _index
+    data = load_records()
+    built_from, index = _index
+    if built_from is data:
+        return index
+
+    with _lock:
+        if _index[0] is data:
+            return _index[1]
+        index = {}
+        for section in SECTIONS:
+            entries = data.get(section, {})
+            summaries = {pid: summarize_record(pid, section, rec) for pid, rec in entries.items()}
+            index[section] = (sorted(summaries), summaries)
+        _index = (data, index)
+        return index
+
+
+def encode_cursor(section: str, patient_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{section}\x00{patient_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Raises:
+        ValueError: if the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        section, patient_id = raw.split("\x00", 1)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if section not in SECTIONS:
+        raise ValueError("Invalid cursor")
+    return section, patient_id
+
+
+def parse_fields(fields: Optional[str], allowed: Tuple[str, ...], default: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Parse a comma-separated `fields` query parameter.
+
+    Raises:
+        ValueError: if an unknown field is requested.
+    """
+    if not fields:
+        return default
+    requested = tuple(f.strip() for f in fields.split(",") if f.strip())
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def list_patient_summaries(
+    section: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    fields: Tuple[str, ...] = DEFAULT_SUMMARY_FIELDS,
+) -> Dict[str, Any]:
+    """
+    One page of patient summaries, ordered by section then patient ID.
+
+    Args:
+        section: "patient_scribes", "AI_scribes" or None for both
+        cursor: Opaque cursor from a previous page's `next_cursor`
+        limit: Page size (capped at MAX_PAGE_SIZE)
+        fields: Summary fields to include
+
+    Returns:
+        {"items": [...], "next_cursor": str | None, "total": int}
+
+    Raises:
+        ValueError: for an unknown section or malformed cursor.
+    """
+    if section is not None and section not in SECTIONS:
+        raise ValueError(f"Unknown section '{section}'")
+    sections = (section,) if section else SECTIONS
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    index = _summary_index()
+
+    start_section, after_id = decode_cursor(cursor) if cursor else (sections[0], None)
+    if start_section not in sections:
+        raise ValueError("Cursor does not belong to this section")
+
+    items: List[Dict[str, Any]] = []
+    next_cursor = None
+    for sec in sections[sections.index(start_section):]:
+        ids, summaries = index[sec]
+        pos = bisect.bisect_right(ids, after_id) if (sec == start_section and after_id is not None) else 0
+        while pos < len(ids) and len(items) < limit:
+            summary = summaries[ids[pos]]
+            items.append({f: summary[f] for f in fields})
+            pos += 1
+        if len(items) >= limit:
+            has_more = pos < len(ids) or any(index[s][0] for s in sections[sections.index(sec) + 1:])
+            if has_more:
+                next_cursor = encode_cursor(sec, ids[pos - 1])
+            break
+
+    total = sum(len(index[s][0]) for s in sections)
+    return {"items": items, "next_cursor": next_cursor, "total": total}
+
+
+def find_patient_record(
+    patient_id: str, section: Optional[str] = None
+) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Look up a record by ID in `section`, or in `patient_scribes` then `AI_scribes`.
+
+    Returns:
+        (section, record), or (None, None) if not found.
+    """
+    data = load_records()
+    for section in ((section,) if section else SECTIONS):
+        record = data.get(section, {}).get(patient_id)
+        if record is not None:
+            return section, record
+    return None, None
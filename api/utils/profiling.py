@@ -0,0 +1,223 @@
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import random
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional
+
+from .metrics import incr, observe
+
+# Fraction of chat requests profiled without asking (0 = only on request).
+SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+# Profiles are written here; only the newest PROFILE_KEEP are kept.
+PROFILE_DIR = os.environ.get("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "ai_scribe_profiles")
+KEEP = int(os.environ.get("PROFILE_KEEP", 50))
+# Functions listed in a profile's summary, by cumulative time.
+TOP_FUNCTIONS = 30
+
+_current: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("profile", default=None)
+_prune_lock = threading.Lock()
+
+
+class Profile:
+    """cProfile stats and a timeline of iterations / tool calls for one request."""
+
+    def __init__(self, endpoint: str, reason: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.endpoint = endpoint
+        self.reason = reason
+        self.created = time.time()
+        self.started = time.perf_counter()
+        self.profiler: Optional[cProfile.Profile] = cProfile.Profile()
+        # Why function stats are missing, if cProfile could not run
+        self.profiler_error: Optional[str] = None
+        self.timeline: List[Dict[str, Any]] = []
+
+    def wrap(self, frames: Iterator[str]) -> Iterator[str]:
+        """
+        Yield `frames` with the profiler (and this profile's timeline) active while
+        each frame is produced, then save the profile when the stream ends.
+
+        Profiling is switched on per `next()` rather than once, because the server
+        may resume the generator on a different worker thread each time. If cProfile
+        can't be enabled (on Python 3.12+ only one profiler may run per process, so a
+        concurrent profiled request has it), only the timeline is recorded; profiling
+        never fails the request.
+        """
+        status = "complete"
+        frame_count = 0
+        iterator = iter(frames)
+        try:
+            while True:
+                token = _current.set(self)
+                profiler = self._enable()
+                try:
+                    frame = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+                    _current.reset(token)
+                frame_count += 1
+                yield frame
+        except GeneratorExit:
+            status = "closed"
+            raise
+        except Exception as e:
+            status = f"error: {e}"
+            raise
+        finally:
+            self.save(status, frame_count)
+
+    def _enable(self) -> Optional[cProfile.Profile]:
+        """Enable cProfile for one step, or give it up for the rest of the request."""
+        if self.profiler is None:
+            return None
+        try:
+            self.profiler.enable()
+        except ValueError as e:
+            # Stats from earlier steps would be partial; keep only the timeline
+            print(f"[PROFILE] cProfile unavailable for {self.id}, recording timeline only: {e}")
+            incr("profile_cprofile_unavailable", endpoint=self.endpoint)
+            self.profiler, self.profiler_error = None, str(e)
+            return None
+        return self.profiler
+
+    def save(self, status: str, frames: int) -> None:
+        duration = time.perf_counter() - self.started
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            if self.profiler is not None:
+                self.profiler.dump_stats(_path(self.id, ".prof"))
+            summary = {
+                "id": self.id,
+                "endpoint": self.endpoint,
+                "reason": self.reason,
+                "created": self.created,
+                "duration_s": duration,
+                "status": status,
+                "frames": frames,
+                "timeline": self.timeline,
+                "top_functions": _top_functions(self.profiler) if self.profiler is not None else [],
+                "profiler_error": self.profiler_error,
+            }
+            tmp_path = _path(self.id, ".json.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(summary, f)
+            os.replace(tmp_path, _path(self.id, ".json"))
+        except OSError as e:
+            print(f"[PROFILE] Could not save profile {self.id}: {e}")
+            return
+        observe("profiled_request_s", duration, endpoint=self.endpoint)
+        print(f"[PROFILE] Saved {self.id} ({self.endpoint}, {duration:.2f}s)")
+        _prune()
+
+
+def _path(profile_id: str, suffix: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}{suffix}")
+
+
+def _top_functions(profiler: cProfile.Profile) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profiler).stats
+    ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+    return [
+        {
+            "function": f"{name} ({os.path.basename(filename)}:{line})" if line else name,
+            "calls": calls,
+            "self_s": round(self_time, 6),
+            "cumulative_s": round(cumulative, 6),
+        }
+        for (filename, line, name), (_, calls, self_time, cumulative, _) in ranked
+    ]
+
+
+def _prune() -> None:
+    """Delete all but the newest KEEP profiles."""
+    with _prune_lock:
+        summaries = sorted(
+            (name for name in os.listdir(PROFILE_DIR) if name.endswith(".json")),
+            key=lambda name: os.path.getmtime(os.path.join(PROFILE_DIR, name)),
+            reverse=True,
+        )
+        for name in summaries[KEEP:]:
+            for suffix in (".json", ".prof"):
+                try:
+                    os.unlink(_path(name[:-5], suffix))
+                except OSError:
+                    pass
+
+
+def start_profile(endpoint: str, header: Optional[str]) -> Optional[Profile]:
+    """
+    Profile for this request if it asked for one (`X-Profile: 1`) or was sampled
+    (PROFILE_SAMPLE_RATE), else None.
+    """
+    if header and header.lower() in ("1", "true", "yes"):
+        reason = "header"
+    elif SAMPLE_RATE and random.random() < SAMPLE_RATE:
+        reason = "sampled"
+    else:
+        return None
+    incr("profiled_requests", endpoint=endpoint, reason=reason)
+    return Profile(endpoint, reason)
+
+
+def mark(kind: str, duration_s: float, **fields: Any) -> None:
+    """
+    Add a span that just ended to the current request's timeline (no-op when the
+    request isn't profiled).
+
+    Args:
+        kind: "model_call", "tool", "load_records", ...
+        duration_s: How long the span took; it is placed ending now
+        fields: Extra details (model, tool name, output size, ...)
+    """
+    profile = _current.get()
+    if profile is None:
+        return
+    end = time.perf_counter() - profile.started
+    profile.timeline.append({
+        "kind": kind,
+        "start_s": round(end - duration_s, 6),
+        "duration_s": round(duration_s, 6),
+        **fields,
+    })
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Saved profiles, newest first, without their timelines and function tables."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if not name.endswith(".json"):
+            continue
+        summary = load_profile(name[:-5])
+        if summary is not None:
+            profiles.append({k: v for k, v in summary.items() if k not in ("timeline", "top_functions")})
+    return sorted(profiles, key=lambda p: p["created"], reverse=True)
+
+
+def load_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    """Summary (timeline and top functions) of one saved profile, or None."""
+    if not profile_id.isalnum():
+        return None
+    try:
+        with open(_path(profile_id, ".json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def stats_path(profile_id: str) -> Optional[str]:
+    """Path of a profile's pstats dump (open with `python -m pstats` or snakeviz), or None."""
+    if not profile_id.isalnum():
+        return None
+    path = _path(profile_id, ".prof")
+    return path if os.path.exists(path) else None
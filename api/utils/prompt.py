@@ -1,6 +1,5 @@
 import json
 from enum import Enum
-from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
 from pydantic import BaseModel
 import base64
 from typing import List, Optional, Any
@@ -16,7 +15,8 @@ class ToolInvocation(BaseModel):
     toolCallId: str
     toolName: str
     args: Any
-    result: Any
+    # Absent while a call is still running (e.g. the stream was stopped mid-tool)
+    result: Optional[Any] = None
 
 
 class ClientMessage(BaseModel):
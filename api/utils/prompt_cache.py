@@ -0,0 +1,60 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from .metrics import incr, observe
+
+
+def build_prefix(instructions: str, tools: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Canonical form of the part of every request that precedes the conversation.
+
+    Upstream prompt caching only reuses an exact byte prefix, so the tool schemas are
+    re-serialised with sorted keys and no whitespace variation, and the instructions
+    are trimmed. Build this once at import and send exactly these objects each call.
+
+    Returns:
+        {"instructions", "tools", "tools_json", "hash"} where `hash` identifies the prefix
+        (it changes whenever the prompt or a tool schema is edited).
+    """
+    tools_json = json.dumps(tools, sort_keys=True, separators=(",", ":"))
+    instructions = instructions.strip()
+    return {
+        "instructions": instructions,
+        # Dicts rebuilt from the sorted JSON, so the SDK serialises them in that key order
+        "tools": json.loads(tools_json),
+        "tools_json": tools_json,
+        "hash": hashlib.sha1(f"{instructions}\n{tools_json}".encode()).hexdigest()[:12],
+    }
+
+
+def _first_user_text(messages: List[Any]) -> str:
+    for message in messages:
+        if isinstance(message, dict) and message.get("role") == "user" and isinstance(message.get("content"), str):
+            return message["content"]
+    return ""
+
+
+def prompt_cache_key(endpoint: str, prefix: Dict[str, Any], messages: List[Any],
+                     conversation_id: Optional[str] = None) -> str:
+    """
+    Per-conversation `prompt_cache_key`, so every turn of a chat is routed to the same
+    upstream cache.
+
+    Uses the client's chat ID when it sends one; otherwise the conversation's first
+    user message, which stays the same for the rest of the chat.
+    """
+    session = conversation_id or _first_user_text(messages)
+    session_hash = hashlib.sha1(session.encode()).hexdigest()[:16]
+    return f"{endpoint.strip('/').replace('/', '-')}-{prefix['hash']}-{session_hash}"
+
+
+def record_prompt_cache(endpoint: str, model: str, call_usage: Optional[Dict[str, Any]]) -> None:
+    """Count cached vs uncached input tokens of one model call (from `UsageTotals.add`)."""
+    if not call_usage or not call_usage.get("input_tokens"):
+        return
+    input_tokens = call_usage["input_tokens"]
+    cached = call_usage.get("cached_input_tokens", 0)
+    incr("prompt_input_tokens", cached, endpoint=endpoint, model=model, cache="hit")
+    incr("prompt_input_tokens", input_tokens - cached, endpoint=endpoint, model=model, cache="miss")
+    observe("prompt_cache_hit_ratio", cached / input_tokens, endpoint=endpoint)
@@ -0,0 +1,374 @@
+import json
+import mmap
+import os
+import re
+import threading
+import time
+from json.decoder import scanstring
+from typing import Any, Dict, List, Optional, Tuple
+
+from .metrics import incr, observe
+from .records import records_path
+
+# Top-level sections whose entries are indexed.
+SECTIONS = ("patient_scribes", "AI_scribes")
+
+# Initial slice decoded around a change for an incremental update; grown as needed.
+UPDATE_WINDOW_BYTES = 1 << 16
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+# (key_start, value_start, value_end, patient_id), in file order
+Entry = Tuple[int, int, int, str]
+
+
+class StoreShapeError(ValueError):
+    """The file does not have the expected `{"section": {"id": {...}}}` shape."""
+
+
+def _skip_ws(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def _scan_member(text: str, pos: int, base: int = 0) -> Tuple[Optional[Entry], int]:
+    """
+    Scan one object member at `pos` (just after `{`, after a value, or at a key).
+
+    The value goes through the C scanner once to find where it ends; only its span
+    is kept. Offsets in the returned entry are `base` + offsets into `text`.
+
+    Returns:
+        (entry, position after its value), or (None, position after the closing `}`).
+    """
+    pos = _skip_ws(text, pos)
+    if text[pos] == "}":
+        return None, pos + 1
+    if text[pos] == ",":
+        pos = _skip_ws(text, pos + 1)
+    if text[pos] != '"':
+        raise StoreShapeError(f"Expected a key at offset {base + pos}")
+    key_start = pos
+    _, pos = scanstring(text, pos + 1)
+    # `text` is the latin-1 view of UTF-8 bytes; decode the key from its raw bytes,
+    # which also resolves escapes such as "jos\u00e9" (json.dump's ensure_ascii)
+    patient_id = json.loads(text[key_start:pos].encode("latin-1"))
+    pos = _skip_ws(text, pos)
+    if text[pos] != ":":
+        raise StoreShapeError(f"Expected ':' at offset {base + pos}")
+    value_start = _skip_ws(text, pos + 1)
+    _, value_end = _decoder.raw_decode(text, value_start)
+    return (base + key_start, base + value_start, base + value_end, patient_id), value_end
+
+
+def build_index(text: str) -> Tuple[Dict[str, Tuple[int, int]], Dict[str, List[Entry]]]:
+    """
+    Byte spans of every entry under the indexed sections.
+
+    Args:
+        text: The store's bytes decoded as latin-1, so string offsets are byte offsets
+            (UTF-8 multi-byte sequences never contain JSON punctuation)
+
+    Returns:
+        ({section: (object start, object end)}, {section: [entries in file order]})
+    """
+    pos = _skip_ws(text, 0)
+    if not text.startswith("{", pos):
+        raise StoreShapeError("Store is not a JSON object")
+    spans: Dict[str, Tuple[int, int]] = {}
+    entries: Dict[str, List[Entry]] = {}
+
+    entry, pos = _scan_member(text, pos + 1)
+    while entry is not None:
+        _, value_start, _, key = entry
+        if key in SECTIONS and text[value_start] == "{":
+            section_entries = []
+            member, end = _scan_member(text, value_start + 1)
+            while member is not None:
+                section_entries.append(member)
+                member, end = _scan_member(text, end)
+            spans[key] = (value_start, end)
+            entries[key] = section_entries
+        entry, pos = _scan_member(text, pos)
+    return spans, entries
+
+
+# Layout written by `json.dump(..., indent=2)` (the API's writer and the corpus
+# generator). JSON strings cannot contain raw newlines, so a line indented by exactly
+# two spaces is a top-level member and one indented by four is a section entry.
+_SECTION_RE = re.compile(rb'\n  ("(?:[^"\\\n]|\\.)*"): \{')
+_SECTION_CLOSE = b"\n  }"
+_ENTRY_RE = re.compile(rb'\n    ("(?:[^"\\\n]|\\.)*"): ')
+
+
+def _build_index_indented(buf) -> Optional[Tuple[Dict[str, Tuple[int, int]], Dict[str, List[Entry]]]]:
+    """
+    Fast path of `build_index` for indent=2 stores: finds entries with a regex over
+    the raw bytes instead of scanning every value. Returns None for other layouts.
+    """
+    if buf[:5] != b'{\n  "':
+        return None
+    spans: Dict[str, Tuple[int, int]] = {}
+    entries: Dict[str, List[Entry]] = {}
+    for section_match in _SECTION_RE.finditer(buf):
+        section = json.loads(section_match.group(1))
+        if section not in SECTIONS or section in spans:
+            continue
+        start = section_match.end() - 1
+        if buf[start + 1:start + 2] == b"}":
+            spans[section], entries[section] = (start, start + 2), []
+            continue
+        close = buf.find(_SECTION_CLOSE, start)
+        if close < 0:
+            return None
+
+        section_entries: List[Entry] = []
+        matches = list(_ENTRY_RE.finditer(buf, start, close))
+        for i, m in enumerate(matches):
+            value_end = matches[i + 1].start() - 1 if i + 1 < len(matches) else close
+            if i + 1 < len(matches) and buf[value_end:value_end + 1] != b",":
+                return None
+            section_entries.append((m.start(1), m.end(), value_end, json.loads(m.group(1))))
+        if matches and matches[0].start() != start + 1:
+            return None
+        spans[section] = (start, close + len(_SECTION_CLOSE))
+        entries[section] = section_entries
+    return spans, entries
+
+
+# Compare in chunks small enough to be served from the heap (large slices would be
+# fresh mmap-backed allocations, page-faulted in on every copy).
+_DIFF_CHUNK = 1 << 16
+
+
+def _common_prefix(a, b) -> int:
+    limit = min(len(a), len(b))
+    pos, step = 0, _DIFF_CHUNK
+    while step:
+        while pos + step <= limit and a[pos:pos + step] == b[pos:pos + step]:
+            pos += step
+        step >>= 1
+    return pos
+
+
+def _common_suffix(a, b, limit: int) -> int:
+    pos, step = 0, _DIFF_CHUNK
+    la, lb = len(a), len(b)
+    while step:
+        while pos + step <= limit and a[la - pos - step:la - pos] == b[lb - pos - step:lb - pos]:
+            pos += step
+        step >>= 1
+    return pos
+
+
+def _rescan(new, resume: int, new_dirty_end: int, delta: int,
+            old_starts: Dict[int, int], window: int):
+    """
+    Scan section members in `new` from `resume` until a key lines up with an unchanged
+    old entry (at or after the changed range) or the section closes.
+
+    Returns:
+        (scanned entries, index into the old entries to continue from or None,
+        new section end or None)
+
+    Raises:
+        EOFError: if the decoded window was too small; retry with a larger one.
+    """
+    end = min(len(new), new_dirty_end + window)
+    text = new[resume:end].decode("latin-1")
+    scanned: List[Entry] = []
+    pos = 0
+    while True:
+        try:
+            entry, next_pos = _scan_member(text, pos, resume)
+        except (IndexError, ValueError):
+            if end < len(new):
+                raise EOFError
+            raise
+        if entry is None:
+            return scanned, None, resume + next_pos
+        key_start = entry[0]
+        if key_start >= new_dirty_end and (key_start - delta) in old_starts:
+            return scanned, old_starts[key_start - delta], None
+        scanned.append(entry)
+        pos = next_pos
+
+
+def update_index(old, new, spans: Dict[str, Tuple[int, int]], entries: Dict[str, List[Entry]]):
+    """
+    Update the index of `old` (bytes-like) to describe `new`, re-scanning only what changed.
+
+    The files are diffed by common prefix and suffix. Entries before the changed range
+    are kept, entries after it are shifted, and in the one section overlapping it only
+    the entries from the last one starting before the change up to the first unchanged
+    one are re-scanned.
+
+    Returns:
+        (spans, entries, number of entries re-scanned), or None if the change is not
+        confined to a single section and a full rebuild is needed.
+    """
+    prefix = _common_prefix(old, new)
+    if prefix == len(old) == len(new):
+        return spans, entries, 0
+    suffix = _common_suffix(old, new, min(len(old), len(new)) - prefix)
+    old_dirty_end = len(old) - suffix
+    new_dirty_end = len(new) - suffix
+    delta = len(new) - len(old)
+
+    def shift(entry: Entry) -> Entry:
+        return (entry[0] + delta, entry[1] + delta, entry[2] + delta, entry[3])
+
+    dirty = None
+    new_spans: Dict[str, Tuple[int, int]] = {}
+    new_entries: Dict[str, List[Entry]] = {}
+    for section, (start, end) in spans.items():
+        if start < prefix and old_dirty_end < end:
+            # Both braces of this section are outside the changed range
+            dirty = section
+        elif end <= prefix:
+            new_spans[section], new_entries[section] = (start, end), entries[section]
+        elif start >= old_dirty_end:
+            new_spans[section] = (start + delta, end + delta)
+            new_entries[section] = [shift(e) for e in entries[section]]
+        else:
+            return None
+    if dirty is None:
+        return None
+
+    old_list = entries[dirty]
+    # Resume at the last entry whose key starts at or before the first changed byte
+    keep = 0
+    while keep < len(old_list) and old_list[keep][0] <= prefix:
+        keep += 1
+    if keep:
+        keep -= 1
+        resume = old_list[keep][0]
+    else:
+        resume = spans[dirty][0] + 1
+    old_starts = {entry[0]: i for i, entry in enumerate(old_list)}
+
+    window = UPDATE_WINDOW_BYTES
+    while True:
+        try:
+            scanned, match, section_end = _rescan(new, resume, new_dirty_end, delta, old_starts, window)
+            break
+        except EOFError:
+            window *= 4
+
+    if match is not None:
+        new_entries[dirty] = old_list[:keep] + scanned + [shift(e) for e in old_list[match:]]
+        new_spans[dirty] = (spans[dirty][0], spans[dirty][1] + delta)
+    else:
+        new_entries[dirty] = old_list[:keep] + scanned
+        new_spans[dirty] = (spans[dirty][0], section_end)
+    return new_spans, new_entries, len(scanned)
+
+
+class RecordIndex:
+    """
+    Lazily loaded view of the record store: the file is memory-mapped and only the
+    requested entry's bytes are parsed.
+
+    The index (byte spans per entry) is built on first use and updated incrementally
+    when the file changes. Writers replace the file with `os.replace`, so the previous
+    mapping still holds the old contents to diff against.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._map: Optional[mmap.mmap] = None
+        self._spans: Dict[str, Tuple[int, int]] = {}
+        self._entries: Dict[str, List[Entry]] = {}
+        self._lookup: Dict[str, Dict[str, Tuple[int, int]]] = {}
+
+    def _refresh(self) -> None:
+        st = os.stat(self.path)
+        signature = (st.st_mtime_ns, st.st_size)
+        if signature == self._signature:
+            return
+        if not st.st_size:
+            raise StoreShapeError("Store is empty")
+
+        started = time.perf_counter()
+        with open(self.path, "rb") as f:
+            new_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        result = None
+        if self._map is not None:
+            try:
+                result = update_index(self._map, new_map, self._spans, self._entries)
+            except (ValueError, IndexError):
+                result = None
+
+        try:
+            if result is not None:
+                spans, entries, rescanned = result
+                incr("record_index_updates", kind="incremental")
+                observe("record_index_rescanned", rescanned)
+            else:
+                fast = _build_index_indented(new_map)
+                spans, entries = fast or build_index(new_map[:].decode("latin-1"))
+                incr("record_index_updates", kind="full")
+        except BaseException:
+            new_map.close()
+            raise
+        observe("record_index_build_s", time.perf_counter() - started)
+
+        old_map = self._map
+        self._map, self._signature = new_map, signature
+        self._spans, self._entries = spans, entries
+        self._lookup = {
+            section: {pid: (value_start, value_end) for _, value_start, value_end, pid in section_entries}
+            for section, section_entries in entries.items()
+        }
+        if old_map is not None:
+            old_map.close()
+
+    def get(self, section: str, patient_id: str) -> Optional[Dict[str, Any]]:
+        """Parse and return one entry, or None if it doesn't exist."""
+        with self._lock:
+            self._refresh()
+            span = self._lookup.get(section, {}).get(patient_id)
+            if span is None:
+                return None
+            raw = self._map[span[0]:span[1]]
+        return json.loads(raw)
+
+    def ids(self, section: str) -> List[str]:
+        """Entry IDs of a section, in file order (a duplicated key is listed once, like json.load)."""
+        with self._lock:
+            self._refresh()
+            return list(dict.fromkeys(entry[3] for entry in self._entries.get(section, [])))
+
+
+_indexes: Dict[str, RecordIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_record_index(path: Optional[str] = None) -> RecordIndex:
+    """Process-wide index for a store path (PATIENT_RECORDS_PATH by default)."""
+    path = path or records_path()
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = RecordIndex(path)
+        return index
+
+
+def read_record(section: str, patient_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Read a single record without parsing the rest of the store.
+
+    Returns:
+        The record (a fresh dict the caller may modify), or None if it doesn't exist
+        or the store can't be read.
+    """
+    try:
+        return get_record_index().get(section, patient_id)
+    except (OSError, ValueError) as e:
+        print(f"[RECORD_INDEX] Could not read {section}/{patient_id}: {e}")
+        return None
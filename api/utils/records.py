@@ -0,0 +1,162 @@
+import gc
+import hashlib
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .compact_records import compact_store, loads_compact
+from .profiling import mark
+
+DEFAULT_RECORDS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "patient_records.json"
+)
+
+# Bumped whenever the snapshot layout changes; stale snapshots are ignored.
+SNAPSHOT_FORMAT = 1
+
+# Hold loaded records in the compact model (api/utils/compact_records.py), materialising
+# each record to a dict only when it is read.
+COMPACT_RECORDS = os.environ.get("COMPACT_RECORDS", "").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+_cache: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+
+
+def records_path() -> str:
+    """Path of the JSON record store (PATIENT_RECORDS_PATH overrides the bundled file)."""
+    return os.environ.get("PATIENT_RECORDS_PATH") or DEFAULT_RECORDS_PATH
+
+
+def snapshot_path(path: Optional[str] = None) -> str:
+    """Path of the precomputed snapshot for a record store."""
+    return os.environ.get("PATIENT_RECORDS_SNAPSHOT") or (path or records_path()) + ".snapshot"
+
+
+def _signature(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _snapshot_header(raw: bytes) -> Tuple[Any, ...]:
+    return (SNAPSHOT_FORMAT, sys.version_info[:2], len(raw), hashlib.sha1(raw).hexdigest())
+
+
+def build_snapshot(path: Optional[str] = None, out_path: Optional[str] = None) -> str:
+    """
+    Precompute a snapshot of the record store.
+
+    The snapshot is the parsed store pickled, which loads noticeably faster than
+    `json.loads` for transcript-heavy stores. It is keyed by a hash of the JSON
+    contents, so it is only used while the JSON file is unchanged. Snapshots are
+    trusted build artifacts; never point PATIENT_RECORDS_SNAPSHOT at untrusted files.
+
+    Returns:
+        Path of the written snapshot.
+    """
+    path = path or records_path()
+    out_path = out_path or snapshot_path(path)
+    with open(path, "rb") as f:
+        raw = f.read()
+    data = json.loads(raw)
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump((_snapshot_header(raw), data), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def _read_store(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    # Building millions of small containers triggers repeated full GC passes that
+    # find nothing to collect; pause the collector while deserializing.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        data = None
+        snap = snapshot_path(path)
+        if os.path.exists(snap):
+            try:
+                with open(snap, "rb") as f:
+                    header, snapshot = pickle.load(f)
+                if header == _snapshot_header(raw):
+                    data = snapshot
+            except (EOFError, ValueError, TypeError, OSError, pickle.UnpicklingError):
+                pass
+
+        if data is not None:
+            return compact_store(data) if COMPACT_RECORDS else data
+        return loads_compact(raw) if COMPACT_RECORDS else json.loads(raw)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def load_records() -> Dict[str, Any]:
+    """
+    Return the full parsed record store, loading it on first use.
+
+    The parsed store is cached per process and reloaded only when the file's
+    mtime or size changes. Callers must treat the result as read-only. With
+    COMPACT_RECORDS=1 the sections are read-only mappings that build each record's
+    dict on access.
+
+    Returns:
+        Dict with `patient_scribes` and `AI_scribes` sections, or empty dict if the
+        store is missing or unreadable.
+    """
+    path = records_path()
+    try:
+        signature = _signature(path)
+    except OSError:
+        return {}
+
+    cached = _cache.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        started = time.perf_counter()
+        try:
+            data = _read_store(path)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        mark("load_records", time.perf_counter() - started, bytes=signature[1])
+        _cache[path] = (signature, data)
+        return data
+
+
+def records_version() -> str:
+    """
+    Short version tag of the record store, changing whenever the file does.
+
+    Used for cache validators (ETags) and for keying derived indexes.
+    """
+    path = records_path()
+    try:
+        mtime_ns, size = _signature(path)
+    except OSError:
+        return "missing"
+    return hashlib.sha1(f"{path}:{mtime_ns}:{size}".encode()).hexdigest()[:16]
+
+
+def record_hash(record: Dict[str, Any]) -> str:
+    """Content hash of one record, stable across key order and store rewrites."""
+    canonical = json.dumps(record, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def invalidate_records() -> None:
+    """Drop the in-process cache (e.g. after writing the store in the same mtime tick)."""
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,595 @@
+import array
+import hashlib
+import json
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .metrics import incr, observe
+from .record_index import SECTIONS
+from .records import records_path
+from .transcript_index import parse_timestamp, speaker_label, tokenize
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: no cross-process build election
+    fcntl = None
+
+# Opt-in: serve reads from a prebuilt shared snapshot when it matches the store (SHARED_SNAPSHOT=1).
+ENABLED = os.environ.get("SHARED_SNAPSHOT", "0").lower() in ("1", "true", "yes")
+# Also rebuild a stale snapshot in the background (one worker wins the build election).
+# Needs a writable directory next to the store, so not for read-only deploys.
+AUTO_BUILD = os.environ.get("SHARED_SNAPSHOT_AUTOBUILD", "0").lower() in ("1", "true", "yes")
+# Minimum seconds between build attempts from one worker.
+BUILD_RETRY_S = float(os.environ.get("SHARED_SNAPSHOT_RETRY", 1))
+BUILD_TIMEOUT_S = float(os.environ.get("SHARED_SNAPSHOT_BUILD_TIMEOUT", 600))
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MAGIC = b"PRSHM001"
+FORMAT = 2
+
+# Fixed-width tables; every variable-length value lives in a blob region.
+#   row:     record_off, record_len, seg_start, seg_count, id_off, name_off,
+#            id_len, name_len, section, sex, flags, age
+#   segment: text_off, text_len, seconds, speaker
+#   name:    key_off, key_len, row
+#   term:    term_off, term_len, post_start, post_count
+#   posting: row, segment
+#   order:   row, per section in store order (rows themselves are sorted by ID)
+ROW = struct.Struct("<QIIIIIHHBBBxh")
+SEGMENT = struct.Struct("<QIfH")
+NAME = struct.Struct("<IHI")
+TERM = struct.Struct("<IHII")
+POSTING = struct.Struct("<II")
+ORDER = struct.Struct("<I")
+
+HAS_TRANSCRIPT = 1
+SEX_CODES = {"M": 1, "F": 2}
+
+_HEADER = struct.Struct("<8sI")
+
+_encode = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+def shared_snapshot_path(path: Optional[str] = None) -> str:
+    """Path of the shared snapshot for a record store."""
+    return os.environ.get("PATIENT_RECORDS_SHARED") or (path or records_path()) + ".shared"
+
+
+def _signature(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _normalize_name(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def _demographics(section: str, record: Dict[str, Any]) -> Tuple[str, int, int]:
+    info = record.get("patient_info" if section == "AI_scribes" else "patient") or {}
+    sex = str(info.get("sex") or "").upper()[:1]
+    age = info.get("age")
+    return (
+        str(info.get("name") or ""),
+        SEX_CODES.get(sex, 3 if sex else 0),
+        age if isinstance(age, int) and 0 <= age < 1 << 15 else -1,
+    )
+
+
+def build_shared_snapshot(path: Optional[str] = None, out_path: Optional[str] = None) -> str:
+    """
+    Encode the record store into a read-only file that every worker memory-maps.
+
+    Records are stored as compact JSON with their transcripts split out into a
+    segment table, next to fixed-width indexes: rows sorted by ID (with name, age and
+    sex), the rows in store order, normalised names, and transcript term postings. Readers look things up in
+    place, so the mapped pages are shared through the page cache instead of each
+    worker holding its own parsed copy of the store.
+
+    The file is written next to the target and renamed over it, so readers see either
+    the previous version or the complete new one.
+
+    Returns:
+        Path of the written snapshot.
+    """
+    path = path or records_path()
+    out_path = out_path or shared_snapshot_path(path)
+    with open(path, "rb") as f:
+        # Signature of the file actually read, even if the store is replaced meanwhile
+        st = os.fstat(f.fileno())
+        raw = f.read()
+    source = (st.st_mtime_ns, st.st_size)
+    data = json.loads(raw)
+    del raw
+
+    records = bytearray()
+    segments = bytearray()
+    seg_table = bytearray()
+    strings = bytearray()
+    rows = bytearray()
+    speakers: Dict[str, int] = {}
+    names: List[Tuple[bytes, int]] = []
+    # term -> flattened (row, segment) pairs
+    postings: Dict[str, List[int]] = {}
+    sections: Dict[str, List[int]] = {}
+    order = array.array("I")
+
+    def add_string(value: str) -> Tuple[int, int]:
+        encoded = value.encode("utf-8")[:0xFFFF]
+        offset = len(strings)
+        strings.extend(encoded)
+        return offset, len(encoded)
+
+    row_count = seg_count = 0
+    for code, section in enumerate(SECTIONS):
+        entries = data.get(section) or {}
+        sections[section] = [row_count, row_count + len(entries)]
+        ranked = sorted(entries)
+        rank = {patient_id: i for i, patient_id in enumerate(ranked)}
+        order.extend(row_count + rank[patient_id] for patient_id in entries)
+        for patient_id in ranked:
+            record = entries[patient_id]
+            flags, seg_start, row_segments = 0, seg_count, 0
+            transcript = record.get("transcript") if isinstance(record, dict) else None
+            if isinstance(transcript, list):
+                flags |= HAS_TRANSCRIPT
+                # Keep the key (and so its position) with the segment count as a placeholder
+                record = dict(record, transcript=len(transcript))
+                for pos, segment in enumerate(transcript):
+                    encoded = _encode(segment).encode("utf-8")
+                    if pos:
+                        segments.append(ord(","))
+                    offset = len(segments)
+                    segments.extend(encoded)
+                    segment = segment if isinstance(segment, dict) else {}
+                    speaker = speakers.setdefault(str(segment.get("speaker", "")), len(speakers))
+                    seconds = parse_timestamp(segment.get("t"))
+                    seg_table.extend(SEGMENT.pack(
+                        offset, len(encoded), seconds if seconds is not None else float("inf"), speaker,
+                    ))
+                    for term in set(tokenize(str(segment.get("text", "")))):
+                        postings.setdefault(term, []).extend((row_count, pos))
+                    row_segments += 1
+                seg_count += row_segments
+
+            encoded = _encode(record).encode("utf-8")
+            name, sex, age = _demographics(section, record if isinstance(record, dict) else {})
+            id_off, id_len = add_string(patient_id)
+            name_off, name_len = add_string(name)
+            rows.extend(ROW.pack(
+                len(records), len(encoded), seg_start, row_segments, id_off, name_off,
+                id_len, name_len, code, sex, flags, age,
+            ))
+            records.extend(encoded)
+            if name:
+                names.append((_normalize_name(name).encode("utf-8")[:0xFFFF], row_count))
+            row_count += 1
+
+    name_table = bytearray()
+    for key, row in sorted(names):
+        key_off, key_len = len(strings), len(key)
+        strings.extend(key)
+        name_table.extend(NAME.pack(key_off, key_len, row))
+
+    term_table = bytearray()
+    posting_table = array.array("I")
+    post_count = 0
+    for term in sorted(postings):
+        term_off, term_len = add_string(term)
+        term_postings = postings[term]
+        term_table.extend(TERM.pack(term_off, term_len, post_count, len(term_postings) // 2))
+        posting_table.extend(term_postings)
+        post_count += len(term_postings) // 2
+    if sys.byteorder != "little":
+        posting_table.byteswap()
+        order.byteswap()
+
+    blobs = [
+        ("rows", rows), ("names", name_table), ("terms", term_table), ("postings", posting_table.tobytes()),
+        ("segment_table", seg_table), ("strings", strings), ("records", records), ("segments", segments),
+        ("order", order.tobytes()),
+    ]
+    header = {
+        "format": FORMAT,
+        "source": list(source),
+        "version": hashlib.sha1(f"{FORMAT}:{source}".encode()).hexdigest()[:12],
+        "sections": sections,
+        "speakers": sorted(speakers, key=speakers.get),
+        "counts": {"rows": row_count, "names": len(names), "terms": len(postings),
+                   "postings": post_count, "segments": seg_count},
+        "regions": {},
+    }
+    # Region offsets depend on the header length, which depends on the offsets
+    header_len = 0
+    while True:
+        offset = _HEADER.size + header_len
+        offset += -offset % 8
+        for name, blob in blobs:
+            header["regions"][name] = [offset, len(blob)]
+            offset += len(blob) + (-len(blob) % 8)
+        encoded_header = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        if len(encoded_header) <= header_len:
+            break
+        header_len = len(encoded_header) + 64
+
+    directory = os.path.dirname(out_path) or "."
+    tmp_path = os.path.join(directory, f".{os.path.basename(out_path)}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, header_len))
+            f.write(encoded_header.ljust(header_len))
+            for name, blob in blobs:
+                f.seek(header["regions"][name][0])
+                f.write(blob)
+            f.truncate(offset)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return out_path
+
+
+def _bisect(lo: int, hi: int, key_at: Callable[[int], Any], target: Any, right: bool = False) -> int:
+    while lo < hi:
+        mid = (lo + hi) // 2
+        key = key_at(mid)
+        if key < target or (right and key == target):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class SharedSnapshot:
+    """
+    Read-only view of a snapshot written by `build_shared_snapshot`.
+
+    Lookups bisect the fixed-width tables directly in the mapping and only decode the
+    bytes they return. A replaced snapshot file stays mapped until the last reader
+    drops this object, so swapping versions never invalidates a read in progress.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_signature = (st.st_ino, st.st_mtime_ns)
+        try:
+            magic, header_len = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError("Not a shared record snapshot")
+            header = json.loads(self._map[_HEADER.size:_HEADER.size + header_len])
+            if header.get("format") != FORMAT:
+                raise ValueError(f"Unsupported snapshot format {header.get('format')}")
+        except (struct.error, ValueError):
+            self._map.close()
+            raise
+
+        self.source = tuple(header["source"])
+        self.version = header["version"]
+        self.counts = header["counts"]
+        self.speakers: List[str] = header["speakers"]
+        self._sections = {section: tuple(span) for section, span in header["sections"].items()}
+        self._regions = {name: offset for name, (offset, _) in header["regions"].items()}
+
+    # -- tables
+
+    def _row(self, row: int) -> Tuple[int, ...]:
+        return ROW.unpack_from(self._map, self._regions["rows"] + row * ROW.size)
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._regions["strings"] + offset
+        return self._map[start:start + length].decode("utf-8")
+
+    def _row_id(self, row: int) -> str:
+        fields = self._row(row)
+        return self._string(fields[4], fields[6])
+
+    def _find(self, section: str, patient_id: str) -> Optional[int]:
+        lo, hi = self._sections.get(section, (0, 0))
+        row = _bisect(lo, hi, self._row_id, patient_id)
+        return row if row < hi and self._row_id(row) == patient_id else None
+
+    def _store_order(self, section: str) -> Iterator[int]:
+        """Rows of a section in the store's order."""
+        lo, hi = self._sections.get(section, (0, 0))
+        base = self._regions["order"]
+        for (row,) in ORDER.iter_unpack(self._map[base + lo * ORDER.size:base + hi * ORDER.size]):
+            yield row
+
+    def _segment(self, index: int) -> Tuple[int, int, float, int]:
+        return SEGMENT.unpack_from(self._map, self._regions["segment_table"] + index * SEGMENT.size)
+
+    def _decode_segment(self, index: int) -> Dict[str, Any]:
+        offset, length, _, _ = self._segment(index)
+        start = self._regions["segments"] + offset
+        return json.loads(self._map[start:start + length])
+
+    def _segment_json(self, first: int, count: int) -> bytes:
+        if not count:
+            return b"[]"
+        start, _, _, _ = self._segment(first)
+        end_off, end_len, _, _ = self._segment(first + count - 1)
+        base = self._regions["segments"]
+        return b"[" + self._map[base + start:base + end_off + end_len] + b"]"
+
+    def _postings(self, term: str, row: int) -> List[int]:
+        def term_at(i: int) -> str:
+            term_off, term_len, _, _ = TERM.unpack_from(self._map, self._regions["terms"] + i * TERM.size)
+            return self._string(term_off, term_len)
+
+        count = self.counts["terms"]
+        i = _bisect(0, count, term_at, term)
+        if i >= count or term_at(i) != term:
+            return []
+        _, _, start, length = TERM.unpack_from(self._map, self._regions["terms"] + i * TERM.size)
+
+        def posting_row(j: int) -> int:
+            return POSTING.unpack_from(self._map, self._regions["postings"] + j * POSTING.size)[0]
+
+        lo = _bisect(start, start + length, posting_row, row)
+        hi = _bisect(lo, start + length, posting_row, row, right=True)
+        base = self._regions["postings"]
+        return [POSTING.unpack_from(self._map, base + j * POSTING.size)[1] for j in range(lo, hi)]
+
+    # -- records
+
+    def get(self, section: str, patient_id: str, include_transcript: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Decode one record, or None if it doesn't exist.
+
+        With `include_transcript=False` the transcript is not decoded; the record gets
+        `transcript_segments` (its segment count) instead.
+        """
+        row = self._find(section, patient_id)
+        if row is None:
+            return None
+        record_off, record_len, seg_start, seg_count, *_, flags, _ = self._row(row)
+        start = self._regions["records"] + record_off
+        record = json.loads(self._map[start:start + record_len])
+        if flags & HAS_TRANSCRIPT:
+            if include_transcript:
+                record["transcript"] = json.loads(self._segment_json(seg_start, seg_count))
+            else:
+                del record["transcript"]
+                record["transcript_segments"] = seg_count
+        return record
+
+    def ids(self, section: str) -> List[str]:
+        """Entry IDs of a section, in store order."""
+        return [self._row_id(row) for row in self._store_order(section)]
+
+    def names(self, section: str) -> List[Tuple[str, str]]:
+        """(patient_id, name) for every entry of a section that has a name, in store order."""
+        result = []
+        for row in self._store_order(section):
+            fields = self._row(row)
+            if fields[7]:
+                result.append((self._string(fields[4], fields[6]), self._string(fields[5], fields[7])))
+        return result
+
+    def find_by_name(self, name: str) -> List[Tuple[str, str]]:
+        """(section, patient_id) of every entry whose full name matches, ignoring case and spacing."""
+        key = _normalize_name(name)
+        base = self._regions["names"]
+
+        def key_at(i: int) -> str:
+            key_off, key_len, _ = NAME.unpack_from(self._map, base + i * NAME.size)
+            return self._string(key_off, key_len)
+
+        count = self.counts["names"]
+        matches = []
+        for i in range(_bisect(0, count, key_at, key), count):
+            if key_at(i) != key:
+                break
+            row = NAME.unpack_from(self._map, base + i * NAME.size)[2]
+            matches.append((SECTIONS[self._row(row)[8]], self._row_id(row)))
+        return matches
+
+    def filter_ids(
+        self,
+        section: str,
+        min_age: Optional[int] = None,
+        max_age: Optional[int] = None,
+        sex: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        IDs in a section matching an age range and/or sex ("M" / "F"), in store order,
+        from the row table alone.
+        """
+        sex_code = SEX_CODES.get(sex.upper()[:1], 3) if sex else None
+        for row in self._store_order(section):
+            fields = self._row(row)
+            row_sex, age = fields[9], fields[11]
+            if sex_code is not None and row_sex != sex_code:
+                continue
+            if (min_age is not None or max_age is not None) and age < 0:
+                continue
+            if (min_age is not None and age < min_age) or (max_age is not None and age > max_age):
+                continue
+            yield self._string(fields[4], fields[6])
+
+    # -- transcripts
+
+    def search_transcript(
+        self,
+        section: str,
+        patient_id: str,
+        query: Optional[str] = None,
+        phrase: Optional[str] = None,
+        speaker: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Optional[Tuple[List[int], int]]:
+        """
+        Same matching and ranking as `TranscriptIndex.search`, over the segment table.
+
+        Returns:
+            (matching segment positions, number of segments), or None if the record
+            doesn't exist.
+        """
+        row = self._find(section, patient_id)
+        if row is None:
+            return None
+        _, _, seg_start, seg_count, *_ = self._row(row)
+        segments = [self._segment(seg_start + pos) for pos in range(seg_count)]
+        candidates: Optional[set] = None
+
+        def narrow(positions) -> None:
+            nonlocal candidates
+            positions = set(positions)
+            candidates = positions if candidates is None else candidates & positions
+
+        if speaker:
+            label = speaker_label(speaker, {label.lower() for label in self.speakers})
+            wanted = {i for i, name in enumerate(self.speakers) if name.lower() == label}
+            narrow(pos for pos, seg in enumerate(segments) if seg[3] in wanted)
+        if start is not None or end is not None:
+            narrow(pos for pos, seg in enumerate(segments)
+                   if (start is None or seg[2] >= start) and (end is None or seg[2] <= end))
+
+        if phrase:
+            for term in tokenize(phrase):
+                narrow(self._postings(term, row))
+            needle = phrase.lower()
+            narrow(pos for pos in (candidates if candidates is not None else range(seg_count))
+                   if needle in str(self._decode_segment(seg_start + pos).get("text", "")).lower())
+
+        scores: Dict[int, int] = {}
+        if query:
+            for term in set(tokenize(query)):
+                for pos in self._postings(term, row):
+                    scores[pos] = scores.get(pos, 0) + 1
+            narrow(scores)
+
+        if candidates is None:
+            candidates = set(range(seg_count))
+        return sorted(candidates, key=lambda p: (-scores.get(p, 0), p)), seg_count
+
+    def segments(self, section: str, patient_id: str, positions: List[int]) -> List[Dict[str, Any]]:
+        """Decode the transcript segments at `positions` (in that order)."""
+        row = self._find(section, patient_id)
+        if row is None:
+            return []
+        _, _, seg_start, seg_count, *_ = self._row(row)
+        return [self._decode_segment(seg_start + pos) for pos in positions if 0 <= pos < seg_count]
+
+
+_lock = threading.Lock()
+# snapshot path -> snapshot currently served
+_current: Dict[str, SharedSnapshot] = {}
+# snapshot path -> file signature last found stale, so it isn't reopened on every call
+_stale: Dict[str, Tuple[int, int]] = {}
+_next_build: Dict[str, float] = {}
+_builders: Dict[str, threading.Thread] = {}
+
+
+def _build_elected(path: str, snap_path: str) -> None:
+    """Build the snapshot if this process wins the lock; other workers keep their fallback."""
+    try:
+        with open(snap_path + ".lock", "a") as lock_file:
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    incr("shared_snapshot_builds", outcome="lost_election")
+                    return
+            try:
+                # Another worker may have finished a build just before we got the lock
+                with open(snap_path, "rb") as f:
+                    magic, header_len = _HEADER.unpack(f.read(_HEADER.size))
+                    current = json.loads(f.read(header_len)) if magic == MAGIC else {}
+                if tuple(current.get("source", ())) == _signature(path) and current.get("format") == FORMAT:
+                    return
+            except (OSError, ValueError, struct.error):
+                pass
+            try:
+                # Encoding is CPU-bound; build in a child so this worker keeps serving
+                started = time.perf_counter()
+                subprocess.run(
+                    [sys.executable, "-m", "api.utils.shared_snapshot", path, snap_path],
+                    cwd=PROJECT_ROOT, check=True, timeout=BUILD_TIMEOUT_S,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                )
+                observe("shared_snapshot_build_s", time.perf_counter() - started)
+                incr("shared_snapshot_builds", outcome="built")
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    except Exception as e:
+        incr("shared_snapshot_builds", outcome="error")
+        detail = getattr(e, "stderr", None)
+        detail = detail.decode(errors="replace").strip().splitlines()[-1:] if detail else []
+        print(f"[SHARED_SNAPSHOT] Build of {snap_path} failed: {e} {' '.join(detail)}".rstrip())
+
+
+def _schedule_build(path: str, snap_path: str) -> None:
+    if not AUTO_BUILD or time.monotonic() < _next_build.get(snap_path, 0.0):
+        return
+    builder = _builders.get(snap_path)
+    if builder is not None and builder.is_alive():
+        return
+    _next_build[snap_path] = time.monotonic() + BUILD_RETRY_S
+    builder = _builders[snap_path] = threading.Thread(
+        target=_build_elected, args=(path, snap_path), name="shared-snapshot-build", daemon=True,
+    )
+    builder.start()
+
+
+def get_shared_snapshot() -> Optional[SharedSnapshot]:
+    """
+    The shared snapshot of the current record store, or None while it is missing or stale.
+
+    A stale snapshot is rebuilt in the background by whichever worker wins the build
+    election; callers fall back to their own read path until the new version lands.
+    """
+    if not ENABLED:
+        return None
+    path = records_path()
+    snap_path = shared_snapshot_path(path)
+    try:
+        source = _signature(path)
+    except OSError:
+        return None
+
+    with _lock:
+        current = _current.get(snap_path)
+        if current is not None and current.source == source:
+            return current
+        try:
+            st = os.stat(snap_path)
+            file_signature = (st.st_ino, st.st_mtime_ns)
+        except OSError:
+            file_signature = None
+
+        if file_signature is not None and file_signature != _stale.get(snap_path) and (
+            current is None or current.file_signature != file_signature
+        ):
+            try:
+                opened = SharedSnapshot(snap_path)
+            except (OSError, ValueError) as e:
+                print(f"[SHARED_SNAPSHOT] Ignoring {snap_path}: {e}")
+                opened = None
+            if opened is not None and opened.source == source:
+                _current[snap_path] = opened
+                incr("shared_snapshot_swaps")
+                return opened
+            _stale[snap_path] = file_signature
+
+        # The previous version is dropped, not closed: readers holding it finish normally
+        _current.pop(snap_path, None)
+        _schedule_build(path, snap_path)
+    return None
+
+
+if __name__ == "__main__":
+    # Child process entry point used by the build election: <records path> <snapshot path>
+    build_shared_snapshot(*sys.argv[1:3])
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import os
+import zlib
+from json.encoder import encode_basestring_ascii
+from typing import AsyncIterator, Iterator, List, Union
+
+from starlette.concurrency import iterate_in_threadpool
+
+from .metrics import incr, observe
+
+# Coalescing window for text frames; 0 disables coalescing.
+COALESCE_WINDOW_MS = float(os.environ.get("STREAM_COALESCE_MS", 20))
+# Flush early once this many bytes of text frames are buffered.
+COALESCE_MAX_BYTES = int(os.environ.get("STREAM_COALESCE_MAX_BYTES", 4096))
+# Gzip the data stream for clients that accept it (off by default; proxies may already compress).
+STREAM_GZIP = os.environ.get("STREAM_GZIP", "").lower() in ("1", "true", "yes")
+# Seconds of silence (e.g. during a tool round) before a keep-alive frame is sent; 0 disables.
+KEEPALIVE_S = float(os.environ.get("STREAM_KEEPALIVE_S", 5))
+
+TEXT_PREFIX = "0:"
+# Empty data part: ignored by the UI, but keeps proxies and the client from timing out
+KEEPALIVE_FRAME = '2:[{"type":"keep-alive"}]\n'
+
+_END = object()
+
+
+def text_frame(delta: str) -> str:
+    """
+    Encode a text delta as a `0:` data-stream frame.
+
+    Uses the C string escaper behind `json.dumps`, without the generic dispatch, and
+    produces byte-identical output.
+    """
+    return TEXT_PREFIX + encode_basestring_ascii(delta) + "\n"
+
+
+def tool_call_frame(call_id: str, name: str, arguments: str) -> str:
+    """`9:` frame announcing a tool call as it starts."""
+    try:
+        args = json.loads(arguments) if arguments else {}
+    except ValueError:
+        args = {}
+    return f'9:{json.dumps({"toolCallId": call_id, "toolName": name, "args": args})}\n'
+
+
+def tool_result_frame(call_id: str, name: str, duration_s: float, output: str) -> str:
+    """
+    `a:` frame for a finished tool call. Carries timing and size only; the output
+    itself goes to the model, not the client.
+    """
+    result = {
+        "toolName": name,
+        "status": "error" if output.startswith('{"error"') else "ok",
+        "durationMs": round(duration_s * 1000),
+        "resultChars": len(output),
+    }
+    return f'a:{json.dumps({"toolCallId": call_id, "result": result})}\n'
+
+
+def merge_text_frames(frames: List[str]) -> str:
+    """
+    Merge consecutive `0:"..."` frames into one without re-encoding.
+
+    Each frame body is a complete JSON string literal, so dropping the closing quote
+    of one and the opening quote of the next yields the literal of the concatenation.
+    """
+    if len(frames) == 1:
+        return frames[0]
+    # '0:"abc"\n' -> 'abc'
+    inner = "".join(frame[3:-2] for frame in frames)
+    return f'{TEXT_PREFIX}"{inner}"\n'
+
+
+class _Gzip:
+    """Incremental gzip with a sync flush per write, so every chunk is decodable on arrival."""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def write(self, data: str) -> bytes:
+        return self._compressor.compress(data.encode("utf-8")) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+async def encode_stream(
+    frames: Iterator[str],
+    window_ms: float = COALESCE_WINDOW_MS,
+    max_bytes: int = COALESCE_MAX_BYTES,
+    gzip: bool = False,
+    keepalive_s: float = KEEPALIVE_S,
+) -> AsyncIterator[Union[str, bytes]]:
+    """
+    Write a data-stream frame generator to the transport, coalescing text frames.
+
+    Text (`0:`) frames arriving within `window_ms` of the first buffered one are merged
+    into a single frame and a single transport write. Any other frame (tool calls,
+    finish/error) flushes buffered text first, so frame order is preserved. The timer
+    runs independently of the producer, so text is never held longer than the window
+    even if upstream stalls mid-response. Once something has been written, a
+    keep-alive frame goes out after every `keepalive_s` without output.
+
+    Args:
+        frames: Sync generator from an orchestrator (run in the threadpool)
+        window_ms: Coalescing window; 0 writes every frame as it arrives
+        max_bytes: Flush early once this much text is buffered
+        gzip: Compress the output (caller must set Content-Encoding)
+        keepalive_s: Silence before a keep-alive frame; 0 disables
+
+    Yields:
+        str chunks, or bytes when gzip is enabled
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    compressor = _Gzip() if gzip else None
+    window_s = window_ms / 1000
+    frames_in = 0
+    writes = 0
+    last_write = loop.time()
+
+    async def pump():
+        try:
+            async for frame in iterate_in_threadpool(frames):
+                await queue.put(frame)
+        except Exception as e:  # surfaced to the consumer below
+            await queue.put(e)
+        finally:
+            await queue.put(_END)
+
+    producer = asyncio.ensure_future(pump())
+
+    def emit(data: str):
+        nonlocal writes, last_write
+        writes += 1
+        last_write = loop.time()
+        return compressor.write(data) if compressor else data
+
+    buffer: List[str] = []
+    buffered_bytes = 0
+    deadline = None
+    try:
+        while True:
+            # Keep-alives start after the first write, so the client's "thinking" state isn't replaced early
+            wake_at = deadline if buffer else (last_write + keepalive_s if keepalive_s > 0 and writes else None)
+            timeout = None if wake_at is None else max(wake_at - loop.time(), 0)
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if buffer:
+                    yield emit(merge_text_frames(buffer))
+                    buffer, buffered_bytes, deadline = [], 0, None
+                else:
+                    incr("stream_keepalives")
+                    yield emit(KEEPALIVE_FRAME)
+                continue
+
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            frames_in += 1
+            if window_s > 0 and item.startswith(TEXT_PREFIX):
+                buffer.append(item)
+                buffered_bytes += len(item)
+                if deadline is None:
+                    deadline = loop.time() + window_s
+                if buffered_bytes >= max_bytes:
+                    yield emit(merge_text_frames(buffer))
+                    buffer, buffered_bytes, deadline = [], 0, None
+                continue
+
+            if buffer:
+                yield emit(merge_text_frames(buffer))
+                buffer, buffered_bytes, deadline = [], 0, None
+            yield emit(item)
+
+        if buffer:
+            yield emit(merge_text_frames(buffer))
+        if compressor:
+            yield compressor.finish()
+    finally:
+        producer.cancel()
+        incr("stream_frames_in", frames_in)
+        incr("stream_writes", writes)
+        if writes:
+            observe("stream_frames_per_write", frames_in / writes)
@@ -0,0 +1,195 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .metrics import incr, observe
+from .patient_directory import SECTIONS, find_patient_record
+from .records import load_records, record_hash
+
+# Caps that keep a card around 300 tokens regardless of how long the record is.
+MAX_LIST_ITEMS = 6
+MAX_TEXT_CHARS = 200
+
+_lock = threading.Lock()
+# (section, patient_id) -> (record hash, card)
+_cards: Dict[Tuple[str, str], Tuple[str, Dict[str, Any]]] = {}
+# Store object the last full refresh covered; cards are known current while it's loaded.
+_refreshed_from: Any = None
+_refresh_thread: Optional[threading.Thread] = None
+
+
+def _clip(text: Any, limit: int = MAX_TEXT_CHARS) -> Any:
+    if isinstance(text, str) and len(text) > limit:
+        return text[: limit - 1].rstrip() + "…"
+    return text
+
+
+def _clip_list(items: Any) -> List[Any]:
+    items = items or []
+    clipped = [_clip(item) for item in items[:MAX_LIST_ITEMS]]
+    if len(items) > MAX_LIST_ITEMS:
+        clipped.append(f"+{len(items) - MAX_LIST_ITEMS} more")
+    return clipped
+
+
+def _format_vitals(vitals: Dict[str, Any]) -> Optional[str]:
+    labels = (
+        ("bp", "BP {}"), ("hr_bpm", "HR {}"), ("rr_bpm", "RR {}"),
+        ("temp_f", "T {}F"), ("spo2_pct", "SpO2 {}%"), ("bmi", "BMI {}"),
+    )
+    parts = [fmt.format(vitals[key]) for key, fmt in labels if vitals.get(key) is not None]
+    return ", ".join(parts) or None
+
+
+def _med_changes(plan: Dict[str, Any]) -> List[str]:
+    changes = []
+    for change in plan.get("medication_changes", []):
+        if isinstance(change, dict):
+            changes.extend(f"{action} {drug}" for action, drug in change.items())
+        else:
+            changes.append(str(change))
+    return changes
+
+
+def _follow_ups(plan: Dict[str, Any]) -> List[str]:
+    follow_ups = []
+    for item in plan.get("follow_up", []):
+        if isinstance(item, dict):
+            text = " ".join(str(item[k]) for k in ("type", "when") if item.get(k))
+            if item.get("purpose"):
+                text += f": {item['purpose']}"
+            follow_ups.append(text)
+        else:
+            follow_ups.append(str(item))
+    return follow_ups
+
+
+def build_summary_card(section: str, patient_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Project a record onto a compact summary card.
+
+    Encounters (`patient_scribes`) get demographics, vitals, problems with ICD-10
+    codes, medication changes and follow-ups; intakes (`AI_scribes`) get the reported
+    symptoms, medications, conditions and the intake assessment.
+    """
+    if section == "AI_scribes":
+        info = record.get("patient_info", {})
+        return {
+            "id": patient_id,
+            "source": section,
+            "name": info.get("name"),
+            "age": info.get("age"),
+            "sex": info.get("sex"),
+            "submitted": record.get("timestamp"),
+            "status": record.get("status", "pending_review"),
+            "chief_complaint": _clip(record.get("chief_complaint")),
+            "symptoms": _clip_list(record.get("symptoms")),
+            "current_medications": _clip_list(record.get("current_medications")),
+            "existing_conditions": _clip_list(record.get("existing_conditions")),
+            "allergies": _clip_list(record.get("allergies")),
+            "assessment": _clip(record.get("ai_assessment")),
+        }
+
+    patient = record.get("patient", {})
+    history = record.get("history", {})
+    plan = record.get("plan", {})
+    problems = [
+        f"{p.get('problem')} ({p['icd10']})" if p.get("icd10") else p.get("problem")
+        for p in record.get("assessment", []) if isinstance(p, dict)
+    ]
+    return {
+        "id": patient_id,
+        "source": section,
+        "name": patient.get("name"),
+        "age": patient.get("age"),
+        "sex": patient.get("sex"),
+        "mrn": patient.get("mrn"),
+        "encounter": record.get("encounter_id"),
+        "date": (record.get("timestamp") or "")[:10] or None,
+        "provider": record.get("provider", {}).get("name"),
+        "chief_complaint": _clip(record.get("chief_complaint")),
+        "vitals": _format_vitals(record.get("vitals", {})),
+        "problems": _clip_list(problems),
+        "allergies": _clip_list(history.get("allergies")),
+        "medication_changes": _clip_list(_med_changes(plan)),
+        "orders": _clip_list(plan.get("orders_today")),
+        "follow_up": _clip_list(_follow_ups(plan)),
+        "transcript_segments": len(record.get("transcript", [])),
+    }
+
+
+def _card_for(section: str, patient_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """Cached card for a record, rebuilt only if the record's content hash changed."""
+    digest = record_hash(record)
+    key = (section, patient_id)
+    cached = _cards.get(key)
+    if cached and cached[0] == digest:
+        return cached[1]
+    card = build_summary_card(section, patient_id, record)
+    with _lock:
+        _cards[key] = (digest, card)
+    incr("summary_cards_built")
+    return card
+
+
+def refresh_summary_cards() -> int:
+    """
+    Bring the card cache in line with the record store.
+
+    Only records whose content hash changed are re-summarized; cards for removed
+    records are dropped.
+
+    Returns:
+        Number of cards in the cache.
+    """
+    global _refreshed_from
+    started = time.perf_counter()
+    data = load_records()
+    seen = set()
+    for section in SECTIONS:
+        for patient_id, record in data.get(section, {}).items():
+            _card_for(section, patient_id, record)
+            seen.add((section, patient_id))
+
+    with _lock:
+        for key in [k for k in _cards if k not in seen]:
+            del _cards[key]
+        _refreshed_from = data
+        count = len(_cards)
+    observe("summary_cards_refresh_s", time.perf_counter() - started)
+    return count
+
+
+def schedule_refresh() -> None:
+    """Refresh the card cache on a background thread, unless a refresh is already running."""
+    global _refresh_thread
+    with _lock:
+        if _refresh_thread is not None and _refresh_thread.is_alive():
+            return
+        _refresh_thread = threading.Thread(target=refresh_summary_cards, name="summary-cards", daemon=True)
+        _refresh_thread.start()
+
+
+def get_summary_card(patient_id: str, section: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Summary card for one patient, or None if the patient doesn't exist.
+
+    While the store the last background refresh covered is still loaded, the cached
+    card is returned as is. Otherwise the requested record is re-hashed (and
+    re-summarized only if it changed) and a background refresh is scheduled for the rest.
+    """
+    data = load_records()
+    if _refreshed_from is data:
+        for sec in ((section,) if section else SECTIONS):
+            cached = _cards.get((sec, patient_id))
+            if cached:
+                incr("summary_card_hits")
+                return cached[1]
+        return None
+
+    schedule_refresh()
+    sec, record = find_patient_record(patient_id, section)
+    if record is None:
+        return None
+    incr("summary_card_misses")
+    return _card_for(sec, patient_id, record)
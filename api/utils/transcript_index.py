@@ -0,0 +1,167 @@
+import bisect
+import functools
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Per-patient indexes kept in memory (least recently used are dropped first).
+MAX_CACHED_INDEXES = 512
+# Other names for the transcript's "Provider" speaker label.
+SPEAKER_ALIASES = {"doctor": "provider", "clinician": "provider", "physician": "provider", "dr": "provider"}
+
+
+def parse_timestamp(value: Union[str, int, float, None]) -> Optional[float]:
+    """
+    Convert a transcript mark ("MM:SS", "HH:MM:SS") or a number of seconds to seconds.
+
+    Returns None for empty or unparseable values.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        seconds = 0.0
+        for part in str(value).strip().split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _stem(token: str) -> str:
+    """Very light suffix stripping so "coughing" / "coughs" match "cough"."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(token) > len(suffix) + 3 and token.endswith(suffix):
+            return token[: -len(suffix)]
+    return token
+
+
+def speaker_label(speaker: str, labels) -> str:
+    """
+    Lowercased speaker label to filter on: `speaker` itself if the transcript uses it,
+    else its alias ("Doctor" -> "provider").
+
+    Args:
+        speaker: Speaker requested by the caller
+        labels: Lowercased speaker labels present in the transcript
+    """
+    label = speaker.strip().lower().rstrip(".")
+    if label in labels:
+        return label
+    return SPEAKER_ALIASES.get(label, label)
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in _TOKEN_RE.findall(text.lower())]
+
+
+class TranscriptIndex:
+    """
+    Lookup structures over one encounter's `transcript` (`t` / `speaker` / `text` entries).
+
+    - `postings`: term -> sorted segment positions (inverted index)
+    - `speakers`: lowercased speaker label -> sorted segment positions
+    - `sorted_offsets` / `order`: segment start times in seconds, sorted, with the
+      position each offset belongs to, for time-window lookups by bisection
+    """
+
+    def __init__(self, segments: List[Dict[str, Any]]):
+        self.segments = segments
+        self.postings: Dict[str, List[int]] = {}
+        self.speakers: Dict[str, List[int]] = {}
+        offsets = []
+
+        for pos, segment in enumerate(segments):
+            for term in set(tokenize(segment.get("text", ""))):
+                self.postings.setdefault(term, []).append(pos)
+            speaker = str(segment.get("speaker", "")).lower()
+            self.speakers.setdefault(speaker, []).append(pos)
+            offset = parse_timestamp(segment.get("t"))
+            offsets.append((offset if offset is not None else float("inf"), pos))
+
+        offsets.sort()
+        self.sorted_offsets = [o for o, _ in offsets]
+        self.order = [p for _, p in offsets]
+
+    def _time_window(self, start: Optional[float], end: Optional[float]) -> set:
+        lo = bisect.bisect_left(self.sorted_offsets, start) if start is not None else 0
+        hi = bisect.bisect_right(self.sorted_offsets, end) if end is not None else len(self.order)
+        return set(self.order[lo:hi])
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        phrase: Optional[str] = None,
+        speaker: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> List[int]:
+        """
+        Segment positions matching every given filter.
+
+        `query` matches segments containing any of its terms, ranked by how many
+        distinct terms they contain; `phrase` requires the exact (case-insensitive)
+        text. Results without a `query` are in transcript order.
+        """
+        candidates: Optional[set] = None
+
+        def narrow(positions) -> None:
+            nonlocal candidates
+            positions = set(positions)
+            candidates = positions if candidates is None else candidates & positions
+
+        if speaker:
+            narrow(self.speakers.get(speaker_label(speaker, self.speakers), []))
+        if start is not None or end is not None:
+            narrow(self._time_window(start, end))
+
+        if phrase:
+            terms = tokenize(phrase)
+            for term in terms:
+                narrow(self.postings.get(term, []))
+            needle = phrase.lower()
+            narrow(p for p in (candidates or range(len(self.segments)))
+                   if needle in self.segments[p].get("text", "").lower())
+
+        scores: Dict[int, int] = {}
+        if query:
+            for term in set(tokenize(query)):
+                for pos in self.postings.get(term, []):
+                    scores[pos] = scores.get(pos, 0) + 1
+            narrow(scores)
+
+        if candidates is None:
+            candidates = set(range(len(self.segments)))
+        return sorted(candidates, key=lambda p: (-scores.get(p, 0), p))
+
+
+_lock = threading.Lock()
+# patient_id -> (transcript list the index was built from, index)
+_indexes: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+def get_transcript_index(patient_id: str, transcript: List[Dict[str, Any]]) -> TranscriptIndex:
+    """
+    Return the cached index for a patient's transcript, building it on first use.
+
+    The cache holds a reference to the transcript list it was built from; when the
+    record store reloads, the new list is a different object and the index is rebuilt.
+    """
+    with _lock:
+        cached = _indexes.get(patient_id)
+        if cached and cached[0] is transcript:
+            _indexes.move_to_end(patient_id)
+            return cached[1]
+
+    index = TranscriptIndex(transcript)
+    with _lock:
+        _indexes[patient_id] = (transcript, index)
+        _indexes.move_to_end(patient_id)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,253 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from .profiling import mark
+
+
+# USD per 1M tokens: (input, cached input, output). Override with
+# MODEL_PRICING="model:input:cached:output,model:..." if the price list changes.
+DEFAULT_PRICING = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+
+def _load_pricing() -> Dict[str, tuple]:
+    pricing = dict(DEFAULT_PRICING)
+    for entry in os.environ.get("MODEL_PRICING", "").split(","):
+        parts = entry.strip().split(":")
+        if len(parts) != 4:
+            continue
+        try:
+            pricing[parts[0]] = (float(parts[1]), float(parts[2]), float(parts[3]))
+        except ValueError:
+            continue
+    return pricing
+
+
+PRICING = _load_pricing()
+
+
+def _usage_field(usage: Any, *names: str) -> int:
+    """Read the first present token field from a usage object or dict."""
+    for name in names:
+        value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+        if value is not None:
+            return int(value)
+    return 0
+
+
+def _cached_tokens(usage: Any) -> int:
+    """Cached-input tokens from Responses (`input_tokens_details`) or Chat Completions (`prompt_tokens_details`)."""
+    for name in ("input_tokens_details", "prompt_tokens_details"):
+        details = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+        if details:
+            return _usage_field(details, "cached_tokens")
+    return 0
+
+
+def estimate_cost(model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> float:
+    """Estimate USD cost for one model call; unknown models cost 0."""
+    price = PRICING.get(model)
+    if not price:
+        return 0.0
+    input_price, cached_price, output_price = price
+    uncached = max(input_tokens - cached_tokens, 0)
+    return (uncached * input_price + cached_tokens * cached_price + output_tokens * output_price) / 1_000_000
+
+
+class UsageTotals:
+    """
+    Token usage accumulated over every model call made while serving one request.
+
+    Each agent iteration re-sends the conversation plus all earlier tool outputs, so
+    the input tokens of every round have to be summed, not just the last one.
+    """
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+        self.output_tokens = 0
+        self.iterations = 0
+        self.cost_usd = 0.0
+        self.input_cost_usd = 0.0
+        # Estimated input tokens attributed to each prompt section
+        # ("instructions", "tools", "conversation", "tool:<name>").
+        self.sections: Dict[str, float] = {}
+
+    def add(self, usage: Any, model: str, sections: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """
+        Add one response's usage.
+
+        Args:
+            usage: `usage` from a Responses or Chat Completions response (object or dict)
+            model: Model name the call was billed against
+            sections: Optional character counts of each prompt section sent in this call,
+                used to split the call's input tokens proportionally
+
+        Returns:
+            This call's input_tokens / cached_input_tokens / output_tokens / cost_usd
+        """
+        self.iterations += 1
+        if not usage:
+            return {"input_tokens": 0, "cached_input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+
+        input_tokens = _usage_field(usage, "input_tokens", "prompt_tokens")
+        output_tokens = _usage_field(usage, "output_tokens", "completion_tokens")
+        cached_tokens = _cached_tokens(usage)
+
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.cached_input_tokens += cached_tokens
+        cost = estimate_cost(model, input_tokens, cached_tokens, output_tokens)
+        self.cost_usd += cost
+        self.input_cost_usd += estimate_cost(model, input_tokens, cached_tokens, 0)
+
+        total_chars = sum(sections.values()) if sections else 0
+        if total_chars:
+            for name, chars in sections.items():
+                share = input_tokens * chars / total_chars
+                self.sections[name] = self.sections.get(name, 0.0) + share
+
+        return {
+            "input_tokens": input_tokens,
+            "cached_input_tokens": cached_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": cost,
+        }
+
+    def as_tail_usage(self) -> Dict[str, int]:
+        """Usage block for the `e:` finish frame."""
+        return {
+            "promptTokens": self.input_tokens,
+            "completionTokens": self.output_tokens,
+            "cachedPromptTokens": self.cached_input_tokens,
+        }
+
+
+# ----------------
+# In-process accounting store, aggregated per endpoint and per (endpoint, tool).
+
+_lock = threading.Lock()
+_endpoints: Dict[str, Dict[str, float]] = {}
+_tools: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+
+def _new_endpoint_entry() -> Dict[str, Any]:
+    return {
+        "requests": 0,
+        "iterations": 0,
+        "input_tokens": 0,
+        "cached_input_tokens": 0,
+        "output_tokens": 0,
+        "cost_usd": 0.0,
+        "input_cost_usd": 0.0,
+        "duration_s": 0.0,
+        "sections": {},
+    }
+
+
+def record_request(endpoint: str, totals: UsageTotals, duration_s: float) -> None:
+    """Fold one finished request into the per-endpoint totals."""
+    with _lock:
+        entry = _endpoints.setdefault(endpoint, _new_endpoint_entry())
+        entry["requests"] += 1
+        entry["iterations"] += totals.iterations
+        entry["input_tokens"] += totals.input_tokens
+        entry["cached_input_tokens"] += totals.cached_input_tokens
+        entry["output_tokens"] += totals.output_tokens
+        entry["cost_usd"] += totals.cost_usd
+        entry["input_cost_usd"] += totals.input_cost_usd
+        entry["duration_s"] += duration_s
+        for name, tokens in totals.sections.items():
+            entry["sections"][name] = entry["sections"].get(name, 0.0) + tokens
+
+
+def record_tool_call(endpoint: str, tool_name: str, duration_s: float, output_chars: int) -> None:
+    """Record one tool execution (latency and size of the output fed back to the model)."""
+    with _lock:
+        tools = _tools.setdefault(endpoint, {})
+        entry = tools.setdefault(tool_name, {"calls": 0, "duration_s": 0.0, "output_chars": 0})
+        entry["calls"] += 1
+        entry["duration_s"] += duration_s
+        entry["output_chars"] += output_chars
+    mark("tool", duration_s, name=tool_name, output_chars=output_chars)
+
+
+def usage_snapshot() -> Dict[str, Any]:
+    """
+    Return a JSON-serializable copy of the accounting store.
+
+    Per tool, `input_tokens` / `cost_usd` are the share of upstream input attributed to
+    that tool's outputs being re-sent on later iterations.
+    """
+    with _lock:
+        result: Dict[str, Any] = {}
+        for endpoint in set(_endpoints) | set(_tools):
+            entry = _endpoints.get(endpoint, _new_endpoint_entry())
+            sections = dict(entry["sections"])
+            billable_input = entry["input_tokens"] or 1
+            tools = {}
+            for tool_name, stats in _tools.get(endpoint, {}).items():
+                attributed = sections.get(f"tool:{tool_name}", 0.0)
+                tools[tool_name] = {
+                    **stats,
+                    "avg_duration_s": stats["duration_s"] / stats["calls"] if stats["calls"] else 0.0,
+                    "input_tokens": round(attributed),
+                    "cost_usd": entry["input_cost_usd"] * attributed / billable_input,
+                }
+            result[endpoint] = {
+                **{k: v for k, v in entry.items() if k != "sections"},
+                # Share of input tokens served from the upstream prompt cache
+                "cached_input_ratio": entry["cached_input_tokens"] / entry["input_tokens"] if entry["input_tokens"] else 0.0,
+                "sections": {name: round(tokens) for name, tokens in sections.items()},
+                "tools": tools,
+            }
+        return result
+
+
+def reset_usage() -> None:
+    """Clear the accounting store."""
+    with _lock:
+        _endpoints.clear()
+        _tools.clear()
+
+
+def _item_field(item: Any, name: str) -> Any:
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def prompt_sections(instructions: str, tools_json: str, input_list: List[Any]) -> Dict[str, int]:
+    """
+    Character counts of each section of a Responses request, for `UsageTotals.add`.
+
+    Function call outputs are attributed to the tool that produced them ("tool:<name>"),
+    everything else in `input` counts as "conversation".
+    """
+    sections: Dict[str, int] = {
+        "instructions": len(instructions),
+        "tools": len(tools_json),
+        "conversation": 0,
+    }
+    call_names: Dict[str, str] = {}
+
+    for item in input_list:
+        item_type = _item_field(item, "type")
+        if item_type == "function_call":
+            call_names[_item_field(item, "call_id")] = _item_field(item, "name")
+            sections["conversation"] += len(_item_field(item, "arguments") or "")
+        elif item_type == "function_call_output":
+            key = f"tool:{call_names.get(_item_field(item, 'call_id'), 'unknown')}"
+            sections[key] = sections.get(key, 0) + len(_item_field(item, "output") or "")
+        else:
+            content = _item_field(item, "content")
+            if isinstance(content, str):
+                sections["conversation"] += len(content)
+            elif isinstance(content, list):
+                for part in content:
+                    sections["conversation"] += len(_item_field(part, "text") or "")
+
+    return sections
@@ -1,12 +1,8 @@
-import json
-import os
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 
-PATIENT_RECORDS_PATH = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-    "patient_records.json"
-)
+from . import answer_cache
+from .write_queue import WRITE_TIMEOUT_S, put_record
 
 def write_patient_intake(
     name: str,
@@ -25,6 +21,9 @@ def write_patient_intake(
     """
     Write a new patient intake record to the patient_records.json file.
     This creates an entry under the 'AI_scribes' key.
+
+    The write goes through the shared write queue, which batches concurrent intakes
+    into one atomic commit; this call returns once the record is on disk.
     
     Args:
         name: Patient's full name
@@ -44,14 +43,6 @@ def write_patient_intake(
         Dict with status and patient_id of the created record
     """
     try:
-        # Load existing records
-        with open(PATIENT_RECORDS_PATH, 'r') as f:
-            data = json.load(f)
-        
-        # Ensure AI_scribes key exists
-        if "AI_scribes" not in data:
-            data["AI_scribes"] = {}
-        
         # Create patient ID from name (lowercase, replace spaces with underscores)
         patient_id = name.lower().replace(" ", "_").replace(".", "")
         
@@ -78,12 +69,11 @@ def write_patient_intake(
             "status": "pending_review"
         }
         
-        # Add to AI_scribes
-        data["AI_scribes"][patient_id] = intake_record
-        
-        # Write back to file
-        with open(PATIENT_RECORDS_PATH, 'w') as f:
-            json.dump(data, f, indent=2)
+        # Add to AI_scribes and wait for the batch it lands in to commit
+        put_record(
+            "AI_scribes", patient_id, intake_record,
+            on_commit=lambda: answer_cache.invalidate_patient(patient_id, "AI_scribes"),
+        ).result(timeout=WRITE_TIMEOUT_S)
         
         return {
             "status": "success",
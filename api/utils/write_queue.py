@@ -0,0 +1,188 @@
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .change_feed import publish
+from .metrics import incr, observe, set_gauge
+from .records import invalidate_records, records_path
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: single-process locking only
+    fcntl = None
+
+# Writes arriving within this window of the first pending one are committed together.
+BATCH_WINDOW_MS = float(os.environ.get("WRITE_BATCH_WINDOW_MS", 10))
+BATCH_MAX = int(os.environ.get("WRITE_BATCH_MAX", 256))
+# fsync the new store (and its directory) before reporting a write as committed.
+FSYNC = os.environ.get("WRITE_FSYNC", "1").lower() not in ("0", "false", "no")
+# How long a caller waits for its write to commit.
+WRITE_TIMEOUT_S = float(os.environ.get("WRITE_TIMEOUT", 30))
+
+# A mutation applies one caller's change to the store dict and returns that caller's
+# result. It must validate before modifying anything: if it raises, only its caller
+# fails and the rest of the batch still commits.
+Mutation = Callable[[Dict[str, Any]], Any]
+
+_queue: "queue.Queue[Tuple[Mutation, Future, float, Optional[Callable[[], None]]]]" = queue.Queue()
+_lock = threading.Lock()
+_writer: Optional[threading.Thread] = None
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path: str, data: Dict[str, Any]) -> None:
+    """Write `data` to a temp file next to `path`, fsync it, then rename it over `path`."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".records.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+            if FSYNC:
+                f.flush()
+                os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    if FSYNC:
+        _fsync_dir(path)
+
+
+def _commit(batch: List[Tuple[Mutation, Future, float, Optional[Callable[[], None]]]]) -> None:
+    """Apply a batch of mutations to the store and write it once."""
+    path = records_path()
+    started = time.perf_counter()
+    results: List[Tuple[Future, Any, Optional[BaseException]]] = []
+
+    # The lock file serialises writers across worker processes, not just threads
+    with open(path + ".lock", "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            for mutation, future, _, _ in batch:
+                try:
+                    results.append((future, mutation(data), None))
+                except Exception as e:
+                    results.append((future, None, e))
+            if any(error is None for _, _, error in results):
+                _write_atomic(path, data)
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    invalidate_records()
+    committed = time.perf_counter()
+    observe("write_commit_latency_s", committed - started)
+    observe("write_batch_size", len(batch))
+    incr("write_commits")
+
+    for (_, _, submitted, on_commit), (future, result, error) in zip(batch, results):
+        observe("write_latency_s", committed - submitted)
+        if error is not None:
+            incr("write_errors")
+            future.set_exception(error)
+            continue
+        if on_commit:
+            try:
+                on_commit()
+            except Exception as e:
+                print(f"[WRITE_QUEUE] on_commit hook failed: {e}")
+        future.set_result(result)
+
+
+def _run() -> None:
+    window_s = BATCH_WINDOW_MS / 1000
+    while True:
+        batch = [_queue.get()]
+        deadline = time.monotonic() + window_s
+        while len(batch) < BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(_queue.get(timeout=remaining) if remaining > 0 else _queue.get_nowait())
+            except queue.Empty:
+                break
+        set_gauge("write_queue_depth", _queue.qsize())
+
+        try:
+            _commit(batch)
+        except Exception as e:
+            # The store could not be read or written: nobody in the batch committed
+            print(f"[WRITE_QUEUE] Commit of {len(batch)} writes failed: {e}")
+            incr("write_errors", len(batch))
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+def _ensure_writer() -> None:
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_run, name="records-writer", daemon=True)
+            _writer.start()
+
+
+def submit(mutation: Mutation, on_commit: Optional[Callable[[], None]] = None) -> Future:
+    """
+    Queue a change to the record store for the single writer thread.
+
+    Args:
+        mutation: Applies the change to the store dict and returns the caller's result
+        on_commit: Optional hook run after the batch containing this write is on disk
+
+    Returns:
+        Future resolving to the mutation's result once it is durably committed, or
+        raising the mutation's (or the commit's) exception.
+    """
+    _ensure_writer()
+    future: Future = Future()
+    _queue.put((mutation, future, time.perf_counter(), on_commit))
+    set_gauge("write_queue_depth", _queue.qsize())
+    return future
+
+
+def put_record(section: str, patient_id: str, record: Dict[str, Any],
+               on_commit: Optional[Callable[[], None]] = None) -> Future:
+    """
+    Queue an insert/replace of `record` under `section` / `patient_id`.
+
+    Once committed, the change is published to the change feed before `on_commit` runs.
+    """
+    operation = {}
+
+    def mutation(data: Dict[str, Any]) -> str:
+        entries = data.setdefault(section, {})
+        operation["op"] = "update" if patient_id in entries else "insert"
+        entries[patient_id] = record
+        return patient_id
+
+    def committed() -> None:
+        publish(operation["op"], section, patient_id, record)
+        if on_commit:
+            on_commit()
+
+    return submit(mutation, committed)
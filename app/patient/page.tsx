@@ -22,7 +22,8 @@ export default function PatientChatPage() {
     stop,
   } = useChat({
     api: "/api/patient-chat",
-    maxSteps: 4,
+    // Tool rounds run on the server; its tool frames only report progress
+    maxSteps: 1,
     onError: (error) => {
       if (error.message.includes("Too many requests")) {
         toast.error(
@@ -12,10 +12,17 @@ import { cn } from "@/lib/utils";
 import { motion } from "framer-motion";
 import { PatientsPanel } from "@/components/patients-panel";
 import { PatientDetail } from "@/components/patient-detail";
-import { PatientRecord } from "@/types/patient";
-import patientRecordsData from "@/patient_records.json";
+import {
+  PatientDetailResponse,
+  PatientRecord,
+  PatientSummary,
+  PatientSummaryPage,
+} from "@/types/patient";
 import { useProviderLayout } from "@/components/provider-layout";
 
+const PATIENT_LIST_FIELDS =
+  "id,source,name,age,sex,chief_complaint,status,mrn,timestamp,specialty";
+
 export function Chat() {
   const chatId = "001";
 
@@ -29,7 +36,8 @@ export function Chat() {
     isLoading,
     stop,
   } = useChat({
-    maxSteps: 4,
+    // Tool rounds run on the server; its tool frames only report progress
+    maxSteps: 1,
     onError: (error) => {
       if (error.message.includes("Too many requests")) {
         toast.error(
@@ -53,10 +61,38 @@ export function Chat() {
   const [messagesContainerRef, messagesEndRef] =
     useScrollToBottom<HTMLDivElement>();
 
-  const patientRecords = (patientRecordsData as any).patient_scribes as Record<
-    string,
-    PatientRecord
-  >;
+  const [patients, setPatients] = React.useState<PatientSummary[]>([]);
+  const [patientsTotal, setPatientsTotal] = React.useState(0);
+  const [patientsCursor, setPatientsCursor] = React.useState<string | null>(null);
+  const [patientsLoading, setPatientsLoading] = React.useState(false);
+
+  // Patient summaries are paged from the API (revalidated via ETag by the browser
+  // cache) instead of bundling the whole record store into the client.
+  const loadPatients = React.useCallback(async (cursor: string | null) => {
+    setPatientsLoading(true);
+    try {
+      const params = new URLSearchParams({
+        section: "patient_scribes",
+        limit: "50",
+        fields: PATIENT_LIST_FIELDS,
+      });
+      if (cursor) params.set("cursor", cursor);
+
+      const response = await fetch(`/api/patients?${params}`);
+      if (!response.ok) {
+        throw new Error(`Failed to load patients (${response.status})`);
+      }
+      const page: PatientSummaryPage = await response.json();
+      setPatients((prev) => (cursor ? [...prev, ...page.items] : page.items));
+      setPatientsTotal(page.total);
+      setPatientsCursor(page.next_cursor);
+    } catch (error) {
+      console.error(error);
+      toast.error("Could not load patient records.");
+    } finally {
+      setPatientsLoading(false);
+    }
+  }, []);
 
   const openPanel = React.useCallback(
     (
@@ -72,8 +108,9 @@ export function Chat() {
   );
 
   const handleViewPatients = React.useCallback(() => {
+    loadPatients(null);
     openPanel("patientsList");
-  }, [openPanel]);
+  }, [openPanel, loadPatients]);
 
   // Register the callback with the provider layout context
   const { setOnViewPatients } = useProviderLayout();
@@ -83,10 +120,23 @@ export function Chat() {
     }
   }, [setOnViewPatients, handleViewPatients]);
 
-  const handleSelectPatient = (patientId: string, record: PatientRecord) => {
-    setSelectedPatientId(patientId);
-    setSelectedPatientRecord(record);
-    openPanel("patientDetail");
+  const handleSelectPatient = async (patient: PatientSummary) => {
+    try {
+      const params = new URLSearchParams({ section: patient.source });
+      const response = await fetch(
+        `/api/patients/${encodeURIComponent(patient.id)}?${params}`
+      );
+      if (!response.ok) {
+        throw new Error(`Failed to load patient (${response.status})`);
+      }
+      const detail: PatientDetailResponse = await response.json();
+      setSelectedPatientId(detail.id);
+      setSelectedPatientRecord(detail.record);
+      openPanel("patientDetail");
+    } catch (error) {
+      console.error(error);
+      toast.error("Could not load this patient record.");
+    }
   };
 
   const handleBackToPatients = () => {
@@ -194,7 +244,11 @@ export function Chat() {
           <div className="flex-1 overflow-y-auto">
             {splitScreenMode === "patientsList" && (
               <PatientsPanel
-                records={patientRecords}
+                patients={patients}
+                total={patientsTotal}
+                hasMore={patientsCursor !== null}
+                isLoading={patientsLoading}
+                onLoadMore={() => loadPatients(patientsCursor)}
                 onSelectPatient={handleSelectPatient}
               />
             )}
@@ -36,20 +36,26 @@ export const PreviewMessage = ({
           )}
 
           {message.toolInvocations && message.toolInvocations.length > 0 && (
-            <div className="flex flex-col gap-4">
+            <div className="flex flex-col gap-1">
               {message.toolInvocations.map((toolInvocation) => {
-                const { toolCallId, state } = toolInvocation;
+                const { toolCallId, toolName, state } = toolInvocation;
 
                 if (state === "result") {
                   const { result } = toolInvocation;
 
                   return (
-                    <div key={toolCallId}>
-                      <pre>{JSON.stringify(result, null, 2)}</pre>
+                    <div key={toolCallId} className="text-xs text-muted-foreground">
+                      {toolName}
+                      {result?.status === "error" ? " failed" : ""} ·{" "}
+                      {result?.durationMs} ms · {result?.resultChars} chars
                     </div>
                   );
                 }
-                return null;
+                return (
+                  <div key={toolCallId} className="text-xs text-muted-foreground animate-pulse">
+                    Running {toolName}…
+                  </div>
+                );
               })}
             </div>
           )}
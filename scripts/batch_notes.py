@@ -0,0 +1,52 @@
+"""
+Generate provider notes for a filtered set of intakes (api/utils/batch_notes.py).
+
+Runs in the foreground with bounded concurrency, appending each result to the batch's
+checkpoint file; re-run with --resume <batch id> after an interruption to skip the
+notes already written. `--model local` uses the template stand-in instead of upstream.
+
+Usage:
+    python scripts/batch_notes.py --status pending_review --since 2025-01-01 --concurrency 8
+    python scripts/batch_notes.py --resume <batch id>
+    python scripts/batch_notes.py --model local --out notes.ndjson
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.utils.batch_notes import create_batch, iter_results, load_batch, run_batch  # noqa: E402
+from api.utils.intake_export import intake_filter  # noqa: E402
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-generate provider notes for intakes.")
+    parser.add_argument("--status", default="pending_review", help="Comma-separated statuses (default pending_review)")
+    parser.add_argument("--since", default=None, help="Earliest intake timestamp (ISO date or datetime)")
+    parser.add_argument("--until", default=None, help="Latest intake timestamp (a date includes the whole day)")
+    parser.add_argument("--reason", default=None, help="Comma-separated reason_for_visit values")
+    parser.add_argument("--model", default=None, help="Model name, or 'local' for the stand-in (default BATCH_NOTES_MODEL)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Notes generated at once (default BATCH_NOTES_CONCURRENCY)")
+    parser.add_argument("--resume", default=None, metavar="BATCH_ID", help="Resume an earlier batch")
+    parser.add_argument("--out", default=None, help="Also write the results as NDJSON here")
+    args = parser.parse_args()
+
+    if args.resume:
+        if load_batch(args.resume) is None:
+            sys.exit(f"No batch {args.resume}")
+        batch_id = args.resume
+    else:
+        filters = intake_filter(args.status, args.since, args.until, args.reason)
+        batch_id = create_batch(filters, args.model, args.concurrency)["id"]
+        print(f"Batch {batch_id}")
+
+    batch = run_batch(batch_id)
+    if batch is None:
+        sys.exit(f"Batch {batch_id} is already running")
+    print(f"{batch['status']}: {batch['matched']} matched, {batch['done']} notes "
+          f"({batch['skipped']} from checkpoint), {batch['errors']} errors")
+    if args.out:
+        with open(args.out, "w") as f:
+            f.writelines(iter_results(batch_id))
+        print(f"Wrote {args.out}")
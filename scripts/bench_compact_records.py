@@ -0,0 +1,82 @@
+"""
+Benchmark memory and access cost of the compact record model against plain dicts.
+
+Each mode loads the store in a fresh interpreter (COMPACT_RECORDS=0 / 1) and reports:
+    - load_s:      load_records() on a cold process
+    - store_mb:    resident memory added by the loaded store (RSS after gc, Linux)
+    - get_ms:      one record read from the section (materialised on first access when compact)
+    - cached_ms:   the same record read again
+    - scan_s:      every record read once (what the directory / summary card rebuilds do)
+
+Usage:
+    python scripts/bench_compact_records.py --sizes 10000,100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from generate_patient_corpus import write_corpus  # noqa: E402
+
+PROBE = r"""
+import gc, json, time
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096 / 1e6
+
+gc.collect()
+base = rss_mb()
+from api.utils.records import load_records
+t0 = time.perf_counter()
+data = load_records()
+t1 = time.perf_counter()
+gc.collect()
+store_mb = rss_mb() - base
+
+section = data["patient_scribes"]
+ids = list(section)
+pid = ids[len(ids) // 2]
+t2 = time.perf_counter()
+section[pid]
+t3 = time.perf_counter()
+section[pid]
+t4 = time.perf_counter()
+for record in section.values():
+    record.get("patient")
+t5 = time.perf_counter()
+print(json.dumps({"load_s": t1 - t0, "store_mb": store_mb, "get_ms": (t3 - t2) * 1000,
+                  "cached_ms": (t4 - t3) * 1000, "scan_s": t5 - t4}))
+"""
+
+
+def run_mode(path: str, compact: bool) -> dict:
+    env = dict(os.environ, PATIENT_RECORDS_PATH=path, COMPACT_RECORDS="1" if compact else "0",
+               PYTHONPATH=PROJECT_ROOT)
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=PROJECT_ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the compact record model.")
+    parser.add_argument("--sizes", default="10000", help="Comma-separated corpus sizes (default 10000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="Where to keep generated corpora (default: temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="patient_corpus_")
+    print(f"{'records':>9} {'mode':>8} {'load s':>7} {'store MB':>9} {'get ms':>8} {'cached ms':>10} {'scan s':>7}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        path = os.path.join(workdir, f"corpus_{size}.json")
+        if not os.path.exists(path):
+            write_corpus(path, size, args.seed)
+        for compact in (False, True):
+            r = run_mode(path, compact)
+            print(f"{size:>9} {'compact' if compact else 'dict':>8} {r['load_s']:>7.2f} {r['store_mb']:>9.1f} "
+                  f"{r['get_ms']:>8.3f} {r['cached_ms']:>10.4f} {r['scan_s']:>7.2f}")
@@ -0,0 +1,83 @@
+"""
+Benchmark the patient record data path against synthetic corpora of growing size.
+
+For each size a corpus is generated with generate_patient_corpus.py, pointed at via
+PATIENT_RECORDS_PATH, and the following are measured:
+    - _load_patient_records() wall time and peak traced memory
+    - get_patient_names() / get_patient_info() latency
+    - write_patient_intake() latency (one queued commit of the whole store)
+
+Usage:
+    python scripts/bench_data_path.py --sizes 10000,100000 --seed 42
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# get_patient_info builds an OpenAI client at import; no request is made here.
+os.environ.setdefault("OPENAI_API_KEY", "unused-by-benchmark")
+
+from generate_patient_corpus import generate_encounter, write_corpus  # noqa: E402
+
+
+def _median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench_size(records: int, seed: int, repeat: int, workdir: str) -> dict:
+    path = os.path.join(workdir, f"corpus_{records}.json")
+    if not os.path.exists(path):
+        write_corpus(path, records, seed)
+    os.environ["PATIENT_RECORDS_PATH"] = path
+
+    from api.utils import get_patient_info as gpi
+    from api.utils import write_patient_record as wpr
+
+    tracemalloc.start()
+    gpi._load_patient_records()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sample_id, _ = generate_encounter(seed, records // 2)
+    result = {
+        "records": records,
+        "file_mb": os.path.getsize(path) / 1e6,
+        "load_ms": _median_ms(gpi._load_patient_records, repeat),
+        "peak_mb": peak / 1e6,
+        "names_ms": _median_ms(gpi.get_patient_names, repeat),
+        "info_ms": _median_ms(lambda: gpi.get_patient_info(sample_id), repeat),
+        "intake_ms": _median_ms(
+            lambda: wpr.write_patient_intake(
+                name="Bench Patient", age=40, sex="F", chief_complaint="Benchmark",
+                symptoms=["none"], conversation_summary="", ai_assessment="", reason_for_visit="general_inquiry",
+            ),
+            repeat,
+        ),
+    }
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark patient record loading at scale.")
+    parser.add_argument("--sizes", default="10000", help="Comma-separated corpus sizes (default 10000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per measurement (median reported)")
+    parser.add_argument("--workdir", default=None, help="Where to keep generated corpora (default: temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="patient_corpus_")
+    print(f"{'records':>9} {'file MB':>8} {'load ms':>9} {'peak MB':>8} {'names ms':>9} {'info ms':>9} {'intake ms':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        r = bench_size(size, args.seed, args.repeat, workdir)
+        print(f"{r['records']:>9} {r['file_mb']:>8.1f} {r['load_ms']:>9.1f} {r['peak_mb']:>8.1f} "
+              f"{r['names_ms']:>9.1f} {r['info_ms']:>9.1f} {r['intake_ms']:>10.1f}")
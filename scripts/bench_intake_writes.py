@@ -0,0 +1,91 @@
+"""
+Benchmark concurrent write_patient_intake() calls through the group-commit write queue.
+
+N threads each submit intakes at the same moment (as concurrent patient chats finishing
+together would). For each batching window the script reports throughput, per-call
+latency and how many commits the writes were folded into, then checks every intake
+made it to disk.
+
+Usage:
+    python scripts/bench_intake_writes.py --records 10000 --writers 32 --windows 0,10,50
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_patient_corpus import write_corpus  # noqa: E402
+
+
+def bench_window(path: str, writers: int, per_writer: int, window_ms: float) -> dict:
+    from api.utils import write_queue
+    from api.utils.metrics import metrics_snapshot, reset_metrics
+    from api.utils.write_patient_record import write_patient_intake
+
+    write_queue.BATCH_WINDOW_MS = window_ms
+    reset_metrics()
+    latencies = []
+    failures = []
+    barrier = threading.Barrier(writers)
+
+    def worker(w: int):
+        barrier.wait()
+        for i in range(per_writer):
+            start = time.perf_counter()
+            result = write_patient_intake(
+                name=f"Bench W{window_ms:g} {w} {i}", age=40, sex="F", chief_complaint="Benchmark",
+                symptoms=["none"], reason_for_visit="general_inquiry",
+            )
+            latencies.append(time.perf_counter() - start)
+            if result["status"] != "success":
+                failures.append(result["message"])
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    with open(path) as f:
+        stored = json.load(f)["AI_scribes"]
+    expected = {f"bench_w{window_ms:g}_{w}_{i}" for w in range(writers) for i in range(per_writer)}
+    commits = metrics_snapshot()["counters"].get("write_commits", 0)
+    return {
+        "window_ms": window_ms,
+        "writes": len(latencies),
+        "writes_per_s": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "commits": commits,
+        "missing": len(expected - set(stored)),
+        "failures": len(failures),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent intake writes.")
+    parser.add_argument("--records", type=int, default=10000, help="Encounters in the generated store")
+    parser.add_argument("--writers", type=int, default=32, help="Concurrent writer threads")
+    parser.add_argument("--per-writer", type=int, default=2, help="Intakes written by each thread")
+    parser.add_argument("--windows", default="0,10,50", help="Comma-separated batching windows in ms")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="intake_bench_")
+    path = os.path.join(workdir, "patient_records.json")
+    write_corpus(path, args.records, args.seed)
+    os.environ["PATIENT_RECORDS_PATH"] = path
+
+    print(f"{'window ms':>9} {'writes':>7} {'writes/s':>9} {'p50 ms':>8} {'max ms':>8} {'commits':>8} {'missing':>8}")
+    for window in (float(w) for w in args.windows.split(",")):
+        r = bench_window(path, args.writers, args.per_writer, window)
+        print(f"{r['window_ms']:>9g} {r['writes']:>7} {r['writes_per_s']:>9.1f} {r['p50_ms']:>8.1f} "
+              f"{r['max_ms']:>8.1f} {r['commits']:>8} {r['missing']:>8}")
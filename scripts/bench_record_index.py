@@ -0,0 +1,126 @@
+"""
+Benchmark single-record reads through the byte-offset index against full store loads.
+
+For each corpus size:
+    - cold _load_patient_records() (parse the whole store) vs cold index build
+    - get_patient_info()-style single record read: cached full store vs mmap + slice
+    - re-index after one intake write: incremental update vs full rebuild
+
+Before benchmarking, checks that non-ASCII patient IDs (escaped or raw UTF-8) and
+duplicated keys read back the same as json.load in every store layout.
+
+Usage:
+    python scripts/bench_record_index.py --sizes 10000,100000 --seed 42
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_patient_corpus import generate_encounter, write_corpus  # noqa: E402
+
+
+def _median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def check_keys(workdir: str) -> None:
+    """Index reads must match json.load for non-ASCII and duplicated keys."""
+    from api.utils.record_index import RecordIndex
+
+    base = {"patient_scribes": {"emily_chen": {"v": 1}, "jos\u00e9_garc\u00eda": {"v": 2}}, "AI_scribes": {}}
+    for indent in (None, 2):
+        for ensure_ascii in (True, False):
+            path = os.path.join(workdir, f"keys_{indent}_{ensure_ascii}.json")
+            text = json.dumps(base, indent=indent, ensure_ascii=ensure_ascii)
+            # A second "emily_chen" member; json.load keeps the last value
+            separator = "\n    " if indent else " "
+            text = text.replace('"emily_chen"', '"emily_chen": {"v": 0},' + separator + '"emily_chen"', 1)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            expected = json.loads(text)["patient_scribes"]
+            index = RecordIndex(path)
+            assert index.ids("patient_scribes") == list(expected), (path, index.ids("patient_scribes"))
+            for pid, record in expected.items():
+                assert index.get("patient_scribes", pid) == record, (path, pid)
+
+            # Incremental update after rewriting the non-ASCII entry
+            expected["jos\u00e9_garc\u00eda"] = {"v": 3}
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({**base, "patient_scribes": expected}, f, indent=indent, ensure_ascii=ensure_ascii)
+            assert index.get("patient_scribes", "jos\u00e9_garc\u00eda") == {"v": 3}, path
+    print("non-ASCII and duplicate key checks passed")
+
+
+def bench_size(records: int, seed: int, repeat: int, workdir: str) -> dict:
+    path = os.path.join(workdir, f"corpus_{records}.json")
+    if not os.path.exists(path):
+        write_corpus(path, records, seed)
+    os.environ["PATIENT_RECORDS_PATH"] = path
+
+    from api.utils import get_patient_info as gpi
+    from api.utils import records as record_store
+    from api.utils.record_index import RecordIndex
+    from api.utils.write_patient_record import write_patient_intake
+
+    sample_id, _ = generate_encounter(seed, records // 2)
+
+    def cold_full():
+        record_store.invalidate_records()
+        gpi._load_patient_records()
+
+    def cold_index():
+        RecordIndex(path).get("patient_scribes", sample_id)
+
+    index = RecordIndex(path)
+    index.get("patient_scribes", sample_id)
+    gpi._load_patient_records()
+
+    result = {
+        "records": records,
+        "file_mb": os.path.getsize(path) / 1e6,
+        "full_load_ms": _median_ms(cold_full, repeat),
+        "index_build_ms": _median_ms(cold_index, repeat),
+        "cached_get_ms": _median_ms(lambda: gpi._load_patient_records().get(sample_id), repeat * 100),
+        "index_get_ms": _median_ms(lambda: index.get("patient_scribes", sample_id), repeat * 100),
+    }
+
+    incremental = []
+    for i in range(repeat):
+        write_patient_intake(
+            name=f"Index Bench {i}", age=40, sex="F", chief_complaint="Benchmark",
+            symptoms=["none"], reason_for_visit="general_inquiry",
+        )
+        start = time.perf_counter()
+        assert index.get("AI_scribes", f"index_bench_{i}") is not None
+        incremental.append((time.perf_counter() - start) * 1000)
+    result["incremental_ms"] = statistics.median(incremental)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the byte-offset record index.")
+    parser.add_argument("--sizes", default="10000", help="Comma-separated corpus sizes (default 10000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per measurement (median reported)")
+    parser.add_argument("--workdir", default=None, help="Where to keep generated corpora (default: temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="patient_corpus_")
+    check_keys(workdir)
+    print(f"{'records':>9} {'file MB':>8} {'full load ms':>13} {'index build ms':>15} "
+          f"{'cached get ms':>14} {'index get ms':>13} {'incremental ms':>15}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        r = bench_size(size, args.seed, args.repeat, workdir)
+        print(f"{r['records']:>9} {r['file_mb']:>8.1f} {r['full_load_ms']:>13.1f} {r['index_build_ms']:>15.1f} "
+              f"{r['cached_get_ms']:>14.4f} {r['index_get_ms']:>13.3f} {r['incremental_ms']:>15.1f}")
@@ -0,0 +1,107 @@
+"""
+Benchmark per-worker memory with and without the shared record snapshot.
+
+N worker processes run side by side (like uvicorn/gunicorn workers) and serve the
+same reads: the patient name list, then get_patient_info() and search_transcript()
+for a sample of patients. Once every worker is done, each reports its memory from
+/proc/self/smaps_rollup (Linux only):
+    - rss:     resident pages, shared ones counted in full by every worker
+    - pss:     resident pages with shared ones split between the processes mapping them
+    - private: pages only this worker uses
+
+Modes:
+    - json:   shared snapshot disabled; each worker parses the store itself
+    - shared: each worker maps the prebuilt shared snapshot
+
+Usage:
+    python scripts/bench_shared_snapshot.py --records 10000 --workers 4
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from generate_patient_corpus import write_corpus  # noqa: E402
+
+WORKER = r"""
+import json, sys, time
+from api.utils.get_patient_info import get_patient_info, get_patient_names, search_transcript
+
+def memory_mb():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "private": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+started = time.perf_counter()
+names = get_patient_names()
+for entry in names[::max(1, len(names) // SAMPLE)]:
+    get_patient_info(entry["patient_id"])
+    search_transcript(entry["patient_id"], query="chest pain")
+elapsed = time.perf_counter() - started
+print("ready", flush=True)
+sys.stdin.readline()
+print(json.dumps(dict(memory_mb(), elapsed_s=elapsed)), flush=True)
+"""
+
+
+def run_workers(mode: str, workers: int, sample: int, env: dict) -> list:
+    env = dict(env, SHARED_SNAPSHOT="1" if mode == "shared" else "0", SHARED_SNAPSHOT_AUTOBUILD="0")
+    code = WORKER.replace("SAMPLE", str(sample))
+    procs = [
+        subprocess.Popen([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env, text=True,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        for _ in range(workers)
+    ]
+    # Measure only once every worker holds its data, so shared pages are split between all of them
+    for proc in procs:
+        assert proc.stdout.readline().strip() == "ready"
+    results = []
+    for proc in procs:
+        proc.stdin.write("go\n")
+        proc.stdin.flush()
+        results.append(json.loads(proc.stdout.readline()))
+        proc.stdin.close()
+    for proc in procs:
+        proc.wait()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-worker memory with the shared record snapshot.")
+    parser.add_argument("--records", type=int, default=10000, help="Encounters in the generated store")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sample", type=int, default=200, help="Patients read by each worker")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="shared_snapshot_bench_")
+    path = os.path.join(workdir, "patient_records.json")
+    write_corpus(path, args.records, args.seed)
+    env = dict(os.environ, PATIENT_RECORDS_PATH=path, PYTHONPATH=PROJECT_ROOT)
+
+    from api.utils.shared_snapshot import build_shared_snapshot
+    started = time.perf_counter()
+    snap = build_shared_snapshot(path)
+    print(f"store {os.path.getsize(path) / 1e6:.1f} MB, shared snapshot {os.path.getsize(snap) / 1e6:.1f} MB "
+          f"built in {time.perf_counter() - started:.1f}s\n")
+
+    print(f"{'mode':>7} {'workers':>8} {'rss MB':>8} {'pss MB':>8} {'private MB':>11} {'total pss MB':>13} {'reads s':>8}")
+    for mode in ("json", "shared"):
+        results = run_workers(mode, args.workers, args.sample, env)
+        print(f"{mode:>7} {args.workers:>8} {statistics.median(r['rss'] for r in results):>8.1f} "
+              f"{statistics.median(r['pss'] for r in results):>8.1f} "
+              f"{statistics.median(r['private'] for r in results):>11.1f} "
+              f"{sum(r['pss'] for r in results):>13.1f} "
+              f"{statistics.median(r['elapsed_s'] for r in results):>8.2f}")
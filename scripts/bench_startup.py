@@ -0,0 +1,87 @@
+"""
+Cold-start benchmark for the serverless API entry point.
+
+Each measurement runs in a fresh interpreter, like a Vercel cold start:
+    - import:        `import api.index`
+    - first_request: first request through the ASGI app (GET /api/usage)
+    - chat_import:   deferred import paid by the first /api/chat request
+    - records_json / records_snapshot: first load of the record store, without and
+      with the precomputed snapshot (scripts/build_record_snapshot.py)
+
+Usage:
+    python scripts/bench_startup.py [--runs 5] [--records patient_records.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import api.index
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(api.index.app)
+t2 = time.perf_counter()
+client.get("/api/usage")
+t3 = time.perf_counter()
+import api.orchestrator
+t4 = time.perf_counter()
+from api.utils.records import load_records
+load_records()
+t5 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "first_request": t3 - t2, "chat_import": t4 - t3, "records": t5 - t4}))
+"""
+
+
+def _run_probe(env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=PROJECT_ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _median_ms(samples, key: str) -> float:
+    return statistics.median(s[key] for s in samples) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure API cold-start latency.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per configuration")
+    parser.add_argument("--records", default=None, help="Record store to load (default: bundled patient_records.json)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, PROJECT_ROOT)
+    from api.utils.records import build_snapshot, records_path
+
+    base_env = dict(os.environ)
+    if args.records:
+        base_env["PATIENT_RECORDS_PATH"] = os.path.abspath(args.records)
+    path = base_env.get("PATIENT_RECORDS_PATH") or records_path()
+
+    snap_dir = tempfile.mkdtemp(prefix="records_snapshot_")
+    snap_path = build_snapshot(path, os.path.join(snap_dir, "records.snapshot"))
+
+    without_snapshot = dict(base_env, PATIENT_RECORDS_SNAPSHOT=os.path.join(snap_dir, "missing"))
+    with_snapshot = dict(base_env, PATIENT_RECORDS_SNAPSHOT=snap_path)
+
+    json_runs = [_run_probe(without_snapshot) for _ in range(args.runs)]
+    snap_runs = [_run_probe(with_snapshot) for _ in range(args.runs)]
+
+    print(f"record store: {path} ({os.path.getsize(path) / 1e6:.1f} MB), {args.runs} runs, median ms")
+    rows = [
+        ("import api.index", _median_ms(json_runs, "import")),
+        ("first request", _median_ms(json_runs, "first_request")),
+        ("/api/chat deferred import", _median_ms(json_runs, "chat_import")),
+        ("first records load, json", _median_ms(json_runs, "records")),
+        ("first records load, snapshot", _median_ms(snap_runs, "records")),
+    ]
+    for label, value in rows:
+        print(f"  {label:<30} {value:8.1f}")
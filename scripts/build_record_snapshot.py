@@ -0,0 +1,33 @@
+"""
+Precompute the record store snapshot loaded on demand by api/utils/records.py.
+
+Run this as part of deployment (with the same Python version as the API) after
+patient_records.json changes; a stale or missing snapshot just falls back to JSON.
+`--shared` also builds the memory-mapped snapshot read by every worker
+(api/utils/shared_snapshot.py), so the first requests don't wait for a worker to build it.
+
+Usage:
+    python scripts/build_record_snapshot.py [--records patient_records.json] [--out path] [--shared]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.utils.records import build_snapshot, records_path  # noqa: E402
+from api.utils.shared_snapshot import build_shared_snapshot  # noqa: E402
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the record store snapshot.")
+    parser.add_argument("--records", default=None, help="Record store JSON (default: PATIENT_RECORDS_PATH or bundled file)")
+    parser.add_argument("--out", default=None, help="Snapshot path (default: <records>.snapshot)")
+    parser.add_argument("--shared", action="store_true", help="Also build the shared snapshot (<records>.shared)")
+    args = parser.parse_args()
+
+    out = build_snapshot(args.records or records_path(), args.out)
+    print(f"Wrote snapshot {out} ({os.path.getsize(out) / 1e6:.1f} MB)")
+    if args.shared:
+        out = build_shared_snapshot(args.records or records_path())
+        print(f"Wrote shared snapshot {out} ({os.path.getsize(out) / 1e6:.1f} MB)")
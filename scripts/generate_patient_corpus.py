@@ -0,0 +1,342 @@
+"""
+Deterministic synthetic patient corpus for scaling tests.
+
+Produces a file with the same layout as patient_records.json (`AI_scribes` intakes
+and `patient_scribes` encounters) at 10k-1M records, so load time, memory and query
+latency of the data path can be measured as the corpus grows.
+
+Every record is generated from its own RNG seeded with "<seed>:<index>", so a given
+(seed, index) always yields the same record regardless of corpus size, and records
+are streamed to disk one at a time instead of building the whole corpus in memory.
+
+Usage:
+    python scripts/generate_patient_corpus.py --records 10000 --seed 42 --out /tmp/corpus.json
+"""
+import argparse
+import json
+import math
+import random
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+FIRST_NAMES_F = [
+    "Emily", "Rebecca", "Jessica", "Maria", "Aisha", "Olivia", "Sophia", "Grace", "Hannah", "Chloe",
+    "Priya", "Mei", "Fatima", "Ana", "Laura", "Rachel", "Nicole", "Samantha", "Yuki", "Isabel",
+]
+FIRST_NAMES_M = [
+    "Jordan", "Michael", "James", "David", "Carlos", "Ahmed", "Daniel", "Kevin", "Ethan", "Lucas",
+    "Raj", "Wei", "Omar", "Luis", "Brian", "Thomas", "Andre", "Samuel", "Kenji", "Noah",
+]
+LAST_NAMES = [
+    "Carter", "Martinez", "Chen", "Brown", "Lee", "Smith", "Johnson", "Garcia", "Nguyen", "Patel",
+    "Kim", "Lopez", "Williams", "Davis", "Rodriguez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore",
+    "Jackson", "White", "Harris", "Clark", "Lewis", "Walker", "Hall", "Young", "Allen", "Wright",
+]
+
+# (location, specialty, provider names)
+CLINICS = [
+    ("Family Medicine, Mission Clinic", "Family Medicine", ["Andrew Lin, MD", "Karen Obi, MD", "Paul Reyes, DO"]),
+    ("Internal Medicine, Mission Clinic", "Internal Medicine", ["Dr. James Morrison, MD", "Dr. Sarah Thompson, MD"]),
+    ("Orthopedics, Mission Clinic", "Orthopedic Surgery", ["Sarah Martinez, MD", "Victor Hale, MD"]),
+    ("Behavioral Health, Bayview Center", "Psychiatry", ["Nina Patel, MD"]),
+    ("Pediatrics, Bayview Center", "Pediatrics", ["Lisa Grant, MD", "Omar Siddiqui, MD"]),
+]
+
+# Primary-care problem list weighted roughly by outpatient prevalence.
+# (problem, icd10, weight, chief complaint, symptoms, medications started, orders)
+CONDITIONS = [
+    ("Essential hypertension", "I10", 20, "Elevated blood pressure readings at home",
+     ["headache", "occasional dizziness"], ["amlodipine 5 mg PO QD", "losartan 50 mg PO QD"], ["Basic Metabolic Panel"]),
+    ("Type 2 diabetes mellitus without complications", "E11.9", 14, "Follow-up for blood sugar control",
+     ["increased thirst", "frequent urination", "fatigue"], ["metformin 1000 mg PO BID", "empagliflozin 10 mg PO QD"], ["Hemoglobin A1c"]),
+    ("Hyperlipidemia", "E78.5", 12, "Review of cholesterol results",
+     [], ["atorvastatin 20 mg PO QHS"], ["Lipid panel"]),
+    ("Acute upper respiratory infection", "J06.9", 10, "Sore throat and congestion for 4 days",
+     ["sore throat", "nasal congestion", "mild cough"], ["fluticasone nasal spray 2 sprays QD"], []),
+    ("Subacute cough", "R05.2", 6, "Cough for ~3 weeks, worse at night",
+     ["dry cough", "night-time cough", "mild dyspnea on exertion"], ["benzonatate 100 mg PO TID PRN cough"], ["Chest X-ray"]),
+    ("Low back pain", "M54.50", 8, "Lower back pain after lifting",
+     ["lower back pain", "stiffness in the morning"], ["naproxen 500 mg PO BID x 7 days", "cyclobenzaprine 5 mg PO QHS PRN"], []),
+    ("Generalized anxiety disorder", "F41.1", 7, "Feeling anxious and unable to relax",
+     ["worry", "poor sleep", "restlessness"], ["sertraline 50 mg PO QD"], ["PHQ-9 and GAD-7 screening"]),
+    ("Major depressive disorder, single episode", "F32.9", 6, "Low mood for several months",
+     ["low mood", "loss of interest", "fatigue"], ["escitalopram 10 mg PO QD"], ["PHQ-9 screening", "TSH"]),
+    ("Gastroesophageal reflux disease", "K21.9", 6, "Heartburn after meals",
+     ["heartburn", "sour taste at night"], ["famotidine 20 mg PO BID x 4 weeks", "omeprazole 20 mg PO QD"], []),
+    ("Urinary tract infection", "N39.0", 5, "Burning with urination for 2 days",
+     ["dysuria", "urinary frequency"], ["nitrofurantoin 100 mg PO BID x 5 days"], ["Urinalysis", "Urine culture"]),
+    ("Obesity", "E66.9", 5, "Weight management discussion",
+     ["weight gain", "low energy"], [], ["Lipid panel", "Hemoglobin A1c"]),
+    ("Asthma, unspecified", "J45.909", 4, "Wheezing and chest tightness with exercise",
+     ["wheezing", "chest tightness", "shortness of breath"], ["albuterol HFA 2 puffs q6h PRN wheeze"], ["Spirometry"]),
+    ("Migraine, unspecified", "G43.909", 4, "Recurring headaches with light sensitivity",
+     ["throbbing headache", "light sensitivity", "nausea"], ["sumatriptan 50 mg PO PRN migraine"], []),
+    ("Primary osteoarthritis, right knee", "M17.11", 4, "Right knee pain and stiffness",
+     ["knee pain", "stiffness", "swelling after activity"], ["meloxicam 7.5 mg PO QD x 2 weeks"], ["X-ray right knee"]),
+    ("Hypothyroidism, unspecified", "E03.9", 3, "Fatigue and feeling cold",
+     ["fatigue", "cold intolerance", "dry skin"], ["levothyroxine 50 mcg PO QD"], ["TSH", "Free T4"]),
+    ("Fever, unspecified", "R50.9", 2, "Fever and chills for several days",
+     ["fever", "chills", "body aches"], ["acetaminophen 650 mg PO q6h PRN fever"], ["CBC with differential", "Blood cultures"]),
+]
+CONDITION_WEIGHTS = [c[2] for c in CONDITIONS]
+
+ALLERGIES = ["No known drug allergies"] * 6 + ["Penicillin (rash)", "Sulfa drugs (hives)", "Shellfish", "Latex", "Codeine (nausea)"]
+OCCUPATIONS = ["Sales", "Teacher", "Nurse", "Software engineer", "Student", "Retired", "Construction worker", "Chef", "Accountant", "Driver"]
+TOBACCO = ["Never"] * 6 + ["Former smoker, quit 10 years ago", "Current, 1/2 pack per day"]
+ALCOHOL = ["None", "Social drinker", "1–2 drinks/week", "2–3 drinks/week", "Daily, 1–2 drinks"]
+EXERCISE = ["Walking (recently decreased)", "Regular (yoga, hiking)", "Gym 3x/week", "Sedentary", "Cycling on weekends"]
+HOME_SUPPORT = ["Lives alone; no dependents", "Lives with spouse", "Lives with parents", "Lives with spouse and children"]
+FAMILY_HISTORY = ["Father CAD (MI at 62)", "Mother type 2 diabetes", "Sister breast cancer", "Father hypertension", "Mother depression", "No significant family history"]
+REASONS_FOR_VISIT = ["symptom_inquiry", "scheduling_appointment", "medication_question", "general_inquiry"]
+INTAKE_STATUS = ["pending_review"] * 8 + ["reviewed", "scheduled"]
+FOLLOW_UPS = [("Tele-visit", "in 2 weeks"), ("In-person", "in 4 weeks"), ("In-person", "in 3 months"), ("Phone call", "in 1 week")]
+
+PROVIDER_LINES = [
+    "What brings you in today?",
+    "How long has this been going on?",
+    "Does anything make it better or worse?",
+    "Are you taking any medications for it?",
+    "Any fever, chest pain or shortness of breath?",
+    "Have you noticed any other symptoms?",
+    "How is this affecting your sleep and work?",
+    "Any allergies to medications?",
+    "Does anyone in your family have similar problems?",
+    "Let's go over the plan together.",
+]
+PATIENT_LINES = [
+    "I've been dealing with {symptom} for about {duration}.",
+    "It's mostly the {symptom}, and it gets worse at night.",
+    "I tried over-the-counter medicine but it only helped a little.",
+    "No, nothing like that.",
+    "It's making it hard to focus at work.",
+    "I'm taking {medication} right now.",
+    "My {relative} had something similar.",
+    "That sounds good to me.",
+]
+DURATIONS = ["two days", "a week", "three weeks", "a month", "several months"]
+RELATIVES = ["mother", "father", "sister", "brother"]
+
+
+def _weighted_age(rng: random.Random) -> int:
+    """Outpatient age mix: mostly adults, peak in the 50s-60s, ~10% pediatric."""
+    if rng.random() < 0.1:
+        return rng.randint(1, 17)
+    return int(min(max(rng.gauss(52, 17), 18), 95))
+
+
+def _problem_count(rng: random.Random) -> int:
+    """Geometric-ish number of problems per encounter (1-5, mean ~2)."""
+    return min(1 + int(rng.expovariate(1.0)), 5)
+
+
+def _transcript_length(rng: random.Random) -> int:
+    """Log-normal segment count: median ~28 segments with a long tail of long visits."""
+    return int(min(max(rng.lognormvariate(math.log(28), 0.6), 4), 400))
+
+
+def _fmt_t(seconds: int) -> str:
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def _name(rng: random.Random) -> Tuple[str, str, str]:
+    sex = "F" if rng.random() < 0.52 else "M"
+    first = rng.choice(FIRST_NAMES_F if sex == "F" else FIRST_NAMES_M)
+    last = rng.choice(LAST_NAMES)
+    return first, last, sex
+
+
+def _transcript(rng: random.Random, first: str, problems: List[tuple], meds: List[str]) -> List[Dict[str, str]]:
+    segments = []
+    seconds = 0
+    symptoms = [s for p in problems for s in p[4]] or ["some discomfort"]
+    for i in range(_transcript_length(rng)):
+        if i % 2 == 0:
+            speaker = "Provider"
+            text = PROVIDER_LINES[0].replace("today", f"today, {first}") if i == 0 else rng.choice(PROVIDER_LINES)
+        else:
+            speaker = "Patient"
+            text = rng.choice(PATIENT_LINES).format(
+                symptom=rng.choice(symptoms),
+                duration=rng.choice(DURATIONS),
+                medication=rng.choice(meds) if meds else "nothing",
+                relative=rng.choice(RELATIVES),
+            )
+        segments.append({"t": _fmt_t(seconds), "speaker": speaker, "text": text})
+        seconds += rng.randint(2, 30)
+    return segments
+
+
+def generate_encounter(seed: int, index: int) -> Tuple[str, Dict[str, Any]]:
+    """Generate one `patient_scribes` encounter; returns (patient_id, record)."""
+    rng = random.Random(f"{seed}:{index}")
+    first, last, sex = _name(rng)
+    age = _weighted_age(rng)
+    visit = datetime(2024, 1, 1, 8, 0) + timedelta(days=rng.randint(0, 700), minutes=rng.randint(0, 540))
+    dob = date(visit.year - age, rng.randint(1, 12), rng.randint(1, 28))
+
+    clinic = CLINICS[4] if age < 18 else rng.choice(CLINICS[:4])
+    location, specialty, providers = clinic
+
+    problems = []
+    for condition in rng.choices(CONDITIONS, weights=CONDITION_WEIGHTS, k=_problem_count(rng)):
+        if condition not in problems:
+            problems.append(condition)
+    primary = problems[0]
+
+    prior_meds = [m for p in problems[1:] for m in p[5][:1]]
+    new_meds = list(primary[5][: rng.randint(0, len(primary[5]))])
+    medication_changes = [{"start": m} for m in new_meds] + [{"continue": m} for m in prior_meds]
+
+    patient_id = f"{first.lower()}_{last.lower()}_{index:07d}"
+    record = {
+        "encounter_id": f"ENC-{visit:%Y-%m-%d}-{index:07d}",
+        "timestamp": visit.isoformat() + "-07:00",
+        "location": location,
+        "provider": {"name": rng.choice(providers), "specialty": specialty},
+        "patient": {
+            "mrn": f"{first[0]}{last[0]}-{rng.randint(0, 999999):06d}",
+            "name": f"{first} {last}",
+            "dob": dob.isoformat(),
+            "age": age,
+            "sex": sex,
+        },
+        "chief_complaint": primary[3] + ".",
+        "vitals": {
+            "bp": f"{int(rng.gauss(128, 16))}/{int(rng.gauss(80, 10))}",
+            "hr_bpm": int(rng.gauss(78, 12)),
+            "rr_bpm": rng.randint(12, 20),
+            "temp_f": round(rng.gauss(98.6, 0.7), 1),
+            "spo2_pct": rng.randint(93, 100),
+            "bmi": round(rng.gauss(28, 5), 1),
+        },
+        "history": {
+            "hpi": f"{age}-year-old {'woman' if sex == 'F' else 'man'} presenting with {', '.join(primary[4]) or primary[3].lower()}.",
+            "pmh": [p[0] for p in problems[1:]],
+            "medications_prior_to_visit": prior_meds,
+            "allergies": [rng.choice(ALLERGIES)],
+            "social_history": {
+                "occupation": "Student" if age < 18 else rng.choice(OCCUPATIONS),
+                "tobacco": "Never" if age < 18 else rng.choice(TOBACCO),
+                "alcohol": "None" if age < 21 else rng.choice(ALCOHOL),
+                "exercise": rng.choice(EXERCISE),
+                "home_support": "Lives with parents" if age < 18 else rng.choice(HOME_SUPPORT),
+            },
+            "family_history": rng.sample(FAMILY_HISTORY, rng.randint(1, 2)),
+        },
+        "exam": {
+            "general": "Well-appearing, no acute distress",
+            "heent": "Oropharynx clear",
+            "lungs": "Clear to auscultation bilaterally",
+            "cardiac": "Regular rate and rhythm, no murmurs",
+            "extremities": "No edema",
+        },
+        "assessment": [{"problem": p[0], "icd10": p[1]} for p in problems],
+        "plan": {
+            "medication_changes": medication_changes,
+            "orders_today": [o for p in problems for o in p[6]],
+            "education": ["Return precautions for red-flag symptoms"],
+            "follow_up": [
+                {"type": kind, "when": when, "purpose": f"{primary[0].lower()} review"}
+                for kind, when in rng.sample(FOLLOW_UPS, rng.randint(1, 2))
+            ],
+            "shared_decision_making": "Patient agrees with plan.",
+        },
+        "impact_on_function": {"daily_living": "Mild limitation of usual activities."},
+        "self_care_and_remedies": {"otc_used": [], "home_remedies": ["Rest, fluids"], "perceived_benefit": "Minimal relief"},
+        "exposures": {"sick_contacts": []},
+        "medication_side_effects_and_concerns": {"patient_concerns": "None reported"},
+        "adherence_and_acceptance": {"agreed_to_plan": True, "declined_any_treatments": False},
+        "transcript": _transcript(rng, first, problems, prior_meds + new_meds),
+    }
+    return patient_id, record
+
+
+def generate_intake(seed: int, index: int) -> Tuple[str, Dict[str, Any]]:
+    """Generate one `AI_scribes` intake in the shape written by `write_patient_intake`."""
+    rng = random.Random(f"{seed}:intake:{index}")
+    first, last, sex = _name(rng)
+    age = _weighted_age(rng)
+    condition = rng.choices(CONDITIONS, weights=CONDITION_WEIGHTS, k=1)[0]
+    timestamp = datetime(2024, 1, 1) + timedelta(seconds=rng.randint(0, 700 * 86400))
+
+    patient_id = f"{first.lower()}_{last.lower()}_{index:07d}"
+    record = {
+        "timestamp": timestamp.isoformat(),
+        "patient_info": {"name": f"{first} {last}", "age": age, "sex": sex},
+        "chief_complaint": condition[3],
+        "reason_for_visit": rng.choice(REASONS_FOR_VISIT),
+        "symptoms": list(condition[4]),
+        "current_medications": rng.sample([c[5][0] for c in CONDITIONS if c[5]], rng.randint(0, 2)),
+        "existing_conditions": rng.sample([c[0] for c in CONDITIONS], rng.randint(0, 2)),
+        "allergies": [] if rng.random() < 0.7 else [rng.choice(ALLERGIES[6:])],
+        "family_history": rng.choice(FAMILY_HISTORY + ["Not provided"]),
+        "conversation_summary": f"Patient reports {', '.join(condition[4]) or condition[3].lower()} for {rng.choice(DURATIONS)}.",
+        "ai_assessment": "Patient should schedule an appointment; seek immediate care if symptoms worsen.",
+        "status": rng.choice(INTAKE_STATUS),
+    }
+    return patient_id, record
+
+
+def generate_corpus(records: int, seed: int = 42, intake_ratio: float = 0.25) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Yield (section, patient_id, record) for a corpus of `records` entries.
+
+    `intake_ratio` of the entries go under `AI_scribes`, the rest under `patient_scribes`.
+    Intakes are yielded first to match the key order of patient_records.json.
+    """
+    intakes = int(records * intake_ratio)
+    for i in range(intakes):
+        yield ("AI_scribes",) + generate_intake(seed, i)
+    for i in range(records - intakes):
+        yield ("patient_scribes",) + generate_encounter(seed, i)
+
+
+def write_corpus(path: str, records: int, seed: int = 42, intake_ratio: float = 0.25, compact: bool = False) -> None:
+    """
+    Stream a generated corpus to `path` without holding it in memory.
+
+    By default the output uses the same 2-space indented layout that
+    `write_patient_intake` produces; `compact=True` drops whitespace, which roughly
+    halves the file size for 1M-record runs.
+    """
+    if compact:
+        encoder = json.JSONEncoder(separators=(",", ":"))
+        newline, indent1, indent2 = "", "", ""
+    else:
+        encoder = json.JSONEncoder(indent=2)
+        newline, indent1, indent2 = "\n", "  ", "    "
+    key_sep = ":" if compact else ": "
+
+    with open(path, "w") as f:
+        f.write("{")
+        current_section = None
+        first_entry = True
+        for section, patient_id, record in generate_corpus(records, seed, intake_ratio):
+            if section != current_section:
+                if current_section is not None:
+                    f.write(f"{newline}{indent1}}},")
+                f.write(f"{newline}{indent1}{json.dumps(section)}{key_sep}{{")
+                current_section = section
+                first_entry = True
+            body = encoder.encode(record)
+            if not compact:
+                body = body.replace("\n", "\n" + indent2)
+            f.write(("" if first_entry else ",") + f"{newline}{indent2}{json.dumps(patient_id)}{key_sep}{body}")
+            first_entry = False
+        if current_section is not None:
+            f.write(f"{newline}{indent1}}}")
+        f.write(f"{newline}}}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic patient_records.json-style corpus.")
+    parser.add_argument("--records", type=int, default=10_000, help="Total number of records (default 10000)")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed (default 42)")
+    parser.add_argument("--intake-ratio", type=float, default=0.25, help="Fraction of records under AI_scribes")
+    parser.add_argument("--out", default="patient_records.synthetic.json", help="Output path")
+    parser.add_argument("--compact", action="store_true", help="Write without indentation")
+    args = parser.parse_args()
+
+    write_corpus(args.out, args.records, args.seed, args.intake_ratio, args.compact)
+    print(f"Wrote {args.records} records (seed={args.seed}) to {args.out}")
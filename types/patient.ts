@@ -86,3 +86,28 @@ export interface PatientRecords {
   patient_scribes: Record<string, PatientRecord>;
 }
 
+
+export interface PatientSummary {
+  id: string;
+  source: "patient_scribes" | "AI_scribes";
+  name: string;
+  age: number;
+  sex: string;
+  chief_complaint: string;
+  status: string;
+  mrn?: string | null;
+  timestamp?: string | null;
+  specialty?: string | null;
+}
+
+export interface PatientSummaryPage {
+  items: PatientSummary[];
+  next_cursor: string | null;
+  total: number;
+}
+
+export interface PatientDetailResponse {
+  id: string;
+  source: PatientSummary["source"];
+  record: PatientRecord;
+}